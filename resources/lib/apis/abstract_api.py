@@ -20,9 +20,11 @@ class AbstractApi(ABC):
         pass
 
     @abstractmethod
-    def get_video_id(self):  # type: () -> str | None
+    def get_video_id(self, context):  # type: (PlaybackContext) -> str | None
         """
         Get the YouTube video ID of the currently playing video.
+
+        All information about the playing item must be taken from the context.
         """
         pass
 
@@ -1,20 +1,20 @@
+import importlib
 import logging
 
-from .abstract_api import AbstractApi
-from .invidious_api import InvidiousApi
-from .piped_api import PipedApi
-from .youtube_api import YouTubeApi
-
 
 logger = logging.getLogger(__name__)
 
 
 API_MAP = {
-    "plugin.video.youtube": YouTubeApi,
-    "plugin.video.sendtokodi": YouTubeApi,
-    "plugin.video.invidious": InvidiousApi,
-    "plugin.video.piped": PipedApi
+    "plugin.video.youtube": "youtube_api.YouTubeApi",
+    "plugin.video.sendtokodi": "youtube_api.YouTubeApi",
+    "plugin.video.invidious": "invidious_api.InvidiousApi",
+    "plugin.video.piped": "piped_api.PipedApi"
 }
+"""
+Supported addons and their API implementation as `module.Class` relative
+to this package. The module is only imported once the addon is first used.
+"""
 
 
 singletons = {}
@@ -32,7 +32,9 @@ def get_api(addon_id): # type: (str) -> AbstractApi | None
         return None
 
     if addon_id not in singletons:
-        constructor = API_MAP[addon_id]
+        module_name, class_name = API_MAP[addon_id].rsplit(".", 1)
+        module = importlib.import_module("." + module_name, __package__)
+        constructor = getattr(module, class_name)
         singletons[addon_id] = constructor()
 
     return singletons[addon_id]
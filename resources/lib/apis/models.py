@@ -1,4 +1,6 @@
 from collections import namedtuple
 
+NOTIFICATION_PLAYBACK_INIT = "Other.PlaybackInit"
+"""Sent by the YouTube add-on right before a video starts playing."""
 
 NotificationPayload = namedtuple("NotificationPayload", ("video_id", "unlisted"))
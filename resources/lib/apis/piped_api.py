@@ -1,12 +1,8 @@
 import json
 
-from urllib import parse as urlparse
-
 from .abstract_api import AbstractApi
 from .models import NotificationPayload
 
-from ..utils.xbmc import get_playing_file_path
-
 
 class PipedApi(AbstractApi):
 
@@ -19,19 +15,8 @@ class PipedApi(AbstractApi):
         video_id = args[1][0].get("videoId", None)
         return NotificationPayload(video_id, None)
 
-    def get_video_id(self):  # type: () -> str | None
-        try:
-            path_url = urlparse.urlsplit(get_playing_file_path())
-            query = urlparse.parse_qs(path_url.query)
-        except Exception:
-            return None
-
-        valid_url = (
-            path_url.scheme == "plugin"
-            and path_url.path.startswith("/watch/")
-        )
-
-        return path_url.path.replace('/watch/', '') if valid_url else None
+    def get_video_id(self, context):  # type: (PlaybackContext) -> str | None
+        return context.resolved.video_id
 
     def should_preload_segments(self, method, data): # type: (str, NotificationPayload) -> bool
         return data.video_id is not None
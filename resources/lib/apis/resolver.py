@@ -0,0 +1,111 @@
+"""Resolve a media path to the addon it belongs to and the YouTube video ID it refers to.
+
+Every path is split once and matched with the matcher of its addon, the result is memoized,
+so asking for the addon and then the video ID of the playing file doesn't parse it again.
+"""
+
+import re
+from collections import namedtuple
+from functools import lru_cache
+
+from urllib import parse as urlparse
+
+from ..utils.xbmc import addon_from_split, is_googlevideo_host
+from .api_factory import API_MAP
+
+DOMAIN_YOUTUBE = "youtube.com"
+DOMAIN_YOUTU_BE = "youtu.be"
+
+RESOLVE_CACHE_SIZE = 64
+"""Number of resolved paths to remember, enough for the playing item and the prefetched playlist."""
+
+PathInfo = namedtuple("PathInfo", ("addon_id", "video_id", "stream"))
+"""Result of resolving a path.
+
+`stream` is true if the path is a googlevideo stream the YouTube add-on resolved its plugin URL to.
+Such a path doesn't contain the video ID.
+"""
+
+_EMPTY = PathInfo("", None, False)
+
+_YOUTUBE_PLUGIN_PATH = re.compile(r"(?:^|/)(?:play|watch)/+([^/]+)/*$")
+_PIPED_PLUGIN_PATH = re.compile(r"^/watch/(.+)$")
+
+
+def _query_value(parsed, *keys):  # type: (urlparse.SplitResult, *str) -> Optional[str]
+    if not parsed.query:
+        return None
+
+    query = urlparse.parse_qs(parsed.query)
+    for key in keys:
+        try:
+            return query[key][0]
+        except KeyError:
+            pass
+
+    return None
+
+
+def _match_youtube(parsed):  # type: (urlparse.SplitResult) -> Optional[str]
+    video_id = _query_value(parsed, "video_id", "videoid")
+    if video_id:
+        return video_id
+
+    match = _YOUTUBE_PLUGIN_PATH.search(parsed.path)
+    return match.group(1) if match else None
+
+
+def _match_invidious(parsed):  # type: (urlparse.SplitResult) -> Optional[str]
+    if not parsed.path.startswith("/") or _query_value(parsed, "action") != "video":
+        return None
+
+    return _query_value(parsed, "videoId")
+
+
+def _match_piped(parsed):  # type: (urlparse.SplitResult) -> Optional[str]
+    match = _PIPED_PLUGIN_PATH.match(parsed.path)
+    return match.group(1) if match else None
+
+
+_IMPLEMENTATION_MATCHERS = {
+    "youtube_api.YouTubeApi": _match_youtube,
+    "invidious_api.InvidiousApi": _match_invidious,
+    "piped_api.PipedApi": _match_piped,
+}
+"""Video ID matchers for the plugin URLs handled by each API implementation in `API_MAP`."""
+
+_PLUGIN_MATCHERS = {addon_id: _IMPLEMENTATION_MATCHERS[impl] for addon_id, impl in API_MAP.items()}
+"""Video ID matchers for the plugin URLs of every supported addon."""
+
+
+def _match_web(parsed, hostname):  # type: (urlparse.SplitResult, str) -> Optional[str]
+    if hostname == DOMAIN_YOUTU_BE or hostname.endswith("." + DOMAIN_YOUTU_BE):
+        return parsed.path.lstrip("/").split("/", 1)[0] or None
+    if hostname == DOMAIN_YOUTUBE or hostname.endswith("." + DOMAIN_YOUTUBE):
+        return _query_value(parsed, "v")
+
+    return None
+
+
+@lru_cache(maxsize=RESOLVE_CACHE_SIZE)
+def resolve_path(path):  # type: (str) -> PathInfo
+    if not path:
+        return _EMPTY
+
+    try:
+        parsed = urlparse.urlsplit(path)
+        hostname = (parsed.hostname or "").lower()
+    except (TypeError, ValueError):
+        return _EMPTY
+
+    addon_id = addon_from_split(parsed, hostname)
+    if is_googlevideo_host(hostname):
+        return PathInfo(addon_id, None, True)
+
+    matcher = _PLUGIN_MATCHERS.get(parsed.netloc)
+    if parsed.scheme == "plugin" and matcher is not None:
+        video_id = matcher(parsed)
+    else:
+        video_id = _match_web(parsed, hostname)
+
+    return PathInfo(addon_id, video_id, False)
@@ -7,10 +7,11 @@ import logging
 from urllib import parse as urlparse
 
 from .abstract_api import AbstractApi
-from .models import NotificationPayload
+from .models import NOTIFICATION_PLAYBACK_INIT, NotificationPayload
+from .resolver import resolve_path
 
 from ..utils import jsonrpc
-from ..utils.xbmc import get_playing_file_path
+from ..utils.xbmc import get_player_item
 
 
 _logger = logging.getLogger(__name__)
@@ -18,10 +19,6 @@ _logger = logging.getLogger(__name__)
 
 _IMAGE_SCHEME = "image://"
 DOMAIN_THUMBNAIL = "ytimg.com"
-DOMAIN_GOOGLEVIDEO = "googlevideo.com"
-DOMAIN_YOUTUBE = "youtube.com"
-DOMAIN_YOUTU_BE = "youtu.be"
-NOTIFICATION_PLAYBACK_INIT = "Other.PlaybackInit"
 
 
 _EXPLICIT_UIDS = ("youtubeid", "youtube_id")
@@ -40,15 +37,15 @@ class YouTubeApi(AbstractApi):
         parsed = json.loads(data)
         return NotificationPayload(parsed.get("video_id", None), parsed.get("unlisted", None))
 
-    def get_video_id(self):  # type: () -> str | None
-        video_id = video_id_from_url(get_playing_file_path())
-        if video_id:
-            return video_id
+    def get_video_id(self, context):  # type: (PlaybackContext) -> str | None
+        playing = context.resolved
+        if playing.video_id:
+            return playing.video_id
 
         # Kodi may replace the original plugin URL with a resolved media URL by
         # the time onPlayBackStarted fires. Player.GetItem can still retain the
         # original URL, so check it before falling back to item metadata.
-        item = get_player_item()
+        item = context.item
         video_id = video_id_from_url(item.get(jsonrpc.LIST_FIELD_FILE, ""))
         if video_id:
             return video_id
@@ -56,12 +53,7 @@ class YouTubeApi(AbstractApi):
         # has_context denotes whether the current video seems to be a youtube video
         # being played outside of the YouTube add-on.
         try:
-            hostname = urlparse.urlsplit(get_playing_file_path()).hostname
-        except (TypeError, ValueError):
-            hostname = None
-        has_context = bool(hostname and hostname.endswith(DOMAIN_GOOGLEVIDEO))
-        try:
-            return video_id_from_list_item(has_context, item=item)
+            return video_id_from_list_item(playing.stream, item=item)
         except Exception:
             _logger.exception("failed to get video id from list item")
             return None
@@ -72,34 +64,7 @@ class YouTubeApi(AbstractApi):
 
 def video_id_from_url(value):
     """Extract a YouTube ID from current and legacy playback URLs."""
-    if not value:
-        return None
-
-    try:
-        parsed = urlparse.urlsplit(value)
-        query = urlparse.parse_qs(parsed.query)
-    except (TypeError, ValueError):
-        return None
-
-    if parsed.scheme == "plugin" and parsed.netloc in (
-        "plugin.video.youtube",
-        "plugin.video.sendtokodi",
-    ):
-        video_id = query.get("video_id", query.get("videoid", [None]))[0]
-        if video_id:
-            return video_id
-
-        parts = [part for part in parsed.path.split("/") if part]
-        if len(parts) >= 2 and parts[-2] in ("play", "watch"):
-            return parts[-1]
-
-    hostname = (parsed.hostname or "").lower()
-    if hostname == DOMAIN_YOUTU_BE or hostname.endswith("." + DOMAIN_YOUTU_BE):
-        return parsed.path.lstrip("/").split("/", 1)[0] or None
-    if hostname == DOMAIN_YOUTUBE or hostname.endswith("." + DOMAIN_YOUTUBE):
-        return query.get("v", [None])[0]
-
-    return None
+    return resolve_path(value).video_id
 
 
 def _extract_image_url(img):  # type: (str) -> str
@@ -150,24 +115,6 @@ def _video_id_from_ids(unique_ids, has_context):  # type: (dict, bool) -> str |
             pass
 
 
-def get_player_item():
-    try:
-        result = jsonrpc.execute(
-            "Player.GetItem",
-            jsonrpc.PLAYER_VIDEO,
-            [
-                jsonrpc.LIST_FIELD_ART,
-                jsonrpc.LIST_FIELD_FILE,
-                jsonrpc.LIST_FIELD_UNIQUEID,
-            ],
-        )
-    except Exception:
-        _logger.exception("failed to get item from JSON RPC")
-        return {}
-
-    return result.get("item", {})
-
-
 def video_id_from_list_item(has_context, item=None):  # type: (bool, dict) -> str | None
     if item is None:
         item = get_player_item()
@@ -1,27 +1,42 @@
 import logging
+import os.path
+import threading
+import time
+
 import xbmc
+import xbmcvfs
 
 from .apis.api_factory import get_api
-from .apis.models import NotificationPayload
+from .apis.models import NOTIFICATION_PLAYBACK_INIT, NotificationPayload
 
-from .player_listener import PlayerListener
-from .sponsorblock import SponsorBlockAPI
+from .player_listener import PlayerListener, get_sponsor_segments
+from .prefetcher import SegmentPrefetcher
+from .sponsorblock import CATEGORIES, SegmentCache, SegmentMirror, SponsorBlockAPI
 from .sponsorblock.utils import new_user_id
 from .utils import addon
-from .utils.const import (
-    CONF_API_SERVER,
-    CONF_CATEGORIES_MAP,
-    CONF_CATEGORY_CUSTOM,
-    CONF_IGNORE_UNLISTED,
-    CONF_USER_ID,
-)
+from .utils.const import CONF_CATEGORIES_MAP, CONF_USER_ID
+from .utils.metrics import MetricsRegistry
+from .utils.skip_accuracy import SkipAccuracy
+from .utils.xbmc import get_upcoming_playlist_paths
 
 
 logger = logging.getLogger(__name__)
 
+SEGMENT_CACHE_FILE = "segments.db"
+SEGMENT_MIRROR_FILE = "mirror.db"
+OUTBOX_SPOOL_FILE = "outbox.json"
+METRICS_FILE = "metrics.json"
+SKIP_ACCURACY_FILE = "skip_accuracy.json"
+
+KEEPALIVE_INTERVAL = 30
+"""Seconds between connection keepalives while videos are playing in sequence."""
+
+METRICS_INTERVAL = 5 * 60
+"""Seconds between writes of the metrics snapshot and the skip accuracy statistics."""
+
 
-def get_user_id():
-    user_id = addon.get_config(CONF_USER_ID, str)
+def get_user_id(settings):  # type: (addon.Settings) -> str
+    user_id = settings.user_id
     if not user_id:
         user_id = new_user_id()
         logger.info("generated new user id: %s", user_id)
@@ -30,45 +45,150 @@ def get_user_id():
     return user_id
 
 
-def get_categories():
-    categories = set()
+def get_categories(settings):  # type: (addon.Settings) -> list[str]
+    """Get the categories to fetch.
 
-    for category, conf_key in CONF_CATEGORIES_MAP.items():
-        if addon.get_config(conf_key, bool):
-            categories.add(category)
+    Segments are fetched for every known category and filtered when the skip plan is built,
+    so toggling a category doesn't invalidate the cache. Only custom categories extend the list.
+    """
+    logger.info("skipping the following categories: %s", list(settings.categories))
+    return sorted(set(CATEGORIES).union(CONF_CATEGORIES_MAP, settings.categories))
 
-    custom_categories = addon.get_config(CONF_CATEGORY_CUSTOM, str)
-    categories.update(
-        filter(None, (category.strip() for category in custom_categories.split(",")))
-    )
-    logger.info("skipping the following categories: %s", categories)
-    return list(categories)
+
+def open_segment_cache(settings):  # type: (addon.Settings) -> Optional[SegmentCache]
+    path = os.path.join(addon.PROFILE_PATH, SEGMENT_CACHE_FILE)
+    try:
+        return SegmentCache(path, negative_ttl=settings.no_segments_ttl)
+    except Exception:
+        logger.exception("failed to open segment cache at %s, continuing without", path)
+        return None
 
 
 class Monitor(xbmc.Monitor):
     def __init__(self):
         super(Monitor, self).__init__()
+        settings = addon.reload_settings()
+        self._metrics = MetricsRegistry()
+        self._metrics_path = os.path.join(addon.PROFILE_PATH, METRICS_FILE)
+        self._metrics_written_at = time.monotonic()
+        self._skip_accuracy = SkipAccuracy(os.path.join(addon.PROFILE_PATH, SKIP_ACCURACY_FILE))
+
+        self._segment_cache = open_segment_cache(settings)
+        self._mirror = None  # type: Optional[SegmentMirror]
+        self._mirror_import = None  # type: Optional[threading.Thread]
         self._api = SponsorBlockAPI(
-            user_id=get_user_id(),
-            api_server=addon.get_config(CONF_API_SERVER, str),
-            categories=get_categories(),
+            user_id=get_user_id(settings),
+            api_server=settings.api_server,
+            categories=get_categories(settings),
+            cache=self._segment_cache,
+            outbox_path=os.path.join(addon.PROFILE_PATH, OUTBOX_SPOOL_FILE),
+            metrics=self._metrics,
+        )
+
+        # prefetched segments are only useful if they end up in the cache
+        if self._segment_cache is not None:
+            self._prefetcher = SegmentPrefetcher(
+                lambda video_id: get_sponsor_segments(self._api, video_id)
+            )
+        else:
+            self._prefetcher = None
+
+        self._player_listener = PlayerListener(
+            api=self._api,
+            prefetcher=self._prefetcher,
+            metrics=self._metrics,
+            accuracy=self._skip_accuracy,
         )
 
-        self._player_listener = PlayerListener(api=self._api)
+        self.__update_mirror(settings)
 
     def stop(self):
-        self._player_listener.stop_listener()
+        self._player_listener.close()
+        if self._prefetcher is not None:
+            self._prefetcher.shutdown()
+        self._api.close()
+        if self._segment_cache is not None:
+            self._segment_cache.close()
+        if self._mirror is not None:
+            self._mirror.close()
+        self._metrics.write_snapshot(self._metrics_path)
+        self._skip_accuracy.save()
 
     def wait_for_abort(self):
-        self.waitForAbort()
+        while not self.waitForAbort(KEEPALIVE_INTERVAL):
+            if self.__playing_in_sequence():
+                self.__warm_up_connection()
+
+            if time.monotonic() - self._metrics_written_at >= METRICS_INTERVAL:
+                self._metrics.write_snapshot(self._metrics_path)
+                self._skip_accuracy.save()
+                self._metrics_written_at = time.monotonic()
+
         self.stop()
 
+    def __playing_in_sequence(self):  # type: () -> bool
+        if not self._player_listener.isPlayingVideo():
+            return False
+
+        try:
+            return bool(get_upcoming_playlist_paths(1))
+        except Exception:
+            logger.exception("failed to read upcoming playlist items")
+            return False
+
+    def __warm_up_connection(self):  # type: () -> None
+        # don't block Kodi's callback / the service thread
+        threading.Thread(
+            target=self._api.warm_up, name="SponsorBlock warm up", daemon=True
+        ).start()
+
     def onSettingsChanged(self):  # type: () -> None
         logger.info("settings changed, updating")
+        settings = addon.reload_settings()
         api = self._api
-        api.set_user_id(get_user_id())
-        api.set_api_server(addon.get_config(CONF_API_SERVER, str))
-        api.set_categories(get_categories())
+        api.set_user_id(get_user_id(settings))
+        api.set_api_server(settings.api_server)
+        api.set_categories(get_categories(settings))
+        self._player_listener.on_settings_changed()
+        if self._segment_cache is not None:
+            self._segment_cache.set_negative_ttl(settings.no_segments_ttl)
+        self.__update_mirror(settings)
+
+    def __update_mirror(self, settings):  # type: (addon.Settings) -> None
+        if not (settings.mirror_enabled and settings.mirror_dump):
+            self._api.set_mirror(None)
+            return
+
+        if self._mirror is None:
+            self._mirror = SegmentMirror(os.path.join(addon.PROFILE_PATH, SEGMENT_MIRROR_FILE))
+        self._api.set_mirror(self._mirror)
+
+        dump_path = xbmcvfs.translatePath(settings.mirror_dump)
+        try:
+            source = (dump_path, os.path.getmtime(dump_path))
+        except OSError:
+            logger.warning("database dump %s doesn't exist", dump_path)
+            return
+
+        if self._mirror.source == source:
+            return
+
+        import_thread = self._mirror_import
+        if import_thread is not None and import_thread.is_alive():
+            logger.info("segment mirror is already being imported")
+            return
+
+        def import_dump():
+            try:
+                self._mirror.import_dump(dump_path)
+            except Exception:
+                logger.exception("failed to import database dump %s", dump_path)
+
+        # importing the full dump takes minutes, lookups go to the server until it's done
+        self._mirror_import = threading.Thread(
+            target=import_dump, name="SponsorBlock mirror import", daemon=True
+        )
+        self._mirror_import.start()
 
     def __handle_playback_init(self, data): # type: (NotificationPayload) -> None
         video_id = data.video_id
@@ -76,7 +196,7 @@ class Monitor(xbmc.Monitor):
             logger.warning("received playbackinit notification without video id")
             return
 
-        if data.unlisted and addon.get_config(CONF_IGNORE_UNLISTED, bool):
+        if data.unlisted and addon.get_settings().ignore_unlisted:
             logger.info("ignoring video %s because it's unlisted", video_id)
             self._player_listener.ignore_next_video(video_id)
             return
@@ -90,6 +210,10 @@ class Monitor(xbmc.Monitor):
         if not api:
             return
 
+        if method == NOTIFICATION_PLAYBACK_INIT:
+            # a video is about to play, make sure the connection is ready before we need it
+            self.__warm_up_connection()
+
         try:
             data = api.parse_notification_payload(data)
 
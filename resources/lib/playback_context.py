@@ -0,0 +1,95 @@
+import logging
+import threading
+
+from .apis.resolver import resolve_path
+from .utils.xbmc import (
+    get_playback_facts,
+    get_player_item,
+    get_playing_file_path,
+    get_upcoming_playlist_paths,
+)
+
+logger = logging.getLogger(__name__)
+
+_UNSET = object()
+
+
+class PlaybackContext:
+    """Facts about the playing item that don't change while it plays.
+
+    Created when playback of an item starts. Each fact is fetched from Kodi the first time it's needed
+    and then kept for the lifetime of the item, so the resolvers of the APIs and the player listener
+    don't ask Kodi for the same thing over and over again.
+    """
+
+    def __init__(self, player):  # type: (xbmc.Player) -> None
+        self._player = player
+        self._lock = threading.Lock()
+        self._file_path = _UNSET  # type: Union[object, str]
+        self._item = _UNSET  # type: Union[object, dict]
+        self._total_time = 0.0
+        # the next `_upcoming_count` items of the playlist, as far as the playlist goes
+        self._upcoming_count = 0
+        self._upcoming_paths = None  # type: Optional[list[str]]
+
+    def prefetch(self, playlist_count=0):  # type: (int) -> None
+        """Fetch the item, its duration and the next `playlist_count` playlist items in a single round trip.
+
+        Called when playback starts, facts that couldn't be fetched this way are still fetched on demand.
+        """
+        facts = get_playback_facts(playlist_count)
+        with self._lock:
+            if facts.item is not None and self._item is _UNSET:
+                self._item = facts.item
+            if facts.total_time and not self._total_time:
+                self._total_time = facts.total_time
+            if facts.upcoming_paths is not None:
+                self._upcoming_paths = facts.upcoming_paths
+                self._upcoming_count = playlist_count
+
+    @property
+    def file_path(self):  # type: () -> str
+        with self._lock:
+            if self._file_path is _UNSET:
+                self._file_path = get_playing_file_path()
+            return self._file_path
+
+    @property
+    def resolved(self):  # type: () -> PathInfo
+        # memoized by the resolver
+        return resolve_path(self.file_path)
+
+    @property
+    def addon_id(self):  # type: () -> str
+        return self.resolved.addon_id
+
+    @property
+    def item(self):  # type: () -> dict
+        """The item as returned by `Player.GetItem`, empty if it couldn't be fetched."""
+        with self._lock:
+            if self._item is _UNSET:
+                self._item = get_player_item()
+            return self._item
+
+    @property
+    def total_time(self):  # type: () -> float
+        """Duration of the item in seconds, 0 if it isn't known yet."""
+        with self._lock:
+            # the duration may not be known right after playback started, keep asking until it is
+            if not self._total_time:
+                self._total_time = self._player.getTotalTime()
+            return self._total_time
+
+    def upcoming_playlist_paths(self, count):  # type: (int) -> list[str]
+        """Paths of the next `count` items in the video playlist.
+
+        Uses the playlist as it was when playback started if it was prefetched.
+        """
+        with self._lock:
+            paths = self._upcoming_paths
+            prefetched_count = self._upcoming_count
+
+        if paths is None or count > prefetched_count:
+            return get_upcoming_playlist_paths(count)
+
+        return paths[:count]
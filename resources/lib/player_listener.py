@@ -1,27 +1,26 @@
 import logging
 import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
 
 import xbmc
 
-from .gui.sponsor_skipped import SponsorSkipped
-from .sponsorblock import NotFound, SponsorBlockAPI, SponsorSegment
+from .skip_plan import ACTION_UNMUTE, SkipPlan
+from .sponsorblock import ACTION_MUTE, NotFound, SponsorBlockAPI, SponsorSegment
 from .utils import addon
+from .utils.xbmc import is_muted, set_muted
 from .apis.api_factory import get_api
-from .utils.xbmc import get_playing_addon
+from .playback_context import PlaybackContext
 from .utils.checkpoint_listener import PlayerCheckpointListener
-from .utils.const import (
-    CONF_AUTO_UPVOTE,
-    CONF_SEGMENT_CHAIN_MARGIN_MS,
-    CONF_MINIMUM_DURATION_MS,
-    CONF_REDUCE_SKIPS_MS,
-    CONF_SHOW_SKIPPED_DIALOG,
-    CONF_SKIP_COUNT_TRACKING,
-    CONF_VIDEO_END_TIME_MARGIN_MS,
-    CONF_EXTRA_PRIVACY,
-)
 
 logger = logging.getLogger(__name__)
 
+LOADER_WORKERS = 2
+"""Number of threads loading segments.
+
+More than one so a slow request for a previous video doesn't hold up the current one.
+"""
+
 
 def _sanity_check_segments(segments):  # type: (Iterable[SponsorSegment]) -> bool
     last_start = -1
@@ -41,9 +40,9 @@ def _sanity_check_segments(segments):  # type: (Iterable[SponsorSegment]) -> boo
 
 def get_sponsor_segments(
     api, video_id
-):  # type: (SponsorBlockAPI, str) -> list[SponsorSegment] | None
+):  # type: (SponsorBlockAPI, str) -> Sequence[SponsorSegment] | None
     try:
-        extra_privacy = addon.get_config(CONF_EXTRA_PRIVACY, bool)
+        extra_privacy = addon.get_settings().extra_privacy
         segments = api.get_skip_segments_hashed(video_id) if extra_privacy else api.get_skip_segments(video_id)
     except NotFound:
         logger.info("video %s has no sponsor segments", video_id)
@@ -58,48 +57,68 @@ def get_sponsor_segments(
 
     logger.debug("got segments %s", segments)
     _sanity_check_segments(segments)
-
     return segments
 
 
 def vote_on_segment(
     api, seg, upvote, notify_success=True
-):  # type: (SponsorBlockAPI, SponsorSegment, bool, bool) -> bool
-    try:
-        api.vote_sponsor_segment(seg, upvote=upvote)
-    except Exception:
-        logger.exception("failed to vote on sponsor segment %s", seg)
-        addon.show_notification(32004, icon=addon.NOTIFICATION_ERROR)
-    else:
-        if notify_success:
+):  # type: (SponsorBlockAPI, SponsorSegment, bool, bool) -> None
+    def on_done(error):  # type: (Optional[Exception]) -> None
+        if error is not None:
+            logger.error("server rejected vote on sponsor segment %s: %s", seg, error)
+            addon.show_notification(32004, icon=addon.NOTIFICATION_ERROR)
+        elif notify_success:
             addon.show_notification(32005)
 
+    # the vote is sent in the background, the notification is shown once the server answered
+    api.vote_sponsor_segment(seg, upvote=upvote, on_done=on_done)
+
 
 class PlayerListener(PlayerCheckpointListener):
     def __init__(self, *args, **kwargs):
         self._api = kwargs.pop("api")  # type: SponsorBlockAPI
+        self._prefetcher = kwargs.pop("prefetcher", None)  # type: Optional[SegmentPrefetcher]
 
         super(PlayerListener, self).__init__(*args, **kwargs)
 
-        self._load_segment_lock = threading.Lock()
+        self._loader = ThreadPoolExecutor(
+            max_workers=LOADER_WORKERS, thread_name_prefix="Segment Loader"
+        )
+        self._loading_lock = threading.Lock()
+        self._loading_video_id = None
+        self._loading = None  # type: Optional[Future]
+
         self._ignore_next_video_id = None
+        # facts about the playing item, only set while an item is playing
+        self._context = None  # type: Optional[PlaybackContext]
         self._segments_video_id = None
-        self._segments = []  # list[SponsorSegment]
-        self._next_segment = None  # type: Optional[SponsorSegment]
+        self._segments = []  # Sequence[SponsorSegment]
+        # set when new segments are installed, the next checkpoint selection
+        # then also considers a segment that has already started.
+        self._segments_arrived = False
+        # the segments are installed by the loader and consumed by the listener thread
+        self._segments_lock = threading.Lock()
+        # (segments, settings, plan) the plan was built from
+        self._skip_plan = None  # type: Optional[tuple[list[SponsorSegment], addon.Settings, SkipPlan]]
+        self._next_action = None  # type: Optional[Checkpoint]
+        self._next_checkpoint = None  # type: Optional[float]
+        # the mute entry we muted the audio for and whether the audio has to be unmuted afterwards,
+        # it doesn't if the user had already muted it.
+        self._muted = None  # type: Optional[SkipEntry]
+        self._unmute_after = False
 
         # set by `onPlaybackStarted` and then read (/ reset) by `onAVStarted`
         self._should_start = False
         self._should_start_lock = threading.Lock()
 
-    def preload_segments(self, video_id):
-        assert not self._thread_running
-
-        if self._load_segment_lock.locked():
-            # try to avoid waiting for the lock
-            return
+    def close(self):  # type: () -> None
+        """Stop loading segments, a pending lookup mustn't hold up the shutdown."""
+        self.stop_listener()
+        self._loader.shutdown(wait=False)
 
+    def preload_segments(self, video_id):  # type: (str) -> Future
         logger.debug("preloading segments for video %s", video_id)
-        self._prepare_segments(video_id)
+        return self._prepare_segments(video_id, "notification")
 
     def ignore_next_video(self, video_id):
         assert not self._thread_running
@@ -110,31 +129,82 @@ class PlayerListener(PlayerCheckpointListener):
         self._ignore_next_video_id = None
         return v
 
-    def _prepare_segments(self, video_id):
-        with self._load_segment_lock:
+    def _prepare_segments(self, video_id, trigger):  # type: (str, str) -> Future
+        """Load the segments for a video in the background.
+
+        Args:
+            trigger: What caused the segments to be loaded, used for the metrics.
+
+        Returns:
+            Future resolving to the list of segments or `None` if there are none.
+        """
+        with self._loading_lock:
+            loading = self._loading
+            # a load that failed or found nothing is tried again, the API's cache takes care of repeats
+            if video_id == self._loading_video_id and (not loading.done() or loading.result()):
+                logger.info("segments for video %s already loading / loaded", video_id)
+                return loading
+
+            future = self._loader.submit(get_sponsor_segments, self._api, video_id)
+            if self._metrics is not None:
+                started = time.monotonic()
+                future.add_done_callback(
+                    lambda _: self._metrics.observe(
+                        "segments.load_time " + trigger, time.monotonic() - started
+                    )
+                )
+
+            self._loading_video_id = video_id
+            self._loading = future
+            return future
+
+    def __install_segments(self, video_id, future, play_started):  # type: (str, Future, float) -> None
+        if video_id != self._segments_video_id:
+            logger.debug("discarding segments for video %s, no longer playing", video_id)
+            return
+
+        segments = future.result()
+        if self._metrics is not None:
+            self._metrics.observe("segments.ready_after_play", time.monotonic() - play_started)
+            self._metrics.increment("segments.results", "found" if segments else "none")
+
+        if not segments:
+            with self._should_start_lock:
+                self._should_start = False
+            return
+
+        with self._segments_lock:
             if video_id != self._segments_video_id:
-                self._segments_video_id = video_id
-                self._segments = get_sponsor_segments(self._api, video_id)
-            else:
-                logger.info("segments for video %s already loaded", video_id)
+                logger.debug("discarding segments for video %s, no longer playing", video_id)
+                return
 
-        return bool(self._segments)
+            logger.debug("segments for video %s ready", video_id)
+            self._segments = segments
+            self._segments_arrived = True
+        self._trigger_wakeup()
 
     def onPlayBackStarted(self):  # type: () -> None
+        play_started = time.monotonic()
         # Reset existing playback
         self.stop_listener()
         self._reset_next_checkpoint()
-        self._segments = []
-        self._segments_video_id = None
+        with self._segments_lock:
+            self._segments = []
+            self._segments_video_id = None
+            self._segments_arrived = False
+
+        context = PlaybackContext(self)
+        self._context = context
 
         with self._should_start_lock:
-            addon_id = get_playing_addon()
-            api = get_api(addon_id)
+            api = get_api(context.addon_id)
 
             if not api:
                 return
 
-            video_id = api.get_video_id()
+            # the playlist is only needed to prefetch the segments of the upcoming items
+            context.prefetch(addon.get_settings().prefetch_count if self._prefetcher else 0)
+            video_id = api.get_video_id(context)
 
             if not video_id:
                 return
@@ -143,13 +213,18 @@ class PlayerListener(PlayerCheckpointListener):
                 logger.debug("ignoring video %s because it's ignored", video_id)
                 return
 
-            if not self._prepare_segments(video_id):
-                return
-
-            self._select_next_checkpoint(playback_started=True)
+            self._segments_video_id = video_id
             self._should_start = True
 
+        # the callback is invoked right away if the segments were already loaded.
+        self._prepare_segments(video_id, "play").add_done_callback(
+            lambda future: self.__install_segments(video_id, future, play_started)
+        )
+
     def onAVStarted(self):  # type: () -> None
+        if self._prefetcher:
+            self._prefetcher.prefetch_playlist(addon.get_settings().prefetch_count, self._context)
+
         with self._should_start_lock:
             if self._should_start:
                 self._should_start = False
@@ -159,52 +234,67 @@ class PlayerListener(PlayerCheckpointListener):
 
         self.start_listener()
 
-    def _select_next_checkpoint(self, playback_started: bool = False):
-        reduce_skips_seconds = (
-            addon.get_config(CONF_REDUCE_SKIPS_MS, int) / 1000.0
-        )
+    def _select_next_checkpoint(self):
+        # segments that have already started are only skipped right after they arrive
+        with self._segments_lock:
+            segments = self._segments
+            playback_started = self._segments_arrived
+            self._segments_arrived = False
 
-        current_time = self.getTime()
+        plan = self._get_skip_plan(segments, addon.get_settings())
+
+        current_time = self._media_time()
         logger.debug("searching for next segment after %g", current_time)
-        self._next_segment = next((
-            seg for seg in self._segments
-            if self._is_segment_skippable(seg, current_time, reduce_skips_seconds, playback_started)),
-            None
-        )
+        checkpoint = plan.next_checkpoint(current_time, include_current=playback_started, muted=self._muted)
+        self._next_action = checkpoint
+        self._next_checkpoint = checkpoint.time if checkpoint is not None else None
 
-    def _is_segment_skippable(self, seg, current_time, reduce_skips_seconds, playback_started: bool):
-        if seg.end < current_time:
-            return False  # this segment is already in the past
+    def _get_skip_plan(self, segments, settings):  # type: (Sequence[SponsorSegment], addon.Settings) -> SkipPlan
+        cached = self._skip_plan
+        if cached is not None and cached[0] is segments and cached[1] is settings:
+            return cached[2]
 
-        if (not playback_started) and seg.start < current_time:
-            # we're already in this segment
-            # If playback just started, we want to skip the segment anyway, but otherwise
-            # this means the user manually went back into the segment.
-            return False
+        plan = SkipPlan.build(segments, settings)
+        logger.debug("built skip plan with %d entries from %d segment(s)", len(plan), len(segments))
+        self._skip_plan = (segments, settings, plan)
+        return plan
 
-        minimum_duration_seconds = (
-            addon.get_config(CONF_MINIMUM_DURATION_MS, int) / 1000.0
-        )
+    def on_settings_changed(self):  # type: () -> None
+        # the skip plan of the playing video is rebuilt for the new settings when the next checkpoint is selected
+        self._trigger_wakeup()
 
-        chained_end = self.__get_segment_end_handle_overlap(seg)
-        segment_duration = chained_end - seg.start
+    def _reset_next_checkpoint(self):
+        self._next_action = None
+        self._next_checkpoint = None
 
-        if segment_duration < minimum_duration_seconds:
-            logger.debug("not applying segment %s because it is shorter than 'Minimum duration' setting (%g seconds)", seg, minimum_duration_seconds)
-            return False
+    def __mute(self, entry):  # type: (SkipEntry) -> None
+        if self._muted is None:
+            self._unmute_after = not is_muted()
+            if self._unmute_after:
+                set_muted(True)
 
-        if segment_duration <= reduce_skips_seconds:
-            logger.debug("not applying segment %s because it is shorter than 'Reduce all skips by this much' setting (%g seconds)", seg, reduce_skips_seconds)
-            return False
+        logger.debug("muted segment %s", entry.segment)
+        self._muted = entry
 
-        return True
+    def __unmute(self):  # type: () -> None
+        if self._muted is None:
+            return
 
-    def _reset_next_checkpoint(self):
-        self._next_segment = None
+        self._muted = None
+        if self._unmute_after:
+            self._unmute_after = False
+            try:
+                set_muted(False)
+            except Exception:
+                logger.exception("failed to unmute")
+
+    def stop_listener(self):  # type: () -> None
+        super(PlayerListener, self).stop_listener()
+        # whatever stopped the listener, the audio mustn't stay muted
+        self.__unmute()
 
     def _get_checkpoint(self):
-        seg = self._next_segment
-        return seg.start if seg is not None else None
+        return self._next_checkpoint
 
     def __show_skipped_dialog(self, seg):
         def unskip():
@@ -218,54 +308,25 @@ class PlayerListener(PlayerCheckpointListener):
             unskip()
 
         def on_expire():
-            if not addon.get_config(CONF_AUTO_UPVOTE, bool):
+            if not addon.get_settings().auto_upvote:
                 return
 
             logger.debug("automatically upvoting %s", seg)
             vote_on_segment(self._api, seg, upvote=True, notify_success=False)
 
-        SponsorSkipped.display_async(unskip, report, on_expire)
-
-    def __get_segment_end_handle_overlap(self, seg):
-        """Get the end time of a segment handling overlap with following segments.
-
-        When another segments starts within the span of the segment but isn't strictly contained in it,
-        its end time is used instead.
-        This continues until no more overlapping segments are found.
-        """
-        end_time = seg.end
-
-        try:
-            start_index = self._segments.index(seg)
-            upcoming_segments = self._segments[start_index:]
-        except (IndexError, ValueError):
-            return end_time
-
-        segment_chain_margin = (
-            addon.get_config(CONF_SEGMENT_CHAIN_MARGIN_MS, int) / 1000.0
-        )
+        # the dialog pulls in the GUI, which isn't needed until the first skip
+        from .gui.sponsor_skipped import SponsorSkipped
 
-        for seg in upcoming_segments:
-            # segment start must be bigger than our current `end_time + segment_chain_margin`
-            # for us to consider it a separate (non-chain) segment.
-            if seg.start > (end_time + segment_chain_margin):
-                break
-            logger.debug(
-                "chaining overlapping segments (possibly with margin setting): %s", seg
-            )
-            end_time = max(end_time, seg.end)
-
-        return end_time
+        SponsorSkipped.display_async(unskip, report, on_expire)
 
-    def __check_exceeds_video_end(self, time):
-        total_time = self.getTotalTime()
+    def __check_exceeds_video_end(self, time, video_end_time_margin):
+        context = self._context
+        total_time = context.total_time if context is not None else self.getTotalTime()
         if not total_time:
             logger.warning("couldn't determine total duration of the current video")
             return False
 
-        video_end_time = (
-            total_time - addon.get_config(CONF_VIDEO_END_TIME_MARGIN_MS, int) / 1000.0
-        )
+        video_end_time = total_time - video_end_time_margin
         return time >= video_end_time
 
     def __playnext_or_stop(self):
@@ -284,28 +345,68 @@ class PlayerListener(PlayerCheckpointListener):
         else:
             self.playnext()
 
+    def onPlayBackEnded(self):  # type: () -> None
+        self._context = None
+        super(PlayerListener, self).onPlayBackEnded()
+
+    def onPlayBackError(self):  # type: () -> None
+        self._context = None
+        super(PlayerListener, self).onPlayBackError()
+
+    def onPlayBackStopped(self):  # type: () -> None
+        self._context = None
+        super(PlayerListener, self).onPlayBackStopped()
+
     def _reached_checkpoint(self):
-        seg = self._next_segment
-        seg_target_seek_time = self.__get_segment_end_handle_overlap(seg)
+        checkpoint = self._next_action
+        if checkpoint.action == ACTION_UNMUTE:
+            self.__unmute()
+            # nothing seeks, so the listener has to be woken up for the next checkpoint
+            self._trigger_wakeup()
+            return
+
+        entry = checkpoint.entry
+        seg = entry.segment
+        settings = addon.get_settings()
+
+        if self._media_time() >= entry.end:
+            # with a late checkpoint on a short segment, seeking to its end would go backwards
+            logger.info("already past the end of segment %s, ignoring it", seg)
+            self._trigger_wakeup()
+            return
+
+        if checkpoint.action == ACTION_MUTE:
+            self.__mute(entry)
+            self._trigger_wakeup()
+            self.__report_viewed(seg, settings)
+            return
 
-        if self.__check_exceeds_video_end(seg_target_seek_time):
+        seg_target_seek_time = entry.end
+        muted = self._muted
+        if muted is not None and seg_target_seek_time >= muted.end:
+            # the skip leaves the muted entry, don't wait for the seek to finish
+            self.__unmute()
+
+        if self.__check_exceeds_video_end(seg_target_seek_time, settings.video_end_time_margin):
             logger.info("segment ends after end of video, skipping to next video")
             self.__playnext_or_stop()
         else:
-            reduce_skips_seconds = (
-                addon.get_config(CONF_REDUCE_SKIPS_MS, int) / 1000.0
-            )
-            self.seekTime(seg_target_seek_time - reduce_skips_seconds)
+            self.seekTime(seg_target_seek_time - settings.reduce_skips)
 
             # with `playnext` there's no way for the user to "unskip" right now,
             # so we only show the dialog if we're still in the same video.
-            if addon.get_config(CONF_SHOW_SKIPPED_DIALOG, bool):
+            if settings.show_skipped_dialog:
                 self.__show_skipped_dialog(seg)
 
-        if addon.get_config(CONF_SKIP_COUNT_TRACKING, bool):
-            logger.debug("reporting sponsor skipped")
-            try:
-                self._api.viewed_sponsor_segment(seg)
-            except Exception:
-                logger.exception("failed to report sponsor skipped")
-                # no need for a notification, the user doesn't need to know about this
+        self.__report_viewed(seg, settings)
+
+    def __report_viewed(self, seg, settings):  # type: (SponsorSegment, addon.Settings) -> None
+        if not settings.skip_count_tracking:
+            return
+
+        logger.debug("reporting sponsor skipped")
+        try:
+            self._api.viewed_sponsor_segment(seg)
+        except Exception:
+            logger.exception("failed to report sponsor skipped")
+            # no need for a notification, the user doesn't need to know about this
@@ -0,0 +1,79 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from .apis.api_factory import API_MAP
+from .apis.resolver import resolve_path
+from .utils.xbmc import get_upcoming_playlist_paths
+
+logger = logging.getLogger(__name__)
+
+MAX_WORKERS = 2
+"""Number of segments that are fetched concurrently."""
+
+
+def video_id_from_playlist_path(path):  # type: (str) -> Optional[str]
+    resolved = resolve_path(path)
+    if resolved.addon_id not in API_MAP:
+        return None
+
+    return resolved.video_id
+
+
+class SegmentPrefetcher:
+    """Fetches the segments of upcoming playlist items in the background.
+
+    The fetched segments aren't kept here, the `fetch` callback is expected to store them in the segment cache
+    so they're available locally when the item starts playing.
+    """
+
+    def __init__(self, fetch, max_workers=MAX_WORKERS):  # type: (Callable[[str], Any], int) -> None
+        self._fetch = fetch
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="Segment Prefetcher"
+        )
+        self._pending = set()  # type: set[str]
+        self._pending_lock = threading.Lock()
+
+    def prefetch_playlist(self, count, context=None):  # type: (int, Optional[PlaybackContext]) -> None
+        """Prefetch the segments of the next `count` items in the video playlist.
+
+        The playlist is taken from `context` if given, saving a round trip to Kodi.
+        """
+        if count <= 0:
+            return
+
+        try:
+            if context is not None:
+                paths = context.upcoming_playlist_paths(count)
+            else:
+                paths = get_upcoming_playlist_paths(count)
+        except Exception:
+            logger.exception("failed to read upcoming playlist items")
+            return
+
+        for path in paths:
+            video_id = video_id_from_playlist_path(path)
+            if video_id:
+                self.prefetch(video_id)
+
+    def prefetch(self, video_id):  # type: (str) -> None
+        with self._pending_lock:
+            if video_id in self._pending:
+                return
+            self._pending.add(video_id)
+
+        logger.debug("prefetching segments for upcoming video %s", video_id)
+        self._executor.submit(self.__run, video_id)
+
+    def __run(self, video_id):  # type: (str) -> None
+        try:
+            self._fetch(video_id)
+        except Exception:
+            logger.exception("failed to prefetch segments for video %s", video_id)
+        finally:
+            with self._pending_lock:
+                self._pending.discard(video_id)
+
+    def shutdown(self):  # type: () -> None
+        self._executor.shutdown(wait=False)
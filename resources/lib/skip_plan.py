@@ -0,0 +1,168 @@
+import bisect
+import logging
+from collections import namedtuple
+
+from .sponsorblock import ACTION_MUTE, ACTION_SKIP
+
+logger = logging.getLogger(__name__)
+
+ACTION_UNMUTE = "unmute"
+
+MUTE_SLACK = 1.0
+"""Seconds before the start of the muted entry that still count as being in it.
+
+Checkpoints may fire slightly early, that mustn't be mistaken for a seek out of the entry.
+"""
+
+MUTE_END_SLACK = 0.5
+"""Seconds before the end of a mute entry after which it's no longer muted.
+
+Keeps an unmute checkpoint that fired slightly early from muting the entry again.
+"""
+
+SkipEntry = namedtuple("SkipEntry", ("start", "end", "segment"))
+"""A span that is skipped (or muted) in one go.
+
+`segment` is the first segment of the chain, it's the one that is reported to the server.
+"""
+
+Checkpoint = namedtuple("Checkpoint", ("time", "action", "entry"))
+"""The next thing to do: skip, mute or unmute `entry` once playback reaches `time`."""
+
+
+class SkipPlan:
+    """The skips to perform for a video.
+
+    Built once per video and settings snapshot.
+    Segments are fetched for all categories, the ones in disabled categories are removed here.
+    Chained / overlapping segments are merged and segments which shouldn't be applied are removed,
+    so finding the next skip is a binary search.
+
+    Segments with the mute action type are kept apart, they're muted instead of skipped and may overlap skips.
+    """
+
+    def __init__(self, entries, mute_entries=()):  # type: (list[SkipEntry], Sequence[SkipEntry]) -> None
+        self._entries = entries
+        # entries don't overlap, so both lists are sorted
+        self._starts = [entry.start for entry in entries]
+        self._ends = [entry.end for entry in entries]
+        self._mute_entries = list(mute_entries)
+        self._mute_ends = [entry.end for entry in self._mute_entries]
+
+    @classmethod
+    def build(cls, segments, settings):  # type: (Iterable[SponsorSegment], Settings) -> SkipPlan
+        categories = settings.categories
+        segments = [seg for seg in segments if seg.category in categories]
+        skips = [seg for seg in segments if seg.action_type == ACTION_SKIP]
+        mutes = [seg for seg in segments if seg.action_type == ACTION_MUTE] if settings.mute_segments else []
+
+        entries = []
+        for start, end, first in _chain_segments(skips, settings.segment_chain_margin):
+            duration = end - start
+            if duration < settings.minimum_duration:
+                logger.debug("not applying segment %s because it is shorter than 'Minimum duration' setting (%g seconds)", first, settings.minimum_duration)
+                continue
+
+            if duration <= settings.reduce_skips:
+                logger.debug("not applying segment %s because it is shorter than 'Reduce all skips by this much' setting (%g seconds)", first, settings.reduce_skips)
+                continue
+
+            entries.append(SkipEntry(start, end, first))
+
+        mute_entries = []
+        for start, end, first in _chain_segments(mutes, settings.segment_chain_margin):
+            if end - start < settings.minimum_duration:
+                logger.debug("not muting segment %s because it is shorter than 'Minimum duration' setting (%g seconds)", first, settings.minimum_duration)
+                continue
+
+            mute_entries.append(SkipEntry(start, end, first))
+
+        return cls(entries, mute_entries)
+
+    def __len__(self):  # type: () -> int
+        return len(self._entries) + len(self._mute_entries)
+
+    def next_entry(self, time, include_current=False):  # type: (float, bool) -> Optional[SkipEntry]
+        """Find the next entry to skip.
+
+        Args:
+            time: Current time in seconds.
+            include_current: Also return the entry `time` is in.
+                Otherwise only entries starting at or after `time` are considered,
+                because being inside an entry means the user manually went back into it.
+        """
+        if include_current:
+            index = bisect.bisect_left(self._ends, time)
+        else:
+            index = bisect.bisect_left(self._starts, time)
+
+        try:
+            return self._entries[index]
+        except IndexError:
+            return None
+
+    def next_mute(self, time):  # type: (float) -> Optional[SkipEntry]
+        """Find the mute entry `time` is in or the next one after it.
+
+        Unlike skips, the entry `time` is in is always returned. Muting doesn't move the playback,
+        so there's no reason to spare a segment the user went back into.
+        """
+        index = bisect.bisect_right(self._mute_ends, time)
+        try:
+            return self._mute_entries[index]
+        except IndexError:
+            return None
+
+    def next_checkpoint(self, time, include_current=False, muted=None):
+        # type: (float, bool, Optional[SkipEntry]) -> Optional[Checkpoint]
+        """Find the next checkpoint, which is either the next skip or the next change of the mute state.
+
+        Args:
+            time: Current time in seconds.
+            include_current: See `next_entry`.
+            muted: The mute entry that is currently applied, if any.
+        """
+        checkpoint = None
+        entry = self.next_entry(time, include_current=include_current)
+        if entry is not None:
+            # an entry we're already in is applied right away
+            checkpoint = Checkpoint(max(entry.start, time), ACTION_SKIP, entry)
+
+        if muted is not None:
+            # playback left the entry (seek or skip), unmute right away
+            inside = muted.start - MUTE_SLACK <= time < muted.end
+            mute_change = Checkpoint(muted.end if inside else time, ACTION_UNMUTE, muted)
+        else:
+            mute = self.next_mute(time + MUTE_END_SLACK)
+            mute_change = Checkpoint(max(mute.start, time), ACTION_MUTE, mute) if mute is not None else None
+
+        # on a tie the skip comes first, the mute state is reconsidered after the seek
+        if mute_change is not None and (checkpoint is None or mute_change.time < checkpoint.time):
+            return mute_change
+
+        return checkpoint
+
+
+def _chain_segments(segments, chain_margin):
+    # type: (Iterable[SponsorSegment], float) -> Iterator[tuple[float, float, SponsorSegment]]
+    """Merge segments that overlap or are less than `chain_margin` apart.
+
+    Segments must be sorted by their start time.
+    """
+    chain = None
+    for seg in segments:
+        if chain is not None:
+            start, end, first = chain
+            # segment start must be bigger than our current `end + chain_margin`
+            # for us to consider it a separate (non-chain) segment.
+            if seg.start <= end + chain_margin:
+                logger.debug("chaining overlapping segments (possibly with margin setting): %s", seg)
+                chain = (start, max(end, seg.end), first)
+                continue
+
+            yield chain
+
+        chain = (seg.start, seg.end, seg)
+
+    if chain is not None:
+        yield chain
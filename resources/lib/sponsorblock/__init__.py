@@ -1,5 +1,8 @@
 from .api import SponsorBlockAPI
+from .cache import SegmentCache
+from .compact import CompactSegmentStore, PackedSegments
 from .errors import NotFound
-from .models import SponsorSegment
+from .mirror import SegmentMirror
+from .models import ACTION_MUTE, ACTION_SKIP, ACTION_TYPES, CATEGORIES, SponsorSegment
 
 __version__ = "0.0.1"
@@ -1,21 +1,30 @@
-import hashlib
 import json
 import logging
-
-import requests
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 
 from .endpoints import (
     DEFAULT_SERVER,
     GET_SKIP_SEGMENTS,
+    STATUS,
     VIEWED_VIDEO_SPONSOR_TIME,
     VOTE_ON_SPONSOR_TIME,
+    endpoint_path,
 )
-from .errors import error_from_response
-from .models import SponsorSegment
-from .utils import new_user_id
+from .cache import Validators
+from .errors import NotFound, NotModified, error_from_response
+from .models import ACTION_SKIP, ACTION_TYPES, CATEGORIES, SponsorSegment
+from .outbox import Outbox
+from .servers import ServerPool, parse_servers
+from .single_flight import SingleFlight
+from .utils import hash_prefix, new_user_id
 
 logger = logging.getLogger(__name__)
 
+_ACTION_TYPES_PARAM = json.dumps(list(ACTION_TYPES))
+
 _USER_AGENT = (
     "kodi-sponsorblock/{version} (https://github.com/siku2/script.service.sponsorblock)"
 )
@@ -27,6 +36,52 @@ def get_user_agent():  # type: () -> str
     return _USER_AGENT.format(version=__version__)
 
 
+POOL_CONNECTIONS = 4
+"""Number of hosts to keep connection pools for (the API servers and a previous one after changing them)."""
+
+POOL_MAXSIZE = 4
+"""Connections kept alive per host.
+
+Segment loading, prefetching, revalidation and the outbox may all talk to the server at the same time.
+"""
+
+WARM_UP_TIMEOUT = 5
+
+HEDGE_WORKERS = 8
+"""Threads sending lookups, enough for every concurrent lookup to be hedged once."""
+
+
+def _create_session():  # type: () -> requests.Session
+    # requests is only imported once the first request is made, it's by far the largest import of the service
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+
+    # Connection errors are retried for all methods since the request never reached the server.
+    # Gateway errors are only retried for idempotent requests, the outbox takes care of retrying the others.
+    # Read errors aren't retried at all, a read timeout already took the whole request timeout
+    # and retrying it would double how long playback waits for segments.
+    retries = Retry(
+        total=3,
+        connect=2,
+        read=0,
+        status=1,
+        status_forcelist=(502, 503, 504),
+        allowed_methods=frozenset(("GET", "HEAD")),
+        backoff_factor=0.3,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(
+        pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE, max_retries=retries
+    )
+
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers["User-Agent"] = get_user_agent()
+    return session
+
+
 def get_segment_uuid(segment):  # type: (Union[str, SponsorSegment]) -> str
     if isinstance(segment, SponsorSegment):
         return segment.uuid
@@ -34,22 +89,94 @@ def get_segment_uuid(segment):  # type: (Union[str, SponsorSegment]) -> str
     return segment
 
 
+def _conditional_headers(validators):  # type: (Optional[Validators]) -> dict[str, str]
+    headers = {}
+    if validators is None:
+        return headers
+
+    if validators.etag:
+        headers["If-None-Match"] = validators.etag
+    if validators.last_modified:
+        headers["If-Modified-Since"] = validators.last_modified
+    return headers
+
+
+def _validators_from_response(resp):  # type: (requests.Response) -> Optional[Validators]
+    etag = resp.headers.get("ETag")
+    last_modified = resp.headers.get("Last-Modified")
+    if etag is None and last_modified is None:
+        return None
+
+    return Validators(etag, last_modified)
+
+
+def _discard_response(future):  # type: (Future) -> None
+    # the losing request of a hedge, release its connection
+    try:
+        future.result().close()
+    except Exception:
+        pass
+
+
+def _segment_from_raw(raw):  # type: (dict) -> SponsorSegment
+    start, end = raw["segment"]
+    return SponsorSegment(raw["UUID"], raw["category"], start, end, raw.get("actionType", ACTION_SKIP))
+
+
 class SponsorBlockAPI:
-    def __init__(self, user_id=None, api_server=None, categories=None):
+    def __init__(
+        self,
+        user_id=None,
+        api_server=None,
+        categories=None,
+        cache=None,
+        outbox_path=None,
+        metrics=None,
+        mirror=None,
+    ):
         self._user_id = user_id or new_user_id()
-        self._session = requests.Session()
-        self._session.headers["User-Agent"] = get_user_agent()
+        self._session = None  # type: Optional[requests.Session]
+        self._session_lock = threading.Lock()
+        self._warm_up_lock = threading.Lock()
 
-        self._api_server = api_server or DEFAULT_SERVER
+        self._servers = None  # type: Optional[ServerPool]
+        self.set_api_server(api_server)
         self._request_timeout = 10
+        self._hedge_executor = ThreadPoolExecutor(
+            max_workers=HEDGE_WORKERS, thread_name_prefix="SponsorBlock request"
+        )
+
+        self.set_categories(categories or list(CATEGORIES))
 
-        self.set_categories(categories or [])
+        self._cache = cache  # type: Optional[SegmentCache]
+        self._metrics = metrics  # type: Optional[MetricsRegistry]
+        self._mirror = mirror  # type: Optional[SegmentMirror]
+        self._revalidating = set()  # type: set[str]
+        self._revalidating_lock = threading.Lock()
+        # concurrent lookups of the same video (or bucket) share a single request
+        self._flights = SingleFlight(on_shared=self._count_shared)
 
-    def set_api_server(self, api_server):  # type: (Optional[str]) -> None
-        if not api_server:
-            api_server = DEFAULT_SERVER
+        # votes and viewed reports are sent in the background
+        self._outbox = Outbox(self._send_queued, spool_path=outbox_path)
 
-        self._api_server = api_server
+    def close(self):  # type: () -> None
+        self._outbox.close()
+        self._hedge_executor.shutdown(wait=False)
+
+    def set_api_server(self, api_server):  # type: (Union[str, list[str], None]) -> None
+        """Set the servers to use.
+
+        Args:
+            api_server: A server or a comma separated list of compatible servers.
+                Lookups go to the best responding one, votes and reports always go to the first.
+        """
+        servers = parse_servers(api_server) or [DEFAULT_SERVER]
+        current = self._servers
+        if current is not None and current.servers == servers:
+            # keep what was learned about them
+            return
+
+        self._servers = ServerPool(servers)
 
     def set_user_id(self, user_id):  # type: (Optional[str]) -> None
         if not user_id:
@@ -59,17 +186,181 @@ class SponsorBlockAPI:
         self._user_id = user_id
 
     def set_categories(self, categories):
+        """Set the categories to fetch.
+
+        Which of them are skipped is decided locally, so this should include every category
+        that may be enabled. Changing it invalidates the cached segments.
+        """
         assert isinstance(categories, list)
+        self._categories = tuple(categories)
         self._categories_param = json.dumps(categories)
 
+    def _get_session(self):  # type: () -> requests.Session
+        session = self._session
+        if session is not None:
+            return session
+
+        with self._session_lock:
+            if self._session is None:
+                self._session = _create_session()
+            return self._session
+
+    def set_mirror(self, mirror):  # type: (Optional[SegmentMirror]) -> None
+        """Answer segment lookups from a local mirror instead of the server.
+
+        Lookups still go to the server until a dump has been imported into the mirror.
+        """
+        self._mirror = mirror
+
+    def _get_mirror(self):  # type: () -> Optional[SegmentMirror]
+        mirror = self._mirror
+        if mirror is None or not mirror.ready:
+            return None
+
+        return mirror
+
+    def warm_up(self):  # type: () -> None
+        """Open a connection to the API server, or keep the existing one alive.
+
+        The connection stays in the session's pool, so the next request doesn't have to pay for
+        DNS, TCP and TLS setup. Does nothing if a warm up is already in progress.
+        """
+        if self._get_mirror() is not None:
+            return
+
+        if not self._warm_up_lock.acquire(blocking=False):
+            return
+
+        url = STATUS.format(SERVER=self._servers.ranked()[0])
+        try:
+            with self._get_session().head(url, timeout=WARM_UP_TIMEOUT):
+                pass
+        except Exception as exc:
+            logger.debug("failed to warm up connection to %s: %r", url, exc)
+        else:
+            logger.debug("warmed up connection to %s", url)
+        finally:
+            self._warm_up_lock.release()
+
+    def _send(self, method, url, params, headers=None, endpoint=None):
+        """Send a request.
+
+        Args:
+            endpoint: Name of the request in the metrics. Defaults to the URL template.
+        """
+        def send():
+            pool = self._servers
+            # lookups can be answered by any server, everything else has to reach the primary server
+            if method == "GET":
+                return self._send_hedged(pool, url, params, headers)
+            return self._send_to(pool, pool.primary, method, url, params, headers)
+
+        metrics = self._metrics
+        if metrics is None:
+            return send()
+
+        endpoint = "{} {}".format(method, endpoint_path(endpoint or url))
+        start = time.monotonic()
+        try:
+            resp = send()
+        except Exception:
+            metrics.increment("api.errors", endpoint)
+            raise
+        finally:
+            metrics.observe("api.latency " + endpoint, time.monotonic() - start)
+
+        metrics.increment("api.status " + endpoint, str(resp.status_code))
+        # client errors like 404 (no segments) are regular answers, they're only part of the status counts
+        if resp.status_code >= 500:
+            metrics.increment("api.errors", endpoint)
+        return resp
+
+    def _send_to(self, pool, server, method, url, params, headers=None):
+        # type: (ServerPool, str, str, str, dict, Optional[dict]) -> requests.Response
+        start = time.monotonic()
+        try:
+            resp = self._get_session().request(
+                method,
+                url.format(SERVER=server),
+                params,
+                headers=headers,
+                timeout=self._request_timeout,
+            )
+        except Exception:
+            pool.record(server, time.monotonic() - start, False)
+            raise
+
+        pool.record(server, time.monotonic() - start, resp.status_code < 500)
+        return resp
+
+    def _send_hedged(self, pool, url, params, headers=None):
+        # type: (ServerPool, str, dict, Optional[dict]) -> requests.Response
+        """Send a GET request to the best server, hedging it with the next one if it's slow.
+
+        If the server doesn't answer within its hedging delay, the request is also sent to the next server.
+        A server that fails is replaced by the next one right away, even while others are still pending.
+        The first answer wins, if there is none the last failure is reported.
+        """
+        candidates = deque(pool.ranked())
+        if len(candidates) == 1:
+            return self._send_to(pool, candidates[0], "GET", url, params, headers)
+
+        pending = {}  # type: dict[Future, str]
+
+        def submit():  # type: () -> str
+            server = candidates.popleft()
+            future = self._hedge_executor.submit(self._send_to, pool, server, "GET", url, params, headers)
+            pending[future] = server
+            return server
+
+        last_server = submit()
+        failure = None  # type: Union[Exception, requests.Response, None]
+        while pending:
+            timeout = pool.hedge_delay(last_server) if candidates else None
+            done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                logger.debug("%s is slow to answer, hedging with %s", last_server, candidates[0])
+                last_server = submit()
+                if self._metrics is not None:
+                    self._metrics.increment("api.hedged")
+                continue
+
+            for future in done:
+                server = pending.pop(future)
+                try:
+                    resp = future.result()
+                except Exception as exc:
+                    logger.debug("request to %s failed: %r", server, exc)
+                    resp = exc
+                else:
+                    if resp.status_code < 500:
+                        for other in pending:
+                            other.add_done_callback(_discard_response)
+                        if self._metrics is not None:
+                            self._metrics.increment("api.servers", server)
+                        return resp
+
+                # only the last failure is reported, an earlier error response isn't needed anymore
+                if failure is not None and not isinstance(failure, Exception):
+                    failure.close()
+                failure = resp
+                if candidates:
+                    last_server = submit()
+
+        if isinstance(failure, Exception):
+            raise failure
+        return failure
+
+    def _count_lookup(self, result):  # type: (str) -> None
+        if self._metrics is not None:
+            self._metrics.increment("cache.lookups", result)
+
+    def _count_shared(self, key):  # type: (tuple) -> None
+        if self._metrics is not None:
+            self._metrics.increment("api.coalesced", key[0])
+
     def _request(self, method, url, params, is_json=True):
-        req_cm = self._session.request(
-            method,
-            url.format(SERVER=self._api_server),
-            params,
-            timeout=self._request_timeout,
-        )
-        with req_cm as resp:
+        with self._send(method, url, params) as resp:
             if resp.status_code != 200:
                 raise error_from_response(resp)
 
@@ -78,24 +369,119 @@ class SponsorBlockAPI:
             else:
                 return None
 
+    def _conditional_get(self, url, params, validators=None, endpoint=None):
+        # type: (str, dict, Optional[Validators], Optional[str]) -> tuple[Any, Optional[Validators]]
+        """Get a JSON response together with its validators.
+
+        If validators of a previous response are given, they are sent along and
+        `NotModified` is raised if the server confirms that the previous response is still valid.
+        """
+        headers = _conditional_headers(validators)
+        with self._send("GET", url, params, headers, endpoint=endpoint) as resp:
+            if resp.status_code != 200:
+                raise error_from_response(resp)
+
+            return resp.json(), _validators_from_response(resp)
+
+    def _revalidate_in_background(self, key, refresh):
+        # type: (str, Callable[[], None]) -> None
+        with self._revalidating_lock:
+            if key in self._revalidating:
+                return
+            self._revalidating.add(key)
+
+        def revalidate():
+            try:
+                refresh()
+            except NotFound:
+                logger.info("cached segments for %s no longer exist", key)
+            except Exception:
+                logger.exception("failed to revalidate cached segments for %s", key)
+            finally:
+                with self._revalidating_lock:
+                    self._revalidating.discard(key)
+
+        logger.debug("serving stale segments for %s, revalidating", key)
+        threading.Thread(
+            target=revalidate, name="SponsorBlock revalidate", daemon=True
+        ).start()
+
     def get_skip_segments(
         self, video_id
-    ):  # type: (str, bool) -> list[SponsorSegment]
+    ):  # type: (str) -> list[SponsorSegment]
+        mirror = self._get_mirror()
+        if mirror is not None:
+            self._count_lookup("mirror")
+            segments = mirror.get(video_id, self._categories)
+            if not segments:
+                # same as the server's answer for videos without segments
+                raise NotFound(None)
+            return segments
+
+        categories = self._categories_param
+        key = ("video", video_id, categories)
+
+        cache = self._cache
+        if cache is None:
+            segments, _ = self._flights.do(key, lambda: self._fetch_skip_segments(video_id))
+            return segments
+
+        entry = cache.get(video_id, categories)
+        if entry is None:
+            self._count_lookup("miss")
+            return self._flights.do(key, lambda: self._refresh_video(video_id, categories))
+
+        if not entry.segments:
+            self._count_lookup("negative")
+            logger.debug("video %s is known to have no segments", video_id)
+            raise NotFound(None)
+
+        self._count_lookup("stale" if entry.stale else "hit")
+        if entry.stale:
+            self._revalidate_in_background(
+                video_id, lambda: self._refresh_video(video_id, categories, entry.validators)
+            )
+        else:
+            logger.debug("using cached segments for video %s", video_id)
+
+        return entry.segments
+
+    def _refresh_video(self, video_id, categories, validators=None):
+        # type: (str, str, Optional[Validators]) -> Optional[list[SponsorSegment]]
+        """Fetch the segments of a video and store them in the cache.
+
+        Returns:
+            The fetched segments, or `None` if the server confirmed that the cached ones are still valid.
+        """
+        try:
+            segments, validators = self._fetch_skip_segments(video_id, validators)
+        except NotModified:
+            logger.debug("cached segments for video %s are still valid", video_id)
+            self._cache.touch(video_id)
+            return None
+        except NotFound:
+            self._cache.put_missing(video_id, categories)
+            raise
+
+        if not segments:
+            self._cache.put_missing(video_id, categories)
+        else:
+            self._cache.put(video_id, categories, segments, validators=validators)
+        return segments
+
+    def _fetch_skip_segments(self, video_id, validators=None):
+        # type: (str, Optional[Validators]) -> tuple[list[SponsorSegment], Optional[Validators]]
         params = {
             "videoID": video_id,
             "categories": self._categories_param,
+            "actionTypes": _ACTION_TYPES_PARAM,
         }
 
-        data = self._request("GET", GET_SKIP_SEGMENTS, params)
-
-        segments = []
-        for raw in data:
-            start, end = raw["segment"]
-            seg = SponsorSegment(raw["UUID"], raw["category"], start, end)
-            segments.append(seg)
+        data, validators = self._conditional_get(GET_SKIP_SEGMENTS, params, validators)
 
+        segments = [_segment_from_raw(raw) for raw in data]
         segments.sort(key=lambda seg: seg.start)
-        return segments
+        return segments, validators
 
     def get_skip_segments_hashed(self, video_id):   # type: (str) -> list[SponsorSegment]
         """
@@ -103,55 +489,124 @@ class SponsorBlockAPI:
         This uses more bandwidth, but doesn't indicate to the server which video
         specifically the client was watching.
 
+        The response contains the segments of all videos sharing the hash prefix.
+        When a cache is available the entire bucket is stored, so later lookups for
+        any video in the same bucket (including videos without segments) are answered locally.
+
         See also: https://wiki.sponsor.ajay.app/w/API_Docs#GET_/api/skipSegments/:sha256HashPrefix
 
         Returns:
             List of segments for the video, or an empty list if no segments were found.
         """
-        m = hashlib.sha256()
-        m.update(video_id.encode())
-        m.digest()
-        id_hash = m.hexdigest()[:4]
+        mirror = self._get_mirror()
+        if mirror is not None:
+            # nothing leaves the device, there's no need to ask for the whole bucket
+            self._count_lookup("mirror")
+            return mirror.get(video_id, self._categories)
+
+        prefix = hash_prefix(video_id)
+        categories = self._categories_param
+        # videos sharing the prefix share the request as well
+        key = ("prefix", prefix, categories)
+
+        cache = self._cache
+        if cache is None:
+            bucket, _ = self._flights.do(key, lambda: self._fetch_skip_segments_hashed(prefix))
+            return bucket.get(video_id, [])
+
+        entry = cache.get(video_id, categories)
+        if entry is None:
+            prefix_entry = cache.get_prefix(prefix, categories)
+            # like videos without segments, a video missing from the bucket is never served stale
+            if prefix_entry is None or not prefix_entry.knows_missing:
+                self._count_lookup("miss")
+                return self._flights.do(key, lambda: self._refresh_prefix(prefix, categories)).get(video_id, [])
+
+            self._count_lookup("negative")
+            logger.debug("video %s has no segments in cached bucket %s", video_id, prefix)
+            return []
+
+        self._count_lookup("stale" if entry.stale else "hit")
+        if entry.stale:
+            # the validators belong to the bucket, not to the individual video
+            prefix_entry = cache.get_prefix(prefix, categories)
+            validators = prefix_entry.validators if prefix_entry is not None else None
+            self._revalidate_in_background(
+                prefix, lambda: self._refresh_prefix(prefix, categories, validators)
+            )
+
+        return entry.segments
+
+    def _refresh_prefix(self, prefix, categories, validators=None):
+        # type: (str, str, Optional[Validators]) -> Optional[dict[str, list[SponsorSegment]]]
+        """Fetch the bucket of a hash prefix and store it in the cache.
 
+        Returns:
+            The fetched bucket, or `None` if the server confirmed that the cached one is still valid.
+        """
+        try:
+            bucket, validators = self._fetch_skip_segments_hashed(prefix, validators)
+        except NotModified:
+            logger.debug("cached bucket %s is still valid", prefix)
+            self._cache.touch_prefix(prefix)
+            return None
+        except NotFound:
+            # the server responds with 404 if no video matches the prefix
+            bucket, validators = {}, None
+
+        self._cache.put_bucket(prefix, categories, bucket, validators=validators)
+        return bucket
+
+    def _fetch_skip_segments_hashed(self, prefix, validators=None):
+        # type: (str, Optional[Validators]) -> tuple[dict[str, list[SponsorSegment]], Optional[Validators]]
         params = {
-            "categories": self._categories_param
+            "categories": self._categories_param,
+            "actionTypes": _ACTION_TYPES_PARAM,
         }
 
-        data = self._request("GET", GET_SKIP_SEGMENTS + "/" + id_hash, params)
-        segments = []
+        data, validators = self._conditional_get(
+            GET_SKIP_SEGMENTS + "/" + prefix,
+            params,
+            validators,
+            endpoint=GET_SKIP_SEGMENTS + "/:sha256HashPrefix",
+        )
+        bucket = {}
 
         for video in data:
-            if video_id == video["videoID"]:
-                for raw in video["segments"]:
-                    start, end = raw["segment"]
-                    seg = SponsorSegment(raw["UUID"], raw["category"], start, end)
-                    segments.append(seg)
+            segments = [_segment_from_raw(raw) for raw in video["segments"]]
+            segments.sort(key=lambda seg: seg.start)
+            bucket[video["videoID"]] = segments
 
-                break
+        return bucket, validators
 
-        segments.sort(key=lambda seg: seg.start)
-        return segments
+    def _send_queued(self, url, params):  # type: (str, dict) -> None
+        self._request("POST", url, params, is_json=False)
 
     def vote_sponsor_segment(
-        self, segment, upvote=False
-    ):  # type: (Union[str, SponsorSegment], bool) -> None
-        self._request(
-            "POST",
+        self, segment, upvote=False, on_done=None
+    ):  # type: (Union[str, SponsorSegment], bool, Optional[Callable[[Optional[Exception]], None]]) -> None
+        """Queue a vote on a segment.
+
+        The vote is sent in the background and retried until the server accepts or rejects it.
+
+        Args:
+            on_done: Called with `None` once the vote was accepted or with the error if it was rejected.
+        """
+        self._outbox.put(
             VOTE_ON_SPONSOR_TIME,
             {
                 "UUID": get_segment_uuid(segment),
                 "userID": self._user_id,
                 "type": int(upvote),
             },
-            is_json=False,
+            on_done=on_done,
         )
 
     def viewed_sponsor_segment(
         self, segment
     ):  # type: (Union[str, SponsorSegment]) -> None
-        self._request(
-            "POST",
+        """Queue a report that a segment was skipped."""
+        self._outbox.put(
             VIEWED_VIDEO_SPONSOR_TIME,
             {"UUID": get_segment_uuid(segment),},
-            is_json=False,
         )
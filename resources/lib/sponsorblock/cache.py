@@ -0,0 +1,387 @@
+"""Persistent on-disk cache for skip segments.
+
+Entries are stored in an SQLite database so they survive service restarts.
+Every entry has its own TTL after which it becomes stale.
+Stale entries are still returned (flagged as such) for another `stale_ttl` seconds,
+which allows the caller to serve them immediately while revalidating in the background.
+
+Besides individual videos the cache also remembers which SHA-256 hash prefixes have been fetched in full.
+A video that isn't in the cache but whose prefix is, is known to have no segments,
+for as long as the prefix's negative TTL lasts.
+
+The HTTP validators (`ETag` / `Last-Modified`) of the response are stored alongside each entry,
+so that stale entries can be revalidated using a conditional request.
+
+Videos the server has no segments for are remembered as entries without segments.
+They have their own, shorter TTL and are never served stale, so segments submitted in the meantime
+are picked up as soon as the entry expires.
+
+The segments of recently used entries are also kept in memory, packed by a `CompactSegmentStore`,
+so looking them up again only reads the metadata of the entry from the database.
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+
+from .compact import CompactSegmentStore
+from .models import SponsorSegment
+from .utils import hash_prefix
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL = 6 * 60 * 60
+"""Seconds for which a freshly fetched entry is considered up to date."""
+
+DEFAULT_STALE_TTL = 7 * 24 * 60 * 60
+"""Seconds after expiry during which a stale entry is still returned."""
+
+DEFAULT_NEGATIVE_TTL = 60 * 60
+"""Seconds for which a video is remembered to have no segments."""
+
+DEFAULT_MAX_ENTRIES = 5000
+"""Number of videos kept in the cache before the least recently used ones are evicted."""
+
+DEFAULT_MEMORY_ENTRIES = 1000
+"""Number of videos whose segments are also kept in memory."""
+
+Validators = namedtuple("Validators", ("etag", "last_modified"))
+CacheEntry = namedtuple("CacheEntry", ("segments", "stale", "validators"))
+PrefixEntry = namedtuple("PrefixEntry", ("stale", "validators", "knows_missing"))
+"""`knows_missing` tells whether videos that aren't part of the bucket are still known to have no segments."""
+
+_SCHEMA_VERSION = 5
+"""Bumped whenever `_SCHEMA` or what is stored in it changes. Caches with a different version are discarded."""
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS segments (
+    video_id TEXT PRIMARY KEY,
+    hash_prefix TEXT NOT NULL,
+    categories TEXT NOT NULL,
+    segments TEXT NOT NULL,
+    expires_at REAL NOT NULL,
+    accessed_at REAL NOT NULL,
+    etag TEXT,
+    last_modified TEXT
+);
+CREATE INDEX IF NOT EXISTS segments_accessed_at ON segments (accessed_at);
+CREATE INDEX IF NOT EXISTS segments_hash_prefix ON segments (hash_prefix);
+
+CREATE TABLE IF NOT EXISTS prefixes (
+    hash_prefix TEXT PRIMARY KEY,
+    categories TEXT NOT NULL,
+    expires_at REAL NOT NULL,
+    negative_expires_at REAL NOT NULL,
+    etag TEXT,
+    last_modified TEXT
+);
+"""
+
+
+def _dump_segments(segments):  # type: (Iterable[SponsorSegment]) -> str
+    return json.dumps([list(seg) for seg in segments], separators=(",", ":"))
+
+
+_NO_SEGMENTS = _dump_segments(())
+
+
+def _load_segments(raw):  # type: (str) -> list[SponsorSegment]
+    return [SponsorSegment(*seg) for seg in json.loads(raw)]
+
+
+def _load_validators(etag, last_modified):  # type: (Optional[str], Optional[str]) -> Optional[Validators]
+    if etag is None and last_modified is None:
+        return None
+
+    return Validators(etag, last_modified)
+
+
+def _dump_validators(validators):  # type: (Optional[Validators]) -> tuple[Optional[str], Optional[str]]
+    if validators is None:
+        return None, None
+
+    return validators.etag, validators.last_modified
+
+
+class SegmentCache:
+    def __init__(
+        self,
+        path,
+        ttl=DEFAULT_TTL,
+        stale_ttl=DEFAULT_STALE_TTL,
+        max_entries=DEFAULT_MAX_ENTRIES,
+        negative_ttl=DEFAULT_NEGATIVE_TTL,
+        memory_entries=DEFAULT_MEMORY_ENTRIES,
+    ):  # type: (str, float, float, int, float, int) -> None
+        self._ttl = ttl
+        self._stale_ttl = stale_ttl
+        self._negative_ttl = negative_ttl
+        self._max_entries = max_entries
+
+        if path != ":memory:":
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+
+        # the connection is shared between the Kodi callback threads and the
+        # background revalidation, access is serialised using `_lock`.
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._migrate()
+        # only ever holds the segments a database row currently has, the row decides whether they're served
+        self._memory = CompactSegmentStore(max_videos=memory_entries)
+
+        self.prune()
+
+    def _migrate(self):  # type: () -> None
+        (version,) = self._conn.execute("PRAGMA user_version").fetchone()
+        if version == _SCHEMA_VERSION:
+            return
+
+        if version:
+            logger.info("segment cache has outdated version %d, discarding it", version)
+
+        with self._conn:
+            self._conn.executescript(
+                "DROP TABLE IF EXISTS segments; DROP TABLE IF EXISTS prefixes;" + _SCHEMA
+            )
+            self._conn.execute("PRAGMA user_version = {:d}".format(_SCHEMA_VERSION))
+
+    def close(self):  # type: () -> None
+        with self._lock:
+            self._conn.close()
+
+    def set_negative_ttl(self, ttl):  # type: (float) -> None
+        """Set for how long videos without segments are remembered, 0 to not remember them at all."""
+        self._negative_ttl = ttl
+
+    def get(self, video_id, categories):  # type: (str, str) -> Optional[CacheEntry]
+        """Get the cached segments for a video.
+
+        Entries that were fetched for a different set of categories are treated as missing.
+        An entry without segments means that the video is known to have none.
+
+        Returns:
+            The cache entry or `None` if there is no usable entry.
+        """
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT categories, segments = ?, expires_at, etag, last_modified "
+                "FROM segments WHERE video_id = ?",
+                (_NO_SEGMENTS, video_id),
+            ).fetchone()
+            if row is None:
+                return None
+
+            entry_categories, no_segments, expires_at, etag, last_modified = row
+            if entry_categories != categories:
+                return None
+
+            # a video without segments may have gotten some in the meantime, don't serve that stale
+            stale_ttl = 0 if no_segments else self._stale_ttl
+            if now >= expires_at + stale_ttl:
+                self._delete_video(video_id)
+                return None
+
+            self._conn.execute(
+                "UPDATE segments SET accessed_at = ? WHERE video_id = ?", (now, video_id)
+            )
+
+            segments = [] if no_segments else self._memory.get(video_id)
+            if segments is None:
+                (raw_segments,) = self._conn.execute(
+                    "SELECT segments FROM segments WHERE video_id = ?", (video_id,)
+                ).fetchone()
+                segments = self._remember(video_id, _load_segments(raw_segments))
+
+        return CacheEntry(
+            segments,
+            stale=now >= expires_at,
+            validators=_load_validators(etag, last_modified),
+        )
+
+    def get_prefix(self, prefix, categories):  # type: (str, str) -> Optional[PrefixEntry]
+        """Check whether all videos sharing the hash prefix are cached.
+
+        Returns:
+            The prefix entry or `None` if the prefix hasn't been fetched for the categories.
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT categories, expires_at, negative_expires_at, etag, last_modified "
+                "FROM prefixes WHERE hash_prefix = ?",
+                (prefix,),
+            ).fetchone()
+
+        if row is None:
+            return None
+
+        entry_categories, expires_at, negative_expires_at, etag, last_modified = row
+        if entry_categories != categories or now >= expires_at + self._stale_ttl:
+            return None
+
+        return PrefixEntry(
+            stale=now >= expires_at,
+            validators=_load_validators(etag, last_modified),
+            knows_missing=now < negative_expires_at,
+        )
+
+    def put(self, video_id, categories, segments, ttl=None, validators=None):
+        # type: (str, str, Iterable[SponsorSegment], Optional[float], Optional[Validators]) -> None
+        if ttl is None:
+            ttl = self._ttl
+
+        now = time.time()
+        with self._lock, self._conn:
+            self._insert(
+                video_id, hash_prefix(video_id), categories, segments, now + ttl, now, validators
+            )
+            self._evict()
+
+    def put_missing(self, video_id, categories):  # type: (str, str) -> None
+        """Remember that a video has no segments for the negative TTL."""
+        ttl = self._negative_ttl
+        if ttl <= 0:
+            self.delete(video_id)
+            return
+
+        self.put(video_id, categories, (), ttl=ttl)
+
+    def put_bucket(self, prefix, categories, bucket, ttl=None, validators=None):
+        # type: (str, str, dict[str, list[SponsorSegment]], Optional[float], Optional[Validators]) -> None
+        """Store all videos sharing a hash prefix.
+
+        Previously cached videos with the same prefix that are no longer part of the bucket are removed.
+        Videos that aren't part of it are known to have no segments for the negative TTL.
+        """
+        if ttl is None:
+            ttl = self._ttl
+
+        now = time.time()
+        expires_at = now + ttl
+        negative_expires_at = now + min(self._negative_ttl, ttl)
+        with self._lock, self._conn:
+            replaced = self._conn.execute(
+                "SELECT video_id FROM segments WHERE hash_prefix = ?", (prefix,)
+            ).fetchall()
+            self._conn.execute("DELETE FROM segments WHERE hash_prefix = ?", (prefix,))
+            self._forget(video_id for (video_id,) in replaced)
+            for video_id, segments in bucket.items():
+                self._insert(video_id, prefix, categories, segments, expires_at, now, None)
+
+            self._conn.execute(
+                "INSERT OR REPLACE INTO prefixes VALUES (?, ?, ?, ?, ?, ?)",
+                (prefix, categories, expires_at, negative_expires_at) + _dump_validators(validators),
+            )
+            self._evict()
+
+    def touch(self, video_id, ttl=None):  # type: (str, Optional[float]) -> None
+        """Mark the entry of a video as up to date again after it was successfully revalidated."""
+        if ttl is None:
+            ttl = self._ttl
+
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE segments SET expires_at = ? WHERE video_id = ?",
+                (time.time() + ttl, video_id),
+            )
+
+    def touch_prefix(self, prefix, ttl=None):  # type: (str, Optional[float]) -> None
+        """Mark a prefix and all videos in it as up to date again after it was successfully revalidated."""
+        if ttl is None:
+            ttl = self._ttl
+
+        now = time.time()
+        expires_at = now + ttl
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE prefixes SET expires_at = ?, negative_expires_at = ? WHERE hash_prefix = ?",
+                (expires_at, now + min(self._negative_ttl, ttl), prefix),
+            )
+            self._conn.execute(
+                "UPDATE segments SET expires_at = ? WHERE hash_prefix = ?", (expires_at, prefix)
+            )
+
+    def delete(self, video_id):  # type: (str) -> None
+        with self._lock, self._conn:
+            self._delete_video(video_id)
+
+    def _insert(self, video_id, prefix, categories, segments, expires_at, now, validators):
+        # type: (str, str, str, Iterable[SponsorSegment], float, float, Optional[Validators]) -> None
+        segments = list(segments)
+        self._conn.execute(
+            "INSERT OR REPLACE INTO segments VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (video_id, prefix, categories, _dump_segments(segments), expires_at, now)
+            + _dump_validators(validators),
+        )
+        if segments:
+            self._remember(video_id, segments)
+        else:
+            self._memory.discard(video_id)
+
+    def _remember(self, video_id, segments):  # type: (str, list[SponsorSegment]) -> Sequence[SponsorSegment]
+        """Keep the segments of a video in memory.
+
+        Returns:
+            The packed segments, or the given ones if they can't be packed.
+        """
+        try:
+            return self._memory.put(video_id, segments)
+        except ValueError:
+            # more distinct categories and action types than the packed representation has codes for
+            logger.warning("can't keep the segments of video %s in memory", video_id, exc_info=True)
+            self._memory.discard(video_id)
+            return segments
+
+    def _forget(self, video_ids):  # type: (Iterable[str]) -> None
+        """Drop the in-memory segments of deleted videos."""
+        for video_id in video_ids:
+            self._memory.discard(video_id)
+
+    def _delete_video(self, video_id):  # type: (str) -> None
+        self._conn.execute("DELETE FROM segments WHERE video_id = ?", (video_id,))
+        self._memory.discard(video_id)
+        # without the video the prefix would falsely claim that it has no segments
+        self._conn.execute(
+            "DELETE FROM prefixes WHERE hash_prefix = ?", (hash_prefix(video_id),)
+        )
+
+    def prune(self):  # type: () -> None
+        """Remove all entries that are too old to be served, even as stale entries."""
+        now = time.time()
+        cutoff = now - self._stale_ttl
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM prefixes WHERE expires_at <= ?", (cutoff,))
+            expired = self._conn.execute(
+                "SELECT video_id FROM segments WHERE expires_at <= ? OR (segments = ? AND expires_at <= ?)",
+                (cutoff, _NO_SEGMENTS, now),
+            ).fetchall()
+            self._conn.executemany("DELETE FROM segments WHERE video_id = ?", expired)
+            self._forget(video_id for (video_id,) in expired)
+        if expired:
+            logger.debug("pruned %d expired cache entries", len(expired))
+
+    def _evict(self):  # type: () -> None
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM segments").fetchone()
+        excess = count - self._max_entries
+        if excess <= 0:
+            return
+
+        logger.debug("evicting %d least recently used cache entries", excess)
+        evicted = self._conn.execute(
+            "SELECT video_id, hash_prefix FROM segments ORDER BY accessed_at, rowid LIMIT ?",
+            (excess,),
+        ).fetchall()
+        self._conn.executemany(
+            "DELETE FROM segments WHERE video_id = ?", ((video_id,) for video_id, _ in evicted)
+        )
+        self._forget(video_id for video_id, _ in evicted)
+        self._conn.executemany(
+            "DELETE FROM prefixes WHERE hash_prefix = ?", {(prefix,) for _, prefix in evicted}
+        )
@@ -3,6 +3,15 @@ DEFAULT_SERVER = "sponsor.ajay.app"
 _BASE_URL = "https://{SERVER}"
 _API_URL = _BASE_URL + "/api"
 
+
+def endpoint_path(url):  # type: (str) -> str
+    """Path of an endpoint's URL template, for instance `/api/skipSegments`."""
+    if url.startswith(_BASE_URL):
+        return url[len(_BASE_URL):]
+    return url
+
+
+STATUS = _API_URL + "/status"
 GET_SKIP_SEGMENTS = _API_URL + "/skipSegments"
 VOTE_ON_SPONSOR_TIME = _API_URL + "/voteOnSponsorTime"
 VIEWED_VIDEO_SPONSOR_TIME = _API_URL + "/viewedVideoSponsorTime"
@@ -7,6 +7,10 @@ class ResponseError(SponsorBlockError):
         self.response = resp
 
 
+class NotModified(ResponseError):
+    """The validators sent with a conditional request are still current."""
+
+
 class NotFound(ResponseError):
     pass
 
@@ -17,6 +21,8 @@ class Duplicate(ResponseError):
 
 def error_from_response(resp):  # type: (requests.Response) -> ResponseError
     code = resp.status_code
+    if code == 304:
+        return NotModified(resp)
     if code == 404:
         return NotFound(resp)
 
@@ -0,0 +1,318 @@
+"""Local mirror of the SponsorBlock database, built from the public CSV dump (`sponsorTimes.csv`).
+
+The dump is streamed row by row into an SQLite database clustered by video ID,
+so the import needs constant memory no matter how big the dump is and a lookup is a single index seek.
+Rows the server wouldn't return (hidden, shadow hidden, voted down or for another service) are dropped
+while importing.
+
+The new database is built next to the current one and swapped in once it's complete,
+an interrupted import leaves the previous mirror intact.
+"""
+
+import csv
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from .models import ACTION_SKIP, ACTION_TYPES, SponsorSegment
+
+logger = logging.getLogger(__name__)
+
+MIN_VOTES = -1
+"""Segments with fewer votes are hidden by the server and skipped by the import."""
+
+SERVICE_YOUTUBE = "YouTube"
+
+IMPORT_BATCH_SIZE = 10000
+"""Rows inserted per statement while importing, bounds the memory used by the import."""
+
+CSV_FIELD_SIZE_LIMIT = 1 << 24
+"""Largest field accepted in the dump. Some rows carry long descriptions or user agents."""
+
+_SCHEMA_VERSION = 1
+"""Bumped whenever `_SCHEMA` changes. Mirrors with a different version have to be imported again."""
+
+_SCHEMA = """
+CREATE TABLE segments (
+    video_id TEXT NOT NULL,
+    uuid TEXT NOT NULL,
+    category TEXT NOT NULL,
+    action_type TEXT NOT NULL,
+    start REAL NOT NULL,
+    end REAL NOT NULL,
+    votes INTEGER NOT NULL,
+    locked INTEGER NOT NULL,
+    PRIMARY KEY (video_id, uuid)
+) WITHOUT ROWID;
+
+CREATE TABLE meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+_COLUMNS = (
+    "videoID",
+    "UUID",
+    "category",
+    "actionType",
+    "startTime",
+    "endTime",
+    "votes",
+    "locked",
+    "service",
+    "hidden",
+    "shadowHidden",
+)
+_REQUIRED_COLUMNS = ("videoID", "UUID", "category", "startTime", "endTime", "votes")
+
+_DEFAULTS = {
+    "actionType": ACTION_SKIP,
+    "locked": "0",
+    "service": SERVICE_YOUTUBE,
+    "hidden": "0",
+    "shadowHidden": "0",
+}
+"""Values for columns missing from older dumps."""
+
+
+class DumpFormatError(Exception):
+    pass
+
+
+def _column_getters(header):  # type: (list[str]) -> dict[str, Callable[[list[str]], str]]
+    index = {name: i for i, name in enumerate(header)}
+    missing = [name for name in _REQUIRED_COLUMNS if name not in index]
+    if missing:
+        raise DumpFormatError("dump is missing the columns {}".format(", ".join(missing)))
+
+    getters = {}
+    for name in _COLUMNS:
+        if name in index:
+            i = index[name]
+            getters[name] = lambda row, i=i: row[i]
+        else:
+            default = _DEFAULTS[name]
+            getters[name] = lambda row, default=default: default
+
+    return getters
+
+
+def _read_dump(fp, min_votes):  # type: (IO[str], int) -> Iterator[tuple]
+    reader = csv.reader(fp)
+    try:
+        header = next(reader)
+    except StopIteration:
+        raise DumpFormatError("dump is empty")
+
+    get = _column_getters(header)
+    get_video_id, get_uuid, get_category, get_action_type, get_start, get_end, get_votes, get_locked, \
+        get_service, get_hidden, get_shadow_hidden = (get[name] for name in _COLUMNS)
+
+    for row in reader:
+        try:
+            if get_service(row) != SERVICE_YOUTUBE or get_hidden(row) != "0" or get_shadow_hidden(row) != "0":
+                continue
+
+            votes = int(get_votes(row))
+            if votes < min_votes:
+                continue
+
+            yield (
+                get_video_id(row),
+                get_uuid(row),
+                get_category(row),
+                get_action_type(row),
+                float(get_start(row)),
+                float(get_end(row)),
+                votes,
+                int(get_locked(row)),
+            )
+        except (IndexError, ValueError):
+            logger.debug("skipping malformed row in dump: %r", row)
+
+
+def _batches(rows, size):  # type: (Iterable[T], int) -> Iterator[list[T]]
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+
+    if batch:
+        yield batch
+
+
+def _choose_segments(rows):  # type: (list[tuple]) -> list[SponsorSegment]
+    """Pick one segment out of every group of overlapping segments with the same category and action type.
+
+    The server picks a random segment weighted by the votes, the mirror always picks the best one:
+    locked segments first, then the one with the most votes.
+
+    Args:
+        rows: `(uuid, category, start, end, action_type, votes, locked)` ordered by category, action type and start.
+
+    Returns:
+        The chosen segments ordered by start.
+    """
+    segments = []
+    best = None
+    group_end = None
+    for row in rows:
+        _, category, start, end, action_type, votes, locked = row
+        if best is not None and start < group_end and (category, action_type) == (best[1], best[4]):
+            group_end = max(group_end, end)
+            if (locked, votes) > (best[6], best[5]):
+                best = row
+            continue
+
+        if best is not None:
+            segments.append(SponsorSegment(*best[:5]))
+        best = row
+        group_end = end
+
+    if best is not None:
+        segments.append(SponsorSegment(*best[:5]))
+
+    segments.sort(key=lambda seg: seg.start)
+    return segments
+
+
+class SegmentMirror:
+    def __init__(self, path):  # type: (str) -> None
+        self._path = path
+        # the connection is shared between the Kodi callback threads and the import, access is serialised using `_lock`.
+        self._lock = threading.Lock()
+        self._conn = None  # type: Optional[sqlite3.Connection]
+        self._meta = {}  # type: dict[str, str]
+
+        self._open()
+
+    @property
+    def ready(self):  # type: () -> bool
+        """Whether a dump has been imported."""
+        return self._conn is not None
+
+    @property
+    def source(self):  # type: () -> tuple[Optional[str], Optional[float]]
+        """Path and modification time of the dump the mirror was built from."""
+        meta = self._meta
+        mtime = meta.get("source_mtime")
+        return meta.get("source"), float(mtime) if mtime is not None else None
+
+    def _open(self):  # type: () -> None
+        if not os.path.isfile(self._path):
+            return
+
+        conn = sqlite3.connect(self._path, check_same_thread=False)
+        try:
+            (version,) = conn.execute("PRAGMA user_version").fetchone()
+            if version != _SCHEMA_VERSION:
+                logger.info("segment mirror has outdated version %d, it has to be imported again", version)
+                conn.close()
+                return
+
+            meta = dict(conn.execute("SELECT key, value FROM meta"))
+        except sqlite3.Error:
+            logger.exception("failed to open segment mirror at %s", self._path)
+            conn.close()
+            return
+
+        with self._lock:
+            old_conn = self._conn
+            self._conn = conn
+            self._meta = meta
+
+        if old_conn is not None:
+            old_conn.close()
+
+        logger.info("opened segment mirror with %s segments from %s", meta.get("rows"), meta.get("source"))
+
+    def close(self):  # type: () -> None
+        with self._lock:
+            conn = self._conn
+            self._conn = None
+
+        if conn is not None:
+            conn.close()
+
+    def get(self, video_id, categories, action_types=ACTION_TYPES):
+        # type: (str, Iterable[str], Iterable[str]) -> list[SponsorSegment]
+        """Get the segments of a video in the given categories, ordered by start.
+
+        Returns:
+            List of segments, empty if the video has none or no dump has been imported.
+        """
+        categories = list(categories)
+        action_types = list(action_types)
+        query = (
+            "SELECT uuid, category, start, end, action_type, votes, locked FROM segments "
+            "WHERE video_id = ? AND category IN ({}) AND action_type IN ({}) "
+            "ORDER BY category, action_type, start, end"
+        ).format(",".join("?" * len(categories)), ",".join("?" * len(action_types)))
+
+        with self._lock:
+            if self._conn is None or not categories:
+                return []
+            rows = self._conn.execute(query, [video_id] + categories + action_types).fetchall()
+
+        return _choose_segments(rows)
+
+    def import_dump(self, dump_path, min_votes=MIN_VOTES):  # type: (str, int) -> int
+        """Build the mirror from a `sponsorTimes.csv` dump and swap it in.
+
+        Returns:
+            Number of imported segments.
+        """
+        start = time.monotonic()
+        tmp_path = self._path + ".tmp"
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+        directory = os.path.dirname(self._path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        field_size_limit = csv.field_size_limit(CSV_FIELD_SIZE_LIMIT)
+        conn = sqlite3.connect(tmp_path)
+        try:
+            # nobody reads the database while it's being built
+            conn.execute("PRAGMA journal_mode = OFF")
+            conn.execute("PRAGMA synchronous = OFF")
+            conn.executescript(_SCHEMA)
+
+            count = 0
+            with open(dump_path, "r", encoding="utf-8", newline="") as fp:
+                for batch in _batches(_read_dump(fp, min_votes), IMPORT_BATCH_SIZE):
+                    with conn:
+                        conn.executemany("INSERT OR REPLACE INTO segments VALUES (?, ?, ?, ?, ?, ?, ?, ?)", batch)
+                    count += len(batch)
+
+            with conn:
+                conn.executemany(
+                    "INSERT INTO meta VALUES (?, ?)",
+                    [
+                        ("source", dump_path),
+                        ("source_mtime", repr(os.path.getmtime(dump_path))),
+                        ("imported_at", repr(time.time())),
+                        ("rows", str(count)),
+                    ],
+                )
+            conn.execute("PRAGMA user_version = {:d}".format(_SCHEMA_VERSION))
+        except BaseException:
+            conn.close()
+            os.remove(tmp_path)
+            raise
+        finally:
+            csv.field_size_limit(field_size_limit)
+
+        conn.close()
+        self.close()
+        os.replace(tmp_path, self._path)
+        self._open()
+
+        logger.info("imported %d segments from %s in %.1fs", count, dump_path, time.monotonic() - start)
+        return count
@@ -1,3 +1,26 @@
 from collections import namedtuple
 
-SponsorSegment = namedtuple("SponsorSegment", ("uuid", "category", "start", "end"))
+CATEGORIES = (
+    "sponsor",
+    "selfpromo",
+    "interaction",
+    "intro",
+    "outro",
+    "preview",
+    "music_offtopic",
+    "filler",
+)
+"""Known categories of segments that are skipped."""
+
+ACTION_SKIP = "skip"
+ACTION_MUTE = "mute"
+
+ACTION_TYPES = (ACTION_SKIP, ACTION_MUTE)
+"""Action types of the segments that are fetched.
+
+Segments with the mute action type are muted instead of skipped, the video keeps playing.
+"""
+
+SponsorSegment = namedtuple(
+    "SponsorSegment", ("uuid", "category", "start", "end", "action_type"), defaults=(ACTION_SKIP,)
+)
@@ -0,0 +1,212 @@
+"""Background sender for requests whose response nobody waits for (votes, viewed reports).
+
+Requests are queued and sent by a single thread.
+Queuing the same request again while it's still pending replaces the pending one.
+Failed requests are retried with exponential backoff and spooled to disk,
+so they're sent on the next start if the service stops before they succeed.
+Whoever queued a request can be told once the server accepted or rejected it,
+this isn't spooled though.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from .errors import ResponseError
+from .utils import write_json_atomic
+
+logger = logging.getLogger(__name__)
+
+RETRY_BASE_DELAY = 5
+"""Seconds to wait before the first retry, doubled for every subsequent attempt."""
+
+RETRY_MAX_DELAY = 60 * 60
+"""Upper limit for the delay between retries."""
+
+SHUTDOWN_TIMEOUT = 2
+"""Seconds to wait for a request that is being sent while closing."""
+
+
+def _request_key(url, params):  # type: (str, dict) -> tuple
+    # a later vote by the same user on the same segment supersedes the earlier one,
+    # for everything else only identical requests are coalesced.
+    return url, params.get("UUID"), params.get("userID")
+
+
+def _is_permanent_error(exc):  # type: (Exception) -> bool
+    if not isinstance(exc, ResponseError):
+        return False
+
+    code = exc.response.status_code
+    return 400 <= code < 500 and code != 429
+
+
+class _Pending:
+    __slots__ = ("url", "params", "on_done", "attempts", "not_before")
+
+    def __init__(self, url, params, on_done=None):
+        # type: (str, dict, Optional[Callable[[Optional[Exception]], None]]) -> None
+        self.url = url
+        self.params = params
+        self.on_done = on_done
+        self.attempts = 0
+        self.not_before = 0.0
+
+
+class Outbox:
+    def __init__(self, send, spool_path=None):  # type: (Callable[[str, dict], None], Optional[str]) -> None
+        self._send = send
+        self._spool_path = spool_path
+
+        self._pending = OrderedDict()  # type: OrderedDict[tuple, _Pending]
+        self._cond = threading.Condition()
+        self._stop = False
+
+        self._load_spool()
+
+        self._thread = threading.Thread(
+            target=self.__t_run, name="SponsorBlock Outbox", daemon=True
+        )
+        self._thread.start()
+
+    def put(self, url, params, on_done=None):
+        # type: (str, dict, Optional[Callable[[Optional[Exception]], None]]) -> None
+        """Queue a request.
+
+        Args:
+            url: URL template, it's formatted when the request is sent.
+            params: Request parameters.
+            on_done: Called from the sending thread with `None` once the request was sent,
+                or with the error if the server rejected it. Not called for a request replaced before it's sent.
+        """
+        key = _request_key(url, params)
+        with self._cond:
+            if key in self._pending:
+                logger.debug("coalescing queued request to %s", url)
+                del self._pending[key]
+
+            self._pending[key] = _Pending(url, params, on_done)
+            self._cond.notify_all()
+
+    def close(self):  # type: () -> None
+        """Stop sending and spool everything that hasn't been sent yet."""
+        with self._cond:
+            self._stop = True
+            self._cond.notify_all()
+
+        self._thread.join(SHUTDOWN_TIMEOUT)
+
+        with self._cond:
+            self._write_spool()
+
+    def __t_next(self):  # type: () -> Optional[tuple]
+        """Wait until a request is due.
+
+        Returns:
+            Key of the due request or `None` when stopping.
+        """
+        with self._cond:
+            while not self._stop:
+                now = time.monotonic()
+                wait_for = None
+                for key, pending in self._pending.items():
+                    if pending.not_before <= now:
+                        return key
+
+                    remaining = pending.not_before - now
+                    if wait_for is None or remaining < wait_for:
+                        wait_for = remaining
+
+                self._cond.wait(wait_for)
+
+        return None
+
+    def __t_run(self):  # type: () -> None
+        while True:
+            key = self.__t_next()
+            if key is None:
+                return
+
+            with self._cond:
+                pending = self._pending.get(key)
+            if pending is None:
+                continue
+
+            try:
+                self._send(pending.url, pending.params)
+            except Exception as exc:
+                self.__failed(key, pending, exc)
+            else:
+                logger.debug("sent queued request to %s", pending.url)
+                self.__done(key, pending)
+
+    def __done(self, key, pending, error=None):  # type: (tuple, _Pending, Optional[Exception]) -> None
+        with self._cond:
+            # it might have been replaced while it was being sent
+            if self._pending.get(key) is pending:
+                del self._pending[key]
+
+            # once something was spooled, keep the spool in sync so a sent request isn't sent again after a restart
+            if self._spool_path and os.path.exists(self._spool_path):
+                self._write_spool()
+
+        if pending.on_done is not None:
+            try:
+                pending.on_done(error)
+            except Exception:
+                logger.exception("outbox callback for request to %s failed", pending.url)
+
+    def __failed(self, key, pending, exc):  # type: (tuple, _Pending, Exception) -> None
+        if _is_permanent_error(exc):
+            logger.warning(
+                "dropping queued request to %s, server rejected it with status %d",
+                pending.url, exc.response.status_code,
+            )
+            self.__done(key, pending, exc)
+            return
+
+        pending.attempts += 1
+        delay = min(RETRY_BASE_DELAY * 2 ** (pending.attempts - 1), RETRY_MAX_DELAY)
+        pending.not_before = time.monotonic() + delay
+        logger.info(
+            "failed to send queued request to %s (attempt %d), retrying in %d second(s): %r",
+            pending.url, pending.attempts, delay, exc,
+        )
+
+        with self._cond:
+            self._write_spool()
+
+    def _load_spool(self):  # type: () -> None
+        path = self._spool_path
+        if not path or not os.path.isfile(path):
+            return
+
+        try:
+            with open(path, "r") as fp:
+                spooled = json.load(fp)
+        except Exception:
+            logger.exception("failed to read spooled requests from %s", path)
+            return
+
+        logger.info("sending %d spooled request(s)", len(spooled))
+        for url, params in spooled:
+            self._pending[_request_key(url, params)] = _Pending(url, params)
+
+    def _write_spool(self):  # type: () -> None
+        """Write the pending requests to disk. Must be called with `_cond` held."""
+        path = self._spool_path
+        if not path:
+            return
+
+        try:
+            if not self._pending:
+                if os.path.exists(path):
+                    os.remove(path)
+                return
+
+            write_json_atomic(path, [[p.url, p.params] for p in self._pending.values()])
+        except Exception:
+            logger.exception("failed to spool pending requests to %s", path)
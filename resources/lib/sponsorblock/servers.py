@@ -0,0 +1,131 @@
+"""Ranking of compatible API servers (the official one and its mirrors) by how well they respond.
+
+Every server keeps a moving estimate of its latency and error rate.
+Requests go to the best ranked server, and if it doesn't answer within its usual (95th percentile) latency
+a hedged duplicate is sent to the next one.
+"""
+
+import threading
+import time
+from collections import deque
+
+from .utils import quantile
+
+DEFAULT_LATENCY = 0.5
+"""Latency in seconds assumed for a server without samples."""
+
+LATENCY_SMOOTHING = 0.2
+"""Weight of a new sample in the moving latency and error estimates."""
+
+ERROR_PENALTY = 10.0
+"""How much an error rate of 1 inflates a server's latency when ranking."""
+
+ERROR_HALF_LIFE = 5 * 60
+"""Seconds after which half of a server's error estimate is forgiven.
+
+Keeps a server that failed for a while from being avoided forever.
+"""
+
+WINDOW_SIZE = 50
+"""Number of recent latencies kept per server for the hedging delay."""
+
+MIN_HEDGE_SAMPLES = 10
+"""Number of latencies needed before the hedging delay follows the server's percentile."""
+
+DEFAULT_HEDGE_DELAY = 1.0
+MIN_HEDGE_DELAY = 0.1
+MAX_HEDGE_DELAY = 5.0
+
+
+def parse_servers(value):  # type: (Union[str, Iterable[str], None]) -> list[str]
+    """Parse a comma separated list of servers, dropping empty entries and duplicates."""
+    if value is None:
+        return []
+    if isinstance(value, str):
+        value = value.split(",")
+
+    servers = []
+    for server in value:
+        server = server.strip()
+        if server and server not in servers:
+            servers.append(server)
+
+    return servers
+
+
+class ServerStats:
+    def __init__(self, window=WINDOW_SIZE):  # type: (int) -> None
+        self.latency = None  # type: Optional[float]
+        self._error_rate = 0.0
+        self._error_updated_at = time.monotonic()
+        self._latencies = deque(maxlen=window)  # type: deque[float]
+
+    def error_rate(self, now=None):  # type: (Optional[float]) -> float
+        if now is None:
+            now = time.monotonic()
+
+        age = now - self._error_updated_at
+        return self._error_rate * 0.5 ** (age / ERROR_HALF_LIFE)
+
+    def record(self, latency, ok):  # type: (float, bool) -> None
+        now = time.monotonic()
+        self._error_rate = (1 - LATENCY_SMOOTHING) * self.error_rate(now) + LATENCY_SMOOTHING * (not ok)
+        self._error_updated_at = now
+
+        # failures say nothing about how fast a working server answers
+        if not ok:
+            return
+
+        self._latencies.append(latency)
+        if self.latency is None:
+            self.latency = latency
+        else:
+            self.latency = (1 - LATENCY_SMOOTHING) * self.latency + LATENCY_SMOOTHING * latency
+
+    def score(self, now=None):  # type: (Optional[float]) -> float
+        """Expected cost of sending a request to the server, lower is better."""
+        latency = DEFAULT_LATENCY if self.latency is None else self.latency
+        return latency * (1 + ERROR_PENALTY * self.error_rate(now))
+
+    def hedge_delay(self):  # type: () -> float
+        """Seconds after which a request to the server should be hedged."""
+        if len(self._latencies) < MIN_HEDGE_SAMPLES:
+            return DEFAULT_HEDGE_DELAY
+
+        return max(MIN_HEDGE_DELAY, min(quantile(self._latencies, 0.95), MAX_HEDGE_DELAY))
+
+
+class ServerPool:
+    def __init__(self, servers):  # type: (list[str]) -> None
+        if not servers:
+            raise ValueError("at least one server is required")
+
+        self._lock = threading.Lock()
+        self._servers = list(servers)
+        self._stats = {server: ServerStats() for server in servers}
+
+    @property
+    def primary(self):  # type: () -> str
+        """The first configured server, which receives everything that isn't a lookup (votes, reports)."""
+        return self._servers[0]
+
+    @property
+    def servers(self):  # type: () -> list[str]
+        return list(self._servers)
+
+    def ranked(self):  # type: () -> list[str]
+        """Servers ordered from best to worst, ties are broken by the configured order."""
+        now = time.monotonic()
+        with self._lock:
+            return sorted(self._servers, key=lambda server: self._stats[server].score(now))
+
+    def record(self, server, latency, ok):  # type: (str, float, bool) -> None
+        with self._lock:
+            stats = self._stats.get(server)
+            if stats is not None:
+                stats.record(latency, ok)
+
+    def hedge_delay(self, server):  # type: (str) -> float
+        with self._lock:
+            return self._stats[server].hedge_delay()
+
@@ -0,0 +1,59 @@
+"""Coalescing of concurrent calls for the same key.
+
+The first caller for a key (the leader) runs the call in its own thread, everyone asking for the same key
+while it's in flight waits for the leader's future and shares its result or error.
+Once the call finished the key is forgotten, so results aren't cached here.
+"""
+
+import threading
+from concurrent.futures import Future
+
+
+class SingleFlight:
+    def __init__(self, on_shared=None):  # type: (Optional[Callable[[Hashable], None]]) -> None
+        """
+        Args:
+            on_shared: Called with the key whenever a caller joins a call that's already in flight.
+        """
+        self._on_shared = on_shared
+        self._lock = threading.Lock()
+        self._flights = {}  # type: dict[Hashable, Future]
+
+    def __len__(self):  # type: () -> int
+        return len(self._flights)
+
+    def do(self, key, fn):  # type: (Hashable, Callable[[], T]) -> T
+        """Call `fn`, unless a call for `key` is already in flight, then wait for its outcome instead."""
+        future, leader = self._join(key)
+        if leader:
+            self._run(key, future, fn)
+        elif self._on_shared is not None:
+            self._on_shared(key)
+
+        return future.result()
+
+    def _join(self, key):  # type: (Hashable) -> tuple[Future, bool]
+        with self._lock:
+            future = self._flights.get(key)
+            if future is not None:
+                return future, False
+
+            future = Future()
+            future.set_running_or_notify_cancel()
+            self._flights[key] = future
+            return future, True
+
+    def _run(self, key, future, fn):  # type: (Hashable, Future, Callable[[], T]) -> None
+        try:
+            result = fn()
+        except BaseException as e:
+            self._finish(key)
+            future.set_exception(e)
+        else:
+            self._finish(key)
+            future.set_result(result)
+
+    def _finish(self, key):  # type: (Hashable) -> None
+        # forget the key before the waiters are woken up so a later call starts a new flight
+        with self._lock:
+            del self._flights[key]
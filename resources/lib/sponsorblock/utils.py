@@ -1,9 +1,14 @@
+import hashlib
+import json
+import os
 import random
 import string
 
 _USER_ID_ALPHABET = string.ascii_letters + string.digits
 _USER_ID_LEN = 36
 
+HASH_PREFIX_LEN = 4
+
 
 def random_choices(population, amount):  # type: (Sequence[T], int) -> Iterator[T]
     for _ in range(amount):
@@ -17,3 +22,31 @@ def new_user_id():  # type: () -> str
     See: https://github.com/ajayyy/SponsorBlock/blob/6159605/src/utils.ts#L193
     """
     return "".join(random_choices(_USER_ID_ALPHABET, _USER_ID_LEN))
+
+
+def hash_prefix(video_id, length=HASH_PREFIX_LEN):  # type: (str, int) -> str
+    """Get the SHA-256 hash prefix used by the privacy preserving skip segments endpoint."""
+    return hashlib.sha256(video_id.encode()).hexdigest()[:length]
+
+
+def quantile(samples, q):  # type: (Iterable[float], float) -> float
+    """Get the sample below which the fraction `q` of all samples lies."""
+    ordered = sorted(samples)
+    return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+
+def write_json_atomic(path, data, **kwargs):  # type: (str, Any, Any) -> None
+    """Write `data` as JSON to `path`, creating its directory if needed.
+
+    The data is written to a temporary file first which then replaces `path`,
+    so readers never see a partially written file.
+    Keyword arguments are passed to `json.dump`.
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as fp:
+        json.dump(data, fp, **kwargs)
+    os.replace(tmp_path, path)
@@ -1,8 +1,31 @@
 import logging
 import os.path
+from collections import namedtuple
 
 import xbmcaddon
 import xbmcgui
+import xbmcvfs
+
+from .const import (
+    CONF_API_SERVER,
+    CONF_AUTO_UPVOTE,
+    CONF_CATEGORIES_MAP,
+    CONF_CATEGORY_CUSTOM,
+    CONF_EXTRA_PRIVACY,
+    CONF_IGNORE_UNLISTED,
+    CONF_MINIMUM_DURATION_MS,
+    CONF_MIRROR_DUMP,
+    CONF_MIRROR_ENABLED,
+    CONF_MUTE_SEGMENTS,
+    CONF_NO_SEGMENTS_TTL_MIN,
+    CONF_PREFETCH_COUNT,
+    CONF_REDUCE_SKIPS_MS,
+    CONF_SEGMENT_CHAIN_MARGIN_MS,
+    CONF_SHOW_SKIPPED_DIALOG,
+    CONF_SKIP_COUNT_TRACKING,
+    CONF_USER_ID,
+    CONF_VIDEO_END_TIME_MARGIN_MS,
+)
 
 logger = logging.getLogger()
 
@@ -11,6 +34,7 @@ ADDON = xbmcaddon.Addon()
 ADDON_ID = ADDON.getAddonInfo("id")
 ADDON_NAME = ADDON.getAddonInfo("name")
 ADDON_PATH = ADDON.getAddonInfo("path")
+PROFILE_PATH = xbmcvfs.translatePath(ADDON.getAddonInfo("profile"))
 
 RESOURCES_PATH = os.path.join(ADDON_PATH, "resources")
 SKINS_PATH = os.path.join(RESOURCES_PATH, "skins")
@@ -40,6 +64,100 @@ def set_config(key, value):  # type: (str, Any) -> bool
     return fset(key, value)
 
 
+Settings = namedtuple(
+    "Settings",
+    (
+        "user_id",
+        "api_server",
+        "categories",
+        "extra_privacy",
+        "ignore_unlisted",
+        "show_skipped_dialog",
+        "auto_upvote",
+        "skip_count_tracking",
+        "mute_segments",
+        "prefetch_count",
+        "mirror_enabled",
+        "mirror_dump",
+        "no_segments_ttl",
+        "minimum_duration",
+        "segment_chain_margin",
+        "reduce_skips",
+        "video_end_time_margin",
+    ),
+)
+"""Immutable snapshot of the add-on settings.
+
+Durations are converted from the milliseconds (or minutes) used in the settings to seconds.
+"""
+
+
+def _get_seconds_config(key):  # type: (str) -> float
+    return get_config(key, int) / 1000.0
+
+
+def _get_categories_config():  # type: () -> tuple[str, ...]
+    categories = [
+        category
+        for category, conf_key in CONF_CATEGORIES_MAP.items()
+        if get_config(conf_key, bool)
+    ]
+
+    custom_categories = get_config(CONF_CATEGORY_CUSTOM, str)
+    for category in custom_categories.split(","):
+        category = category.strip()
+        if category and category not in categories:
+            categories.append(category)
+
+    return tuple(categories)
+
+
+def load_settings():  # type: () -> Settings
+    return Settings(
+        user_id=get_config(CONF_USER_ID, str),
+        api_server=get_config(CONF_API_SERVER, str),
+        categories=_get_categories_config(),
+        extra_privacy=get_config(CONF_EXTRA_PRIVACY, bool),
+        ignore_unlisted=get_config(CONF_IGNORE_UNLISTED, bool),
+        show_skipped_dialog=get_config(CONF_SHOW_SKIPPED_DIALOG, bool),
+        auto_upvote=get_config(CONF_AUTO_UPVOTE, bool),
+        skip_count_tracking=get_config(CONF_SKIP_COUNT_TRACKING, bool),
+        mute_segments=get_config(CONF_MUTE_SEGMENTS, bool),
+        prefetch_count=get_config(CONF_PREFETCH_COUNT, int),
+        mirror_enabled=get_config(CONF_MIRROR_ENABLED, bool),
+        mirror_dump=get_config(CONF_MIRROR_DUMP, str),
+        no_segments_ttl=60 * get_config(CONF_NO_SEGMENTS_TTL_MIN, int),
+        minimum_duration=_get_seconds_config(CONF_MINIMUM_DURATION_MS),
+        segment_chain_margin=_get_seconds_config(CONF_SEGMENT_CHAIN_MARGIN_MS),
+        reduce_skips=_get_seconds_config(CONF_REDUCE_SKIPS_MS),
+        video_end_time_margin=_get_seconds_config(CONF_VIDEO_END_TIME_MARGIN_MS),
+    )
+
+
+_settings = None  # type: Optional[Settings]
+
+
+def get_settings():  # type: () -> Settings
+    """Get the current settings snapshot.
+
+    Callers should hold on to the returned snapshot for the duration of an operation
+    instead of calling this repeatedly.
+    """
+    settings = _settings
+    if settings is None:
+        settings = reload_settings()
+
+    return settings
+
+
+def reload_settings():  # type: () -> Settings
+    """Read the settings from Kodi and replace the current snapshot."""
+    global _settings
+    settings = load_settings()
+    _settings = settings
+    return settings
+
+
 DIALOG = xbmcgui.Dialog()
 
 NOTIFICATION_INFO = xbmcgui.NOTIFICATION_INFO
@@ -1,21 +1,25 @@
 import logging
 import threading
+import time
 
 import xbmc
 
-from .const import VAR_PLAYER_SPEED
+from .const import VAR_PLAYER_PAUSED, VAR_PLAYER_SPEED
+from .skip_accuracy import SkipAccuracy
 
 logger = logging.getLogger(__name__)
 
-MAX_UNDERSHOOT = 0.25
-"""Amount of tolerance in seconds for waking up early.
+CHECKPOINT_ERROR_BUCKETS = (-0.25, -0.1, -0.05, 0.0, 0.05, 0.1, 0.25, 0.5, 1.0, 1.5)
+"""Histogram buckets for the difference between the media time at which a checkpoint fires and the checkpoint."""
 
-If the listener wakes up and the difference to the checkpoint is bigger than this value,
-it goes back to sleep for the remaining time.
-"""
+APPROACH_WINDOW = 1.0
+"""Seconds before a checkpoint at which the long sleep ends and the approach phase starts."""
+
+APPROACH_INTERVAL = 0.1
+"""Max seconds to sleep at once during the approach phase."""
 
-MAX_OVERSHOOT = 1.5
-"""Max seconds allowed to move past the start of a checkpoint before ignoring it."""
+FIRE_PRECISION = 0.01
+"""A checkpoint fires once it's less than this many seconds away."""
 
 MAX_SEEK_AGE = 3
 """Amount of time in seconds after a seek before the seek time expires.
@@ -33,38 +37,99 @@ class PlayerCheckpointListener(xbmc.Player):
     calls the `_reached_checkpoint` callback.
 
     Handles pausing, seeking, and playback speed changes.
+
+    Instead of polling `Player.getTime()`, the current media time is extrapolated from an anchor
+    (media time, monotonic time, speed) which is recorded whenever the playback state changes.
+    `getTime()` is only sampled again to correct drift before a checkpoint is fired.
+
+    Waiting for a checkpoint happens in two phases: a single long sleep until `APPROACH_WINDOW` before it,
+    followed by an approach in short steps which re-samples `getTime()` until the checkpoint is within the
+    undershoot tolerance. The rest is slept off precisely using the extrapolated time.
+
+    The undershoot tolerance and the tolerance for moving past a checkpoint before it's ignored (overshoot)
+    are provided by `SkipAccuracy`, which adapts them to the drift and firing error observed here.
     """
 
     def __init__(self, *args, **kwargs):
+        self._metrics = kwargs.pop("metrics", None)  # type: Optional[MetricsRegistry]
+        self._accuracy = kwargs.pop("accuracy", None) or SkipAccuracy()  # type: SkipAccuracy
         super(PlayerCheckpointListener, self).__init__(*args, **kwargs)
         self._playback_speed = 1.0
+        self._paused = False
 
-        self.__seek = None  # type: Optional[Tuple[float, float]]
+        self.__anchor = (0.0, 0.0, 0.0)  # type: Tuple[float, float, float]
         self.__wakeup = threading.Condition()
         self.__wakeup_triggered = False
 
         self._thread = None  # Optional[threading.Thread]
         self._stop = False
 
+    @property
+    def _effective_speed(self):  # type: () -> float
+        return 0.0 if self._paused else self._playback_speed
+
+    def _anchor_clock(self):  # type: () -> None
+        """Sample the player's time and use it as the anchor for extrapolation."""
+        self.__anchor = (self.getTime(), time.monotonic(), self._effective_speed)
+
+    def _media_time(self):  # type: () -> float
+        """Get the current media time extrapolated from the last anchor."""
+        media_time, anchored_at, speed = self.__anchor
+        return media_time + (time.monotonic() - anchored_at) * speed
+
     def __sleep_until(self, target_time):  # type: (float) -> bool
         logger.debug("waiting until %s (or until woken)", target_time)
+        # whether `getTime` was sampled since the approach started
+        resynced = False
         while not (self.__wakeup_triggered or self._stop):
-            wait_for = (target_time - self.getTime()) / self._playback_speed
-            if wait_for <= MAX_UNDERSHOOT:
+            speed = self._effective_speed
+            if speed <= 0:
+                # paused, the wakeup is about to be triggered
+                return False
+
+            # all durations are in wall time, so they don't stretch with the playback speed
+            wait_for = (target_time - self._media_time()) / speed
+            if wait_for <= FIRE_PRECISION and resynced:
                 return True
 
+            if wait_for > APPROACH_WINDOW:
+                resynced = False
+                sleep_for = wait_for - APPROACH_WINDOW
+            else:
+                if not resynced or wait_for > self._accuracy.undershoot:
+                    # the player may have stalled (buffering) since the anchor was set
+                    wait_for = self.__resync(target_time, speed)
+                    resynced = True
+                    if wait_for <= FIRE_PRECISION:
+                        return True
+
+                sleep_for = min(wait_for, APPROACH_INTERVAL)
+
             with self.__wakeup:
-                logger.debug("sleeping for %s second(s) (or until woken)", wait_for)
-                self.__wakeup.wait(wait_for)
+                if not (self.__wakeup_triggered or self._stop):
+                    logger.debug("sleeping for %s second(s) (or until woken)", sleep_for)
+                    self.__wakeup.wait(sleep_for)
 
         return False
 
+    def __resync(self, target_time, speed):  # type: (float, float) -> float
+        """Anchor the clock to the player's time again.
+
+        Returns:
+            Seconds until the target time is reached.
+        """
+        extrapolated = self._media_time()
+        self._anchor_clock()
+        media_time = self.__anchor[0]
+        self._accuracy.record_drift(extrapolated - media_time)
+        return (target_time - media_time) / speed
+
     def __idle(self):  # type: () -> bool
         if self.__wakeup_triggered or self._stop:
             return False
 
         cp = self._get_checkpoint()
-        if cp is not None and self._playback_speed > 0:
+        if cp is not None and self._effective_speed > 0:
             return self.__sleep_until(cp)
 
         logger.debug("sleeping until wakeup triggered")
@@ -81,14 +146,36 @@ class PlayerCheckpointListener(xbmc.Player):
             self._select_next_checkpoint()
             return
 
-        overshoot = self.getTime() - cp
-        if overshoot > MAX_OVERSHOOT:
+        if self.wait_for_seek_to_complete_first:
+            # the seek's wakeup may have been consumed already, have the event loop handle it
+            logger.debug("seek pending at checkpoint %s, not firing", cp)
+            self.__wakeup_triggered = True
+            return
+
+        # the end of the approach was slept off on the extrapolated time,
+        # make sure the player actually got here (the user may have seeked in the meantime).
+        self._anchor_clock()
+        overshoot = self.__anchor[0] - cp
+        if overshoot < -self._accuracy.undershoot:
+            logger.debug("player at %s isn't at checkpoint %s yet, selecting again", cp + overshoot, cp)
+            self.__count("checkpoint.results", "moved")
+            self._select_next_checkpoint()
+            return
+
+        if overshoot > self._accuracy.overshoot:
             logger.warning(
                 "overshot checkpoint %s by %s second(s), ignoring", cp, overshoot
             )
+            self._accuracy.record_dropped(overshoot)
+            self.__count("checkpoint.results", "overshot")
             self._select_next_checkpoint()
             return
 
+        self._accuracy.record_fired(overshoot)
+        self.__count("checkpoint.results", "reached")
+        if self._metrics is not None:
+            self._metrics.observe("checkpoint.error", overshoot, CHECKPOINT_ERROR_BUCKETS)
+
         try:
             self._reached_checkpoint()
         except Exception:
@@ -96,6 +183,10 @@ class PlayerCheckpointListener(xbmc.Player):
 
         self._reset_next_checkpoint()
 
+    def __count(self, name, label):  # type: (str, str) -> None
+        if self._metrics is not None:
+            self._metrics.increment(name, label)
+
     def __t_wait_for_seek_to_finish(self):
         with self.__wakeup:
             wait_for = 0.5
@@ -105,16 +196,16 @@ class PlayerCheckpointListener(xbmc.Player):
 
     def __t_event_loop(self):
         self._playback_speed = float(xbmc.getInfoLabel(VAR_PLAYER_SPEED))
+        self._paused = xbmc.getCondVisibility(VAR_PLAYER_PAUSED)
 
         self._stop = False
         self.wait_for_seek_to_complete_first = False
         self.__wakeup_triggered = False
 
-        while not self._stop:
-            if self.wait_for_seek_to_complete_first:
-                self.wait_for_seek_to_complete_first = False
-                self.__t_wait_for_seek_to_finish()
+        self._anchor_clock()
+        self._select_next_checkpoint()
 
+        while not self._stop:
             cp_reached = self.__idle()
             self.__wakeup_triggered = False
             if self._stop:
@@ -123,9 +214,16 @@ class PlayerCheckpointListener(xbmc.Player):
 
             if cp_reached:
                 logger.debug("woke up: reached checkpoint")
+                self.__count("checkpoint.wakeups", "checkpoint")
                 self.__t_cp_reached()
             else:
                 logger.debug("woke up: state changed")
+                self.__count("checkpoint.wakeups", "state_changed")
+                if self.wait_for_seek_to_complete_first:
+                    self.wait_for_seek_to_complete_first = False
+                    self.__t_wait_for_seek_to_finish()
+
+                self._anchor_clock()
                 self._select_next_checkpoint()
 
     @property
@@ -197,9 +295,11 @@ class PlayerCheckpointListener(xbmc.Player):
         self.stop_listener()
 
     def onPlayBackPaused(self):  # type: () -> None
+        self._paused = True
         self._trigger_wakeup()
 
     def onPlayBackResumed(self):  # type: () -> None
+        self._paused = False
         self._trigger_wakeup()
 
     def onPlayBackSpeedChanged(self, speed):  # type: (int) -> None
@@ -210,6 +310,7 @@ class PlayerCheckpointListener(xbmc.Player):
         """Select the next checkpoint.
 
         Choose the next checkpoint strictly AFTER the current time.
+        The clock has just been anchored, so `_media_time` can be used instead of `getTime`.
         """
         raise NotImplementedError
 
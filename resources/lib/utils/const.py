@@ -4,6 +4,11 @@ CONF_AUTO_UPVOTE = "auto_upvote"
 CONF_IGNORE_UNLISTED = "ignore_unlisted"
 CONF_SEGMENT_CHAIN_MARGIN_MS = "segment_chain_margin_ms"
 CONF_MINIMUM_DURATION_MS = "minimum_duration_ms"
+CONF_MIRROR_DUMP = "mirror_dump"
+CONF_MIRROR_ENABLED = "mirror_enabled"
+CONF_MUTE_SEGMENTS = "mute_segments"
+CONF_NO_SEGMENTS_TTL_MIN = "no_segments_ttl_min"
+CONF_PREFETCH_COUNT = "prefetch_count"
 CONF_REDUCE_SKIPS_MS = "reduce_skips_ms"
 CONF_SHOW_SKIPPED_DIALOG = "show_skipped_dialog"
 CONF_SKIP_COUNT_TRACKING = "skip_count_tracking"
@@ -30,6 +35,7 @@ CONF_CATEGORIES_MAP = {
     "livestream_messages": CONF_CATEGORY_LIVESTREAM_MESSAGES,
 }
 
+VAR_PLAYER_MUTED = "Player.Muted"
 VAR_PLAYER_PAUSED = "Player.Paused"
 VAR_PLAYER_SPEED = "Player.PlaySpeed"
 VAR_PLAYER_FILE_AND_PATH = "Player.FilenameAndPath"
@@ -14,17 +14,65 @@ class JSONRPCError(Exception):
         super(JSONRPCError, self).__init__(message)
 
 
-_JSONRPC_TEMPLATE = """{{"jsonrpc":"2.0","id":0,"method":"{method}","params":{params}}}"""
+def seconds_from_time(value):  # type: (dict) -> float
+    """Convert a `Global.Time` object to seconds."""
+    return (
+        3600 * value.get("hours", 0)
+        + 60 * value.get("minutes", 0)
+        + value.get("seconds", 0)
+        + value.get("milliseconds", 0) / 1000.0
+    )
+
+
+def _request(method, params, request_id=0):  # type: (str, Sequence[Any], int) -> dict
+    return {"jsonrpc": "2.0", "id": request_id, "method": method, "params": list(params)}
 
 
 def execute(method, *params):  # type: (str, *Any) -> Any
     logger.debug("calling jsonrpc method %r with params %r", method, params)
-    raw_res = xbmc.executeJSONRPC(_JSONRPC_TEMPLATE.format(method=method, params=json.dumps(params)))
+    raw_res = xbmc.executeJSONRPC(json.dumps(_request(method, params)))
     res = json.loads(raw_res)
     logger.debug("got response %s", res)
     return result_from_response(res)
 
 
+def execute_batch(calls):  # type: (Sequence[tuple[str, Sequence[Any]]]) -> list[Any]
+    """Call multiple methods in a single round trip.
+
+    Args:
+        calls: `(method, params)` pairs.
+
+    Returns:
+        The results in the same order as `calls`.
+        If a call failed, its result is the `JSONRPCError` instead, it isn't raised.
+    """
+    if not calls:
+        return []
+
+    logger.debug("calling jsonrpc batch %r", calls)
+    requests = [_request(method, params, i) for i, (method, params) in enumerate(calls)]
+    res = json.loads(xbmc.executeJSONRPC(json.dumps(requests)))
+    logger.debug("got batch response %s", res)
+
+    if isinstance(res, dict):
+        # the batch as a whole was rejected
+        result_from_response(res)
+        raise ValueError("response to batch is not a list")
+
+    # responses to a batch may come in any order
+    by_id = {entry.get("id"): entry for entry in res}
+    results = []
+    for i in range(len(calls)):
+        try:
+            results.append(result_from_response(by_id[i]))
+        except KeyError:
+            results.append(JSONRPCError(ERROR_INTERNAL, "no response for call {}".format(i)))
+        except JSONRPCError as exc:
+            results.append(exc)
+
+    return results
+
+
 def result_from_response(res):  # type: (dict) -> Any
     try:
         return res["result"]
@@ -39,10 +87,19 @@ def result_from_response(res):  # type: (dict) -> Any
     raise JSONRPCError(error["code"], error["message"])
 
 
+ERROR_INTERNAL = -32603
+
 PLAYER_MUSIC = 0
 PLAYER_VIDEO = 1
 PLAYER_PICTURE = 2
 
+PLAYLIST_MUSIC = 0
+PLAYLIST_VIDEO = 1
+
+PLAYER_PROPERTY_SPEED = "speed"
+PLAYER_PROPERTY_TIME = "time"
+PLAYER_PROPERTY_TOTAL_TIME = "totaltime"
+
 LIST_FIELD_ART = "art"
 LIST_FIELD_FILE = "file"
 LIST_FIELD_UNIQUEID = "uniqueid"
@@ -0,0 +1,133 @@
+"""Lightweight in-process metrics.
+
+Counters and histograms are kept in memory and periodically written to the profile directory as JSON,
+so questions like "how long does it take until the segments are ready?" can be answered without debug logs.
+"""
+
+import bisect
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+from ..sponsorblock.utils import write_json_atomic
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+"""Upper bounds in seconds of the default histogram buckets."""
+
+SNAPSHOT_VERSION = 1
+
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "count", "total", "min", "max")
+
+    def __init__(self, buckets=LATENCY_BUCKETS):  # type: (Sequence[float]) -> None
+        self.buckets = tuple(buckets)
+        # the last count is for values above the largest bucket
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = None  # type: Optional[float]
+        self.max = None  # type: Optional[float]
+
+    def observe(self, value):  # type: (float) -> None
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def quantile(self, q):  # type: (float) -> Optional[float]
+        """Estimate a quantile as the upper bound of the bucket containing it."""
+        if not self.count:
+            return None
+
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+
+        return self.max
+
+    def to_json(self):  # type: () -> dict
+        return {
+            "count": self.count,
+            "sum": self.total,
+            "min": self.min,
+            "max": self.max,
+            "mean": self.total / self.count if self.count else None,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "buckets": {
+                ("{:g}".format(bound) if i < len(self.buckets) else "inf"): count
+                for i, (bound, count) in enumerate(zip(self.buckets + (None,), self.counts))
+            },
+        }
+
+
+class MetricsRegistry:
+    """Thread-safe collection of counters and histograms.
+
+    Counters are grouped by name and broken down by a label (e.g. `cache.lookups` by `hit` / `miss`),
+    the snapshot contains the share of each label so hit ratios can be read off directly.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._started_at = time.time()
+        self._counters = {}  # type: dict[str, dict[str, int]]
+        self._histograms = {}  # type: dict[str, Histogram]
+
+    def increment(self, name, label="total", value=1):  # type: (str, str, int) -> None
+        with self._lock:
+            labels = self._counters.setdefault(name, {})
+            labels[label] = labels.get(label, 0) + value
+
+    def observe(self, name, value, buckets=LATENCY_BUCKETS):  # type: (str, float, Sequence[float]) -> None
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = Histogram(buckets)
+
+            histogram.observe(value)
+
+    @contextmanager
+    def timer(self, name):  # type: (str) -> Iterator[None]
+        """Observe the time it takes to run the body of the `with` statement, even if it raises."""
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(name, time.monotonic() - start)
+
+    def snapshot(self):  # type: () -> dict
+        with self._lock:
+            counters = {}
+            for name, labels in self._counters.items():
+                total = sum(labels.values())
+                counters[name] = {
+                    "counts": dict(labels),
+                    "ratios": {label: count / total for label, count in labels.items()} if total else {},
+                }
+
+            histograms = {name: histogram.to_json() for name, histogram in self._histograms.items()}
+
+        return {
+            "version": SNAPSHOT_VERSION,
+            "started_at": self._started_at,
+            "written_at": time.time(),
+            "counters": counters,
+            "histograms": histograms,
+        }
+
+    def write_snapshot(self, path):  # type: (str) -> None
+        try:
+            write_json_atomic(path, self.snapshot(), indent=2, sort_keys=True)
+        except Exception:
+            logger.exception("failed to write metrics snapshot to %s", path)
+        else:
+            logger.debug("wrote metrics snapshot to %s", path)
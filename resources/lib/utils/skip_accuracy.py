@@ -0,0 +1,143 @@
+"""Statistics on how accurately checkpoints fire on this device.
+
+The checkpoint listener reports the clock drift it corrects before firing, the signed error at which each
+checkpoint fires, and the checkpoints it drops because it woke up too late.
+The wake-up tolerances are derived from these observations instead of being fixed guesses.
+The samples are kept in the profile directory, so they're per device and survive restarts.
+"""
+
+import json
+import logging
+import os
+import threading
+from collections import deque
+
+from ..sponsorblock.utils import quantile, write_json_atomic
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_UNDERSHOOT = 0.25
+"""Undershoot tolerance in seconds used until enough samples are available.
+
+Closer to a checkpoint than this, the listener no longer samples the player's time and relies on
+the extrapolated time instead.
+"""
+
+MIN_UNDERSHOOT = 0.05
+MAX_UNDERSHOOT = 0.5
+
+UNDERSHOOT_JITTER_FACTOR = 2.0
+"""Multiple of the typical player jitter below which the player's time isn't sampled anymore.
+
+When `Player.getTime()` jitters by that much around the extrapolated time,
+sampling it again doesn't make the checkpoint more accurate.
+"""
+
+DEFAULT_OVERSHOOT = 1.5
+"""Overshoot tolerance in seconds used until enough samples are available."""
+
+MIN_OVERSHOOT = 0.75
+MAX_OVERSHOOT = 4.0
+
+OVERSHOOT_MARGIN = 0.5
+"""Seconds added on top of the typical lateness before a checkpoint is considered missed."""
+
+MIN_SAMPLES = 20
+"""Number of samples needed before a tolerance is adapted."""
+
+WINDOW_SIZE = 200
+"""Number of most recent samples kept per statistic."""
+
+
+def _clamp(value, lower, upper):  # type: (float, float, float) -> float
+    return max(lower, min(value, upper))
+
+
+class SkipAccuracy:
+    def __init__(self, path=None, window=WINDOW_SIZE):  # type: (Optional[str], int) -> None
+        self._path = path
+        self._lock = threading.Lock()
+
+        # extrapolated media time minus `Player.getTime()` when resyncing before a checkpoint
+        self._drift = deque(maxlen=window)  # type: deque[float]
+        # `Player.getTime()` minus checkpoint when firing. Dropped checkpoints are only counted,
+        # their errors say how late the wakeup was noticed (e.g. after a user seek), not how late we fire.
+        self._errors = deque(maxlen=window)  # type: deque[float]
+        self.fired = 0
+        self.dropped = 0
+
+        self.undershoot = DEFAULT_UNDERSHOOT
+        self.overshoot = DEFAULT_OVERSHOOT
+
+        self._load()
+
+    def record_drift(self, drift):  # type: (float) -> None
+        with self._lock:
+            self._drift.append(drift)
+            self._update_tolerances()
+
+    def record_fired(self, error):  # type: (float) -> None
+        with self._lock:
+            self.fired += 1
+            self._errors.append(error)
+            self._update_tolerances()
+
+    def record_dropped(self, error):  # type: (float) -> None
+        with self._lock:
+            self.dropped += 1
+
+    def _update_tolerances(self):  # type: () -> None
+        if len(self._drift) >= MIN_SAMPLES:
+            jitter = quantile((abs(d) for d in self._drift), 0.9)
+            self.undershoot = _clamp(
+                UNDERSHOOT_JITTER_FACTOR * jitter, MIN_UNDERSHOOT, MAX_UNDERSHOOT
+            )
+
+        if len(self._errors) >= MIN_SAMPLES:
+            lateness = quantile(self._errors, 0.95)
+            self.overshoot = _clamp(lateness + OVERSHOOT_MARGIN, MIN_OVERSHOOT, MAX_OVERSHOOT)
+
+    def to_json(self):  # type: () -> dict
+        with self._lock:
+            return {
+                "drift": list(self._drift),
+                "errors": list(self._errors),
+                "fired": self.fired,
+                "dropped": self.dropped,
+                "undershoot": self.undershoot,
+                "overshoot": self.overshoot,
+            }
+
+    def _load(self):  # type: () -> None
+        path = self._path
+        if not path or not os.path.isfile(path):
+            return
+
+        try:
+            with open(path, "r") as fp:
+                data = json.load(fp)
+
+            self._drift.extend(float(d) for d in data["drift"])
+            # older versions kept the errors of dropped checkpoints as well, they're always beyond the bound
+            self._errors.extend(e for e in map(float, data["errors"]) if e <= MAX_OVERSHOOT)
+            self.fired = int(data["fired"])
+            self.dropped = int(data["dropped"])
+        except Exception:
+            logger.exception("failed to read skip accuracy statistics from %s", path)
+            return
+
+        self._update_tolerances()
+        logger.debug(
+            "loaded skip accuracy statistics, undershoot: %g, overshoot: %g",
+            self.undershoot, self.overshoot,
+        )
+
+    def save(self):  # type: () -> None
+        path = self._path
+        if not path:
+            return
+
+        try:
+            write_json_atomic(path, self.to_json())
+        except Exception:
+            logger.exception("failed to write skip accuracy statistics to %s", path)
@@ -1,29 +1,142 @@
+import logging
+from collections import namedtuple
+
 import xbmc
 
 from urllib import parse as urlparse
 
-from .const import VAR_PLAYER_FILE_AND_PATH
+from . import jsonrpc
+from .const import VAR_PLAYER_FILE_AND_PATH, VAR_PLAYER_MUTED
+
+logger = logging.getLogger(__name__)
+
+_PLAYER_ITEM_FIELDS = [
+    jsonrpc.LIST_FIELD_ART,
+    jsonrpc.LIST_FIELD_FILE,
+    jsonrpc.LIST_FIELD_UNIQUEID,
+]
+
+PlaybackFacts = namedtuple("PlaybackFacts", ("item", "total_time", "upcoming_paths"))
+"""What's known about the playback right after it started.
+
+`upcoming_paths` are the paths of the items after the playing one in the video playlist.
+Each field is `None` if it couldn't be fetched (or wasn't asked for).
+"""
 
 
 def get_playing_file_path():  # type: () -> str
     return xbmc.getInfoLabel(VAR_PLAYER_FILE_AND_PATH)
 
 
-def get_playing_addon():
+def is_muted():  # type: () -> bool
+    return xbmc.getCondVisibility(VAR_PLAYER_MUTED)
+
+
+def set_muted(muted):  # type: (bool) -> None
+    """Mute or unmute Kodi's audio. Unlike the `Mute` builtin this doesn't toggle."""
+    jsonrpc.execute("Application.SetMute", muted)
+
+
+def get_player_item():  # type: () -> dict
+    try:
+        result = jsonrpc.execute("Player.GetItem", jsonrpc.PLAYER_VIDEO, _PLAYER_ITEM_FIELDS)
+    except Exception:
+        logger.exception("failed to get item from JSON RPC")
+        return {}
+
+    return result.get("item", {})
+
+
+def get_playback_facts(playlist_count=0):  # type: (int) -> PlaybackFacts
+    """
+    Fetch the playing item, its duration and the next `playlist_count` items of the video playlist
+    in a single JSON RPC round trip.
+    """
+    calls = [
+        ("Player.GetItem", [jsonrpc.PLAYER_VIDEO, _PLAYER_ITEM_FIELDS]),
+        ("Player.GetProperties", [jsonrpc.PLAYER_VIDEO, [jsonrpc.PLAYER_PROPERTY_TOTAL_TIME]]),
+    ]
+    if playlist_count > 0:
+        start = max(xbmc.PlayList(xbmc.PLAYLIST_VIDEO).getposition() + 1, 0)
+        calls.append(
+            (
+                "Playlist.GetItems",
+                [
+                    jsonrpc.PLAYLIST_VIDEO,
+                    [jsonrpc.LIST_FIELD_FILE],
+                    {"start": start, "end": start + playlist_count},
+                ],
+            )
+        )
+
+    facts = PlaybackFacts(None, None, None)
+    try:
+        results = jsonrpc.execute_batch(calls)
+    except Exception:
+        logger.exception("failed to get playback facts from JSON RPC")
+        return facts
+
+    item, properties = results[:2]
+    if isinstance(item, jsonrpc.JSONRPCError):
+        logger.warning("failed to get item from JSON RPC: %s", item)
+    else:
+        facts = facts._replace(item=item.get("item", {}))
+
+    if isinstance(properties, jsonrpc.JSONRPCError):
+        logger.warning("failed to get player properties from JSON RPC: %s", properties)
+    else:
+        total_time = properties.get(jsonrpc.PLAYER_PROPERTY_TOTAL_TIME)
+        facts = facts._replace(total_time=jsonrpc.seconds_from_time(total_time) if total_time else None)
+
+    if playlist_count <= 0:
+        return facts
+
+    playlist = results[2]
+    if isinstance(playlist, jsonrpc.JSONRPCError):
+        logger.warning("failed to get playlist items from JSON RPC: %s", playlist)
+    else:
+        facts = facts._replace(
+            upcoming_paths=[entry.get("file", "") for entry in playlist.get("items") or ()]
+        )
+
+    return facts
+
+
+def addon_from_path(path):  # type: (str) -> str
     """
-    Return which addon is currently playing media.
+    Return the addon a media path belongs to.
     """
-    path = get_playing_file_path()
     try:
         parsed = urlparse.urlsplit(path)
+        hostname = (parsed.hostname or "").lower()
     except (TypeError, ValueError):
         return ""
 
-    hostname = (parsed.hostname or "").lower()
-    if hostname == "googlevideo.com" or hostname.endswith(".googlevideo.com"):
+    return addon_from_split(parsed, hostname)
+
+
+def is_googlevideo_host(hostname):  # type: (str) -> bool
+    return hostname == "googlevideo.com" or hostname.endswith(".googlevideo.com")
+
+
+def addon_from_split(parsed, hostname):  # type: (urlparse.SplitResult, str) -> str
+    """
+    Variant of `addon_from_path` for an already split path and its lowercase hostname.
+    """
+    if is_googlevideo_host(hostname):
         # The YouTube add-on resolves plugin:// URLs to googlevideo streams.
         # Newer Kodi versions can expose that resolved URL in
         # Player.FilenameAndPath when onPlayBackStarted is delivered.
         return "plugin.video.youtube"
 
     return parsed.netloc
+
+
+def get_upcoming_playlist_paths(count):  # type: (int) -> list[str]
+    """
+    Return the paths of the next `count` items in the video playlist.
+    """
+    playlist = xbmc.PlayList(xbmc.PLAYLIST_VIDEO)
+    start = playlist.getposition() + 1
+    end = min(start + count, playlist.size())
+    return [playlist[i].getPath() for i in range(max(start, 0), end)]
@@ -0,0 +1,75 @@
+"""Memory benchmark of keeping the segments of many videos resident.
+
+Compares a dict of `SponsorSegment` lists with a `CompactSegmentStore` at 10k and 100k videos.
+Run `python -m tests.bench_segment_store`.
+"""
+
+import gc
+import hashlib
+import random
+import tracemalloc
+
+from resources.lib.sponsorblock import CATEGORIES, CompactSegmentStore, SponsorSegment
+
+VIDEO_COUNTS = (10000, 100000)
+
+SEGMENTS_PER_VIDEO = 3
+"""Average number of segments of a video with segments."""
+
+
+def make_videos(count, seed=0):  # type: (int, int) -> Iterator[tuple[str, list[SponsorSegment]]]
+    rng = random.Random(seed)
+    for i in range(count):
+        video_id = "v{:010d}".format(i)
+        segments = []
+        start = 0.0
+        for j in range(rng.randint(1, 2 * SEGMENTS_PER_VIDEO - 1)):
+            start += rng.uniform(10, 300)
+            end = start + rng.uniform(5, 90)
+            uuid = hashlib.sha256("{}-{}".format(video_id, j).encode()).hexdigest()
+            segments.append(SponsorSegment(uuid, rng.choice(CATEGORIES), round(start, 3), round(end, 3)))
+            start = end
+        yield video_id, segments
+
+
+def measure(build):  # type: (Callable[[], Any]) -> tuple[int, Any]
+    gc.collect()
+    tracemalloc.start()
+    try:
+        result = build()
+        gc.collect()
+        size, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return size, result
+
+
+def build_plain(count):  # type: (int) -> dict[str, list[SponsorSegment]]
+    return dict(make_videos(count))
+
+
+def build_compact(count):  # type: (int) -> CompactSegmentStore
+    store = CompactSegmentStore(max_videos=count)
+    for video_id, segments in make_videos(count):
+        store.put(video_id, segments)
+    return store
+
+
+def main():  # type: () -> None
+    for count in VIDEO_COUNTS:
+        plain_size, plain = measure(lambda: build_plain(count))
+        segment_count = sum(len(segments) for segments in plain.values())
+        del plain
+        compact_size, _ = measure(lambda: build_compact(count))
+
+        print("{:>7} videos, {:>7} segments".format(count, segment_count))
+        print("  SponsorSegment lists: {:8.1f} MiB, {:5.0f} B/segment".format(
+            plain_size / 2 ** 20, plain_size / segment_count
+        ))
+        print("  CompactSegmentStore:  {:8.1f} MiB, {:5.0f} B/segment ({:.1f}x smaller)".format(
+            compact_size / 2 ** 20, compact_size / segment_count, plain_size / compact_size
+        ))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""Benchmark of the service's startup: importing `resources.lib.monitor` and constructing the `Monitor`.
+
+Every run happens in a fresh interpreter with stubbed Kodi modules, so all imports are paid for again.
+Besides the times it reports the resident memory the startup added and which of the modules that should
+only be loaded on first use were imported anyway.
+
+Run `python -m tests.bench_startup`.
+"""
+
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+RUNS = 7
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+LAZY_MODULES = (
+    "requests",
+    "urllib3",
+    "resources.lib.gui.sponsor_skipped",
+    "resources.lib.apis.invidious_api",
+    "resources.lib.apis.piped_api",
+    "resources.lib.apis.youtube_api",
+)
+"""Modules that mustn't be imported before a video plays."""
+
+_CHILD = r"""
+import json
+import os
+import sys
+import tempfile
+import time
+import types
+
+LAZY_MODULES = {lazy_modules!r}
+
+
+def rss_kib():
+    try:
+        with open("/proc/self/statm") as fp:
+            return int(fp.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") // 1024
+    except (OSError, ValueError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+class Stub:
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: None
+
+
+class StubModule(types.ModuleType):
+    def __getattr__(self, name):
+        # constants and classes that aren't used during startup
+        return Stub
+
+
+def stub(name, **attrs):
+    module = StubModule(name)
+    module.__dict__.update(attrs)
+    sys.modules[name] = module
+
+
+profile = tempfile.mkdtemp()
+
+
+class Addon(Stub):
+    def getAddonInfo(self, key):
+        return {{"id": "script.service.sponsorblock", "profile": profile}}.get(key, "")
+
+    def getSetting(self, key):
+        return ""
+
+    def getSettingBool(self, key):
+        return False
+
+    def getSettingInt(self, key):
+        return 0
+
+    def getSettingNumber(self, key):
+        return 0.0
+
+
+stub("xbmc", Monitor=Stub, Player=Stub, getInfoLabel=lambda label: "", log=lambda *args: None)
+stub("xbmcaddon", Addon=Addon)
+stub("xbmcgui", Dialog=Stub, WindowXMLDialog=Stub)
+stub("xbmcvfs", translatePath=lambda path: path)
+
+rss_before = rss_kib()
+start = time.perf_counter()
+from resources.lib.monitor import Monitor
+imported = time.perf_counter()
+monitor = Monitor()
+started = time.perf_counter()
+rss_after = rss_kib()
+loaded = [name for name in LAZY_MODULES if name in sys.modules]
+monitor.stop()
+
+print(json.dumps({{
+    "import": imported - start,
+    "startup": started - start,
+    "rss": rss_after - rss_before,
+    "loaded": loaded,
+}}))
+"""
+
+
+def run_once():  # type: () -> dict
+    """Start the service in a fresh interpreter and return its measurements."""
+    script = _CHILD.format(lazy_modules=LAZY_MODULES)
+    output = subprocess.run(
+        [sys.executable, "-c", script],
+        cwd=ROOT,
+        check=True,
+        stdout=subprocess.PIPE,
+        universal_newlines=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():  # type: () -> None
+    runs = [run_once() for _ in range(RUNS)]
+
+    print("service startup, median of {} runs".format(RUNS))
+    print("  import monitor: {:7.1f} ms".format(statistics.median(run["import"] for run in runs) * 1e3))
+    print("  construct:      {:7.1f} ms".format(statistics.median(run["startup"] for run in runs) * 1e3))
+    print("  resident memory: {:6.0f} KiB".format(statistics.median(run["rss"] for run in runs)))
+    print("  lazy modules loaded: {}".format(", ".join(runs[0]["loaded"]) or "none"))
+
+
+if __name__ == "__main__":
+    main()
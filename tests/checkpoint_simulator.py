@@ -0,0 +1,736 @@
+"""Headless playback simulator for the checkpoint engine.
+
+A fake `xbmc.Player` is driven by a virtual clock, so scripted scenarios run through the real
+`PlayerListener` code much faster than real time. Only the `xbmc.Player` methods, the API, the settings
+and the mute state are faked.
+Each run reports the skip latency, missed, repeated and double skips, how often the listener woke up and
+how often it called `Player.getTime()`, so changes to the scheduler can be compared.
+For mute segments it reports how much of them was audible and how long the audio was muted outside of them.
+
+Run `python -m tests.checkpoint_simulator` to print the report of all scenarios.
+"""
+
+import contextlib
+import heapq
+import itertools
+import random
+import sys
+import threading
+import time
+import types
+from collections import namedtuple
+from concurrent.futures import Future
+from unittest import mock
+
+
+def _stub_module(name, **attrs):  # type: (str, Any) -> None
+    module = sys.modules.setdefault(name, types.ModuleType(name))
+    for attr, value in attrs.items():
+        if not hasattr(module, attr):
+            setattr(module, attr, value)
+
+
+class _StubPlayer:
+    def __init__(self, *args, **kwargs):
+        pass
+
+
+class _StubAddon:
+    def getAddonInfo(self, _key):
+        return ""
+
+    def __getattr__(self, _name):
+        return mock.Mock()
+
+
+# the listener only needs `xbmc.Player` as a base class, everything else is patched while running
+_stub_module(
+    "xbmc",
+    Player=_StubPlayer,
+    getInfoLabel=mock.Mock(return_value=""),
+    getCondVisibility=mock.Mock(return_value=False),
+    executeJSONRPC=mock.Mock(return_value='{"result":{"item":{}}}'),
+)
+# needed to import the addon utils
+_stub_module("xbmcaddon", Addon=_StubAddon)
+_stub_module(
+    "xbmcgui",
+    Dialog=mock.Mock,
+    NOTIFICATION_INFO="info",
+    NOTIFICATION_WARNING="warning",
+    NOTIFICATION_ERROR="error",
+)
+_stub_module("xbmcvfs", translatePath=lambda path: path)
+
+from resources.lib import player_listener  # noqa: E402
+from resources.lib.skip_plan import SkipPlan  # noqa: E402
+from resources.lib.sponsorblock import ACTION_MUTE, NotFound, SponsorSegment  # noqa: E402
+from resources.lib.utils import addon, checkpoint_listener  # noqa: E402
+from resources.lib.utils.skip_accuracy import SkipAccuracy  # noqa: E402
+
+SEEK_CALLBACK_DELAY = 0.05
+"""Virtual seconds between a seek and Kodi invoking `onPlayBackSeek`."""
+
+SEEK_GRACE = 0.1
+"""Entries crossed less than this many seconds before a user seek aren't counted as missed.
+
+The user seeked away before the listener could react, skipping them anyway would undo the seek.
+"""
+
+TIMER_RESOLUTION = 1e-6
+"""Shortest virtual time a wait with a positive timeout takes.
+
+Without it, tiny timeouts can be lost to float rounding and the clock never moves.
+"""
+
+IDLE_POLL_INTERVAL = 0.01
+"""Real seconds between checks whether the listener thread has exited."""
+
+SETTINGS = types.SimpleNamespace(
+    extra_privacy=False,
+    categories=("sponsor", "outro"),
+    segment_chain_margin=0.5,
+    minimum_duration=0.0,
+    reduce_skips=0.0,
+    mute_segments=True,
+    video_end_time_margin=0.5,
+    show_skipped_dialog=False,
+    auto_upvote=False,
+    skip_count_tracking=False,
+    prefetch_count=0,
+)
+"""Returned by `addon.get_settings`, always the same object so the listener's skip plan stays cached."""
+
+Item = namedtuple("Item", ("duration", "segments"))
+
+Scenario = namedtuple("Scenario", ("name", "items", "events", "jitter"))
+"""A scripted playback session.
+
+`events` are `(virtual time, action, argument)` tuples, actions are the names of `VirtualPlayer` methods.
+`jitter` is the maximum error in seconds of the times reported by `getTime`.
+"""
+
+Report = namedtuple(
+    "Report",
+    (
+        "name",
+        "segments",
+        "skips",
+        "reskips",
+        "missed",
+        "double",
+        "dropped",
+        "seeks",
+        "mutes",
+        "audible",
+        "silenced",
+        "latency_mean",
+        "latency_p95",
+        "latency_max",
+        "wakeups",
+        "get_time_calls",
+        "virtual_seconds",
+        "real_seconds",
+    ),
+)
+
+
+class _Waiter:
+    __slots__ = ("condition", "deadline", "woken", "notified")
+
+    def __init__(self, condition, deadline):
+        self.condition = condition
+        self.deadline = deadline  # type: Optional[float]
+        self.woken = False
+        self.notified = False
+
+
+class VirtualClock:
+    """Monotonic clock that only moves when the simulation advances it.
+
+    Waiting on a `VirtualCondition` blocks until the clock is advanced past the timeout or the condition
+    is notified, so a wait never takes any real time beyond the thread handoff.
+    """
+
+    def __init__(self):
+        self.now = 0.0
+        self.wakeups = 0
+        self._cond = threading.Condition()
+        self._waiters = []  # type: list[_Waiter]
+
+    def monotonic(self):  # type: () -> float
+        return self.now
+
+    def condition(self):  # type: () -> VirtualCondition
+        return VirtualCondition(self)
+
+    def _add_waiter(self, condition, timeout):  # type: (VirtualCondition, Optional[float]) -> _Waiter
+        with self._cond:
+            if timeout is None:
+                deadline = None
+            elif timeout > 0:
+                deadline = self.now + max(timeout, TIMER_RESOLUTION)
+            else:
+                deadline = self.now
+            waiter = _Waiter(condition, deadline)
+            self._waiters.append(waiter)
+            self._cond.notify_all()
+            return waiter
+
+    def _block(self, waiter):  # type: (_Waiter) -> bool
+        with self._cond:
+            while not waiter.woken:
+                self._cond.wait()
+
+            self.wakeups += 1
+            return waiter.notified
+
+    def _notify(self, condition):  # type: (VirtualCondition) -> None
+        with self._cond:
+            for waiter in [w for w in self._waiters if w.condition is condition]:
+                self._wake(waiter, notified=True)
+
+    def _wake(self, waiter, notified):  # type: (_Waiter, bool) -> None
+        self._waiters.remove(waiter)
+        waiter.woken = True
+        waiter.notified = notified
+        self._cond.notify_all()
+
+    def wait_until_idle(self, thread):  # type: (Optional[threading.Thread]) -> None
+        """Wait (in real time) until the thread is blocked on the virtual clock or has exited."""
+        with self._cond:
+            while thread is not None and thread.is_alive() and not self._waiters:
+                self._cond.wait(IDLE_POLL_INTERVAL)
+
+    def advance_to(self, target, get_thread, interrupted):
+        # type: (float, Callable[[], Optional[threading.Thread]], Callable[[], bool]) -> bool
+        """Move the clock forward, waking up waiters whose timeout expires on the way.
+
+        Stops early when `interrupted` returns true after the listener handled a wakeup.
+
+        Returns:
+            Whether the target was reached.
+        """
+        while True:
+            self.wait_until_idle(get_thread())
+            if interrupted():
+                return False
+
+            with self._cond:
+                deadlines = [w.deadline for w in self._waiters if w.deadline is not None]
+                deadline = min(deadlines) if deadlines else None
+                if deadline is None or deadline > target:
+                    self.now = max(self.now, target)
+                    return True
+
+                self.now = max(self.now, deadline)
+                for waiter in [w for w in self._waiters if w.deadline is not None and w.deadline <= self.now]:
+                    self._wake(waiter, notified=False)
+
+
+class VirtualCondition:
+    def __init__(self, clock):  # type: (VirtualClock) -> None
+        self._clock = clock
+        self._lock = threading.RLock()
+
+    def __enter__(self):
+        self._lock.acquire()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._lock.release()
+
+    def wait(self, timeout=None):  # type: (Optional[float]) -> bool
+        waiter = self._clock._add_waiter(self, timeout)
+        self._lock.release()
+        try:
+            return self._clock._block(waiter)
+        finally:
+            self._lock.acquire()
+
+    def notify_all(self):  # type: () -> None
+        self._clock._notify(self)
+
+
+class VirtualPlayer:
+    """State of the fake player and the bookkeeping of what happened to each skip."""
+
+    def __init__(self, clock, items, jitter=0.0, seed=0):
+        # type: (VirtualClock, list[Item], float, int) -> None
+        self.clock = clock
+        self.listener = None  # type: Optional[SimulatedListener]
+        self._items = items
+        self._random = random.Random(seed)
+        self._jitter = jitter
+
+        self._events = []  # type: list[tuple[float, int, Callable[[], None]]]
+        self._event_seq = itertools.count()
+        self._events_lock = threading.Lock()
+        self.changed = False
+
+        self.index = -1
+        self.plan = SkipPlan([])
+        self._starts = []  # type: list[float]
+        self._mutes = []  # type: list[tuple[float, float]]
+        self.finished = False
+        self.speed = 1.0
+        self.paused = False
+        self.stalled = False
+        self._position = 0.0
+        self._anchored_at = 0.0
+
+        self.get_time_calls = 0
+        self.latencies = []  # type: list[float]
+        # entries are identified by (item index, entry start)
+        self.crossed = set()  # type: set[tuple[int, float]]
+        self.skipped = set()  # type: set[tuple[int, float]]
+        # going back with a seek and skipping again isn't a double skip
+        self._skipped_since_seek = set()  # type: set[tuple[int, float]]
+        # entries skipped for the first time, and again after the user seeked back before them
+        self.skips = 0
+        self.reskips = 0
+        self.double_skips = 0
+
+        self.muted = False
+        self.mutes = 0
+        # seconds of mute entries played with audio, and seconds played muted outside of them
+        self.audible = 0.0
+        self.silenced = 0.0
+
+    @property
+    def duration(self):  # type: () -> float
+        return self._items[self.index].duration
+
+    @property
+    def _rate(self):  # type: () -> float
+        return 0.0 if self.paused or self.stalled or self.finished else self.speed
+
+    def position(self):  # type: () -> float
+        if self.finished:
+            return self._position
+
+        elapsed = self.clock.now - self._anchored_at
+        return min(self._position + elapsed * self._rate, self.duration)
+
+    def seconds_until_end(self):  # type: () -> float
+        rate = self._rate
+        if rate <= 0:
+            return float("inf")
+
+        return max(self.duration - self.position(), 0.0) / rate
+
+    def _settle(self):  # type: () -> float
+        """Record the entries played through since the last state change and re-anchor the position."""
+        previous = self._position
+        current = self.position()
+        if current > previous:
+            for start in self._starts:
+                if previous < start <= current:
+                    self.crossed.add((self.index, start))
+
+            in_mutes = sum(max(min(current, end) - max(previous, start), 0.0) for start, end in self._mutes)
+            if self.muted:
+                self.silenced += current - previous - in_mutes
+            else:
+                self.audible += in_mutes
+
+        self._position = current
+        self._anchored_at = self.clock.now
+        return current
+
+    # scheduling
+
+    def schedule(self, delay, callback):  # type: (float, Callable[[], None]) -> None
+        with self._events_lock:
+            heapq.heappush(self._events, (self.clock.now + delay, next(self._event_seq), callback))
+            self.changed = True
+
+    def next_event_time(self):  # type: () -> float
+        with self._events_lock:
+            return self._events[0][0] if self._events else float("inf")
+
+    def pop_due_event(self):  # type: () -> Optional[Callable[[], None]]
+        with self._events_lock:
+            if self._events and self._events[0][0] <= self.clock.now:
+                return heapq.heappop(self._events)[2]
+            return None
+
+    # Kodi facing
+
+    def get_time(self):  # type: () -> float
+        self.get_time_calls += 1
+        return max(self.position() + self._random.uniform(-self._jitter, self._jitter), 0.0)
+
+    def item_segments(self, video_id):  # type: (str) -> list[SponsorSegment]
+        index = int(video_id.rsplit("-", 1)[1])
+        return list(self._items[index].segments)
+
+    def seek(self, target):  # type: (float) -> None
+        self._settle()
+        self._position = min(max(target, 0.0), self.duration)
+        self.changed = True
+        self.schedule(SEEK_CALLBACK_DELAY, lambda: self.listener.onPlayBackSeek(int(target * 1000), 0))
+
+    def play_next(self):  # type: () -> None
+        self.schedule(0.0, self.end_item)
+
+    def set_muted(self, muted):  # type: (bool) -> None
+        self._settle()
+        if muted and not self.muted:
+            self.mutes += 1
+        self.muted = muted
+
+    def record_skip(self, entry):  # type: (SkipEntry) -> None
+        key = (self.index, entry.start)
+        if key in self._skipped_since_seek:
+            self.double_skips += 1
+        elif key in self.skipped:
+            self.reskips += 1
+        else:
+            self.skips += 1
+        self.skipped.add(key)
+        self._skipped_since_seek.add(key)
+        self.latencies.append(self.position() - entry.start)
+
+    # playback
+
+    def start_item(self, index):  # type: (int) -> None
+        self.index = index
+        self._position = 0.0
+        self._anchored_at = self.clock.now
+        # the listener builds its own plan, this one is only for the bookkeeping
+        self.plan = SkipPlan.build(self._items[index].segments, SETTINGS)
+        self._starts = list(self.plan._starts)
+        self._mutes = [(entry.start, entry.end) for entry in self.plan._mute_entries]
+        self.changed = True
+        self.listener.onPlayBackStarted()
+        self.listener.onAVStarted()
+
+    def end_item(self):  # type: () -> None
+        if self.finished:
+            return
+
+        self._settle()
+        if self.index + 1 < len(self._items):
+            self.start_item(self.index + 1)
+        else:
+            self.finished = True
+            self.listener.onPlayBackEnded()
+
+    # scripted user actions
+
+    def pause(self, _arg=None):
+        self._settle()
+        self.paused = True
+        self.listener.onPlayBackPaused()
+
+    def resume(self, _arg=None):
+        self._settle()
+        self.paused = False
+        self.listener.onPlayBackResumed()
+
+    def set_speed(self, speed):
+        self._settle()
+        self.speed = speed
+        self.listener.onPlayBackSpeedChanged(speed)
+
+    def user_seek(self, target):
+        self._skipped_since_seek.clear()
+        position = self._settle()
+        self.crossed = {
+            (index, start) for index, start in self.crossed
+            if index != self.index or not position - SEEK_GRACE < start <= position
+        }
+        self.seek(target)
+
+    def stall(self, _arg=None):
+        # buffering, Kodi doesn't tell anyone
+        self._settle()
+        self.stalled = True
+
+    def unstall(self, _arg=None):
+        self._settle()
+        self.stalled = False
+
+
+class _ImmediateExecutor:
+    """Stands in for the segment loader's thread pool, the stub API answers right away anyway."""
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def submit(self, fn, *args):  # type: (Callable[..., T], Any) -> Future
+        future = Future()
+        future.set_running_or_notify_cancel()
+        try:
+            future.set_result(fn(*args))
+        except BaseException as e:
+            future.set_exception(e)
+        return future
+
+
+class _StubApi:
+    def __init__(self, player):  # type: (VirtualPlayer) -> None
+        self._player = player
+
+    def get_video_id(self, _context):  # type: (Any) -> str
+        return "video-{}".format(self._player.index)
+
+    def get_skip_segments(self, video_id):  # type: (str) -> list[SponsorSegment]
+        segments = self._player.item_segments(video_id)
+        if not segments:
+            raise NotFound
+        return segments
+
+    get_skip_segments_hashed = get_skip_segments
+
+
+class _StubContext:
+    def __init__(self, player):  # type: (VirtualPlayer) -> None
+        self.addon_id = "plugin.video.simulated"
+        self.total_time = player.duration
+
+    def prefetch(self, playlist_count=0):  # type: (int) -> None
+        pass
+
+
+class SimulatedListener(player_listener.PlayerListener):
+    """The real `PlayerListener` with the `xbmc.Player` methods faked."""
+
+    def __init__(self, player, accuracy=None):  # type: (VirtualPlayer, Optional[SkipAccuracy]) -> None
+        super(SimulatedListener, self).__init__(api=_StubApi(player), accuracy=accuracy or SkipAccuracy())
+        self._player = player
+        self.seeks = 0
+
+    def __record_skip(self):  # type: () -> None
+        self._player.record_skip(self._next_action.entry)
+
+    # xbmc.Player
+
+    def getTime(self):
+        return self._player.get_time()
+
+    def getTotalTime(self):
+        return self._player.duration
+
+    def isPlaying(self):
+        return not self._player.finished
+
+    def seekTime(self, seek_time):
+        self.seeks += 1
+        self.__record_skip()
+        self._player.seek(seek_time)
+
+    def playnext(self):
+        self.__record_skip()
+        self._player.play_next()
+
+    def stop(self):
+        self.__record_skip()
+        self._player.play_next()
+
+
+def _quantile(values, q):  # type: (list[float], float) -> float
+    ordered = sorted(values)
+    return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+
+def run_scenario(scenario, seed=0):  # type: (Scenario, int) -> Report
+    clock = VirtualClock()
+    player = VirtualPlayer(clock, scenario.items, jitter=scenario.jitter, seed=seed)
+
+    fake_xbmc = types.SimpleNamespace(
+        getInfoLabel=lambda _label: str(player.speed),
+        getCondVisibility=lambda _condition: player.paused,
+    )
+    fake_threading = types.SimpleNamespace(
+        Condition=clock.condition,
+        Thread=threading.Thread,
+        current_thread=threading.current_thread,
+    )
+
+    for at, action, arg in scenario.events:
+        player.schedule(at, lambda action=action, arg=arg: getattr(player, action)(arg))
+
+    def interrupted():
+        changed = player.changed
+        player.changed = False
+        return changed
+
+    fake_playlist = types.SimpleNamespace(
+        getposition=lambda: player.index,
+        size=lambda: len(scenario.items),
+    )
+    patches = (
+        mock.patch.object(checkpoint_listener, "xbmc", fake_xbmc),
+        mock.patch.object(checkpoint_listener, "time", types.SimpleNamespace(monotonic=clock.monotonic)),
+        mock.patch.object(checkpoint_listener, "threading", fake_threading),
+        mock.patch.object(
+            player_listener, "xbmc", types.SimpleNamespace(PLAYLIST_VIDEO=1, PlayList=lambda _id: fake_playlist)
+        ),
+        mock.patch.object(player_listener, "ThreadPoolExecutor", _ImmediateExecutor),
+        mock.patch.object(player_listener, "PlaybackContext", lambda _player: _StubContext(player)),
+        mock.patch.object(player_listener, "get_api", lambda _addon_id: listener._api),
+        mock.patch.object(player_listener, "is_muted", lambda: player.muted),
+        mock.patch.object(player_listener, "set_muted", player.set_muted),
+        mock.patch.object(addon, "get_settings", lambda: SETTINGS),
+    )
+
+    started = time.perf_counter()
+    with contextlib.ExitStack() as stack:
+        for patch in patches:
+            stack.enter_context(patch)
+        # the wakeup condition is created by the constructor
+        listener = SimulatedListener(player)
+        player.listener = listener
+        player.start_item(0)
+        while not player.finished:
+            clock.wait_until_idle(listener._thread)
+            event = player.pop_due_event()
+            if event is not None:
+                event()
+                continue
+
+            until_end = clock.now + player.seconds_until_end()
+            target = min(until_end, player.next_event_time())
+            if target == float("inf"):
+                raise RuntimeError("scenario {} never ends".format(scenario.name))
+
+            reached = clock.advance_to(target, lambda: listener._thread, interrupted)
+            if reached and target == until_end:
+                player.end_item()
+
+        listener.stop_listener()
+    real_seconds = time.perf_counter() - started
+
+    latencies = player.latencies or [0.0]
+    return Report(
+        name=scenario.name,
+        segments=sum(len(item.segments) for item in scenario.items),
+        skips=player.skips,
+        reskips=player.reskips,
+        missed=len(player.crossed - player.skipped),
+        double=player.double_skips,
+        dropped=listener._accuracy.dropped,
+        seeks=listener.seeks,
+        mutes=player.mutes,
+        audible=player.audible,
+        silenced=player.silenced,
+        latency_mean=sum(latencies) / len(latencies),
+        latency_p95=_quantile([abs(latency) for latency in latencies], 0.95),
+        latency_max=max(abs(latency) for latency in latencies),
+        wakeups=clock.wakeups,
+        get_time_calls=player.get_time_calls,
+        virtual_seconds=clock.now,
+        real_seconds=real_seconds,
+    )
+
+
+# scenarios
+
+
+def _segments(rng, duration, count):  # type: (random.Random, float, int) -> list[SponsorSegment]
+    spacing = duration / (count + 1)
+    segments = []
+    for i in range(count):
+        start = round((i + 1) * spacing + rng.uniform(-spacing / 4, spacing / 4), 3)
+        length = rng.uniform(2, min(30, spacing / 2))
+        segments.append(SponsorSegment("uuid-{}".format(i), "sponsor", start, round(start + length, 3)))
+    return segments
+
+
+def steady_playback(seed=0, count=300):  # type: (int, int) -> Scenario
+    rng = random.Random(seed)
+    duration = 36.0 * count
+    return Scenario("steady playback", [Item(duration, _segments(rng, duration, count))], [], jitter=0.02)
+
+
+def speed_changes(seed=0, count=100):  # type: (int, int) -> Scenario
+    rng = random.Random(seed)
+    duration = 36.0 * count
+    events = [(t, "set_speed", rng.choice((1.0, 1.25, 1.5, 2.0))) for t in range(60, int(duration / 2), 120)]
+    return Scenario("speed changes", [Item(duration, _segments(rng, duration, count))], events, jitter=0.02)
+
+
+def pause_and_seek(seed=0, count=100):  # type: (int, int) -> Scenario
+    rng = random.Random(seed)
+    duration = 36.0 * count
+    events = []
+    for t in range(45, int(duration / 2), 90):
+        if rng.random() < 0.5:
+            events += [(t, "pause", None), (t + rng.uniform(1, 10), "resume", None)]
+        else:
+            events.append((t, "user_seek", rng.uniform(0, duration * 0.9)))
+    return Scenario("pause and seek", [Item(duration, _segments(rng, duration, count))], events, jitter=0.02)
+
+
+def stalls(seed=0, count=100):  # type: (int, int) -> Scenario
+    rng = random.Random(seed)
+    duration = 36.0 * count
+    events = []
+    for t in range(30, int(duration), 60):
+        events += [(t, "stall", None), (t + rng.uniform(0.2, 3), "unstall", None)]
+    return Scenario("buffering stalls", [Item(duration, _segments(rng, duration, count))], events, jitter=0.05)
+
+
+def playlist(seed=0, items=30, count=10):  # type: (int, int, int) -> Scenario
+    rng = random.Random(seed)
+    playlist_items = []
+    for _ in range(items):
+        duration = 600.0
+        segments = _segments(rng, duration - 60, count)
+        if rng.random() < 0.3:
+            # outro segment running until the end, skipping it plays the next item
+            segments.append(SponsorSegment("outro", "outro", duration - 20, duration))
+        playlist_items.append(Item(duration, segments))
+    return Scenario("playlist", playlist_items, [], jitter=0.02)
+
+
+def mutes(seed=0, count=100):  # type: (int, int) -> Scenario
+    rng = random.Random(seed)
+    duration = 36.0 * count
+    segments = [
+        seg._replace(action_type=ACTION_MUTE) if i % 3 == 0 else seg
+        for i, seg in enumerate(_segments(rng, duration, count))
+    ]
+    # a skip inside of a mute and one sticking out of it
+    for i, seg in enumerate(segments[:30:3]):
+        offset = 1.0 if i % 2 else seg.end - seg.start - 1.0
+        segments.append(SponsorSegment("inner-{}".format(i), "sponsor", seg.start + offset, seg.start + offset + 2.0))
+    segments.sort(key=lambda seg: seg.start)
+
+    events = [(t, "user_seek", rng.uniform(0, duration * 0.9)) for t in range(300, int(duration / 2), 600)]
+    return Scenario("mutes", [Item(duration, segments)], events, jitter=0.02)
+
+
+SCENARIOS = (steady_playback, speed_changes, pause_and_seek, stalls, playlist, mutes)
+
+
+def format_report(report):  # type: (Report) -> str
+    return (
+        "{r.name:<18} {r.segments:>5} {r.skips:>5} {r.reskips:>7} {r.missed:>6} {r.double:>6} {r.dropped:>7} "
+        "{r.mutes:>5} {r.audible:>9.2f} {r.silenced:>10.2f} "
+        "{mean:>+9.1f} {p95:>8.1f} {max:>8.1f} {r.wakeups:>7} {r.get_time_calls:>7} "
+        "{speedup:>8.0f}x"
+    ).format(
+        r=report,
+        mean=report.latency_mean * 1000,
+        p95=report.latency_p95 * 1000,
+        max=report.latency_max * 1000,
+        speedup=report.virtual_seconds / max(report.real_seconds, 1e-9),
+    )
+
+
+def main():  # type: () -> None
+    print(
+        "{:<18} {:>5} {:>5} {:>7} {:>6} {:>6} {:>7} {:>5} {:>9} {:>10} {:>9} {:>8} {:>8} {:>7} {:>7} {:>9}".format(
+            "scenario", "segs", "skips", "reskips", "missed", "double", "dropped", "mutes", "audible s", "silenced s",
+            "mean ms", "p95 ms", "max ms", "wakeups", "getTime", "speedup",
+        )
+    )
+    for build in SCENARIOS:
+        print(format_report(run_scenario(build())))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+import unittest
+
+from tests import checkpoint_simulator as simulator
+
+
+class CheckpointScenarioTests(unittest.TestCase):
+    def assertNoMisses(self, report):
+        self.assertEqual(report.missed, 0)
+        self.assertEqual(report.double, 0)
+
+    def test_steady_playback_skips_precisely(self):
+        report = simulator.run_scenario(simulator.steady_playback(count=100))
+
+        self.assertNoMisses(report)
+        self.assertEqual(report.skips, report.segments)
+        # the error is bounded by the player's jitter
+        self.assertLess(report.latency_p95, 0.05)
+        # one coarse sleep and a short approach per segment
+        self.assertLess(report.get_time_calls, 15 * report.segments)
+        self.assertGreater(report.virtual_seconds, 100 * report.real_seconds)
+
+    def test_speed_changes(self):
+        report = simulator.run_scenario(simulator.speed_changes(count=50))
+
+        self.assertNoMisses(report)
+        self.assertLess(report.latency_p95, 0.05)
+
+    def test_pause_and_seek(self):
+        report = simulator.run_scenario(simulator.pause_and_seek(count=50))
+
+        self.assertNoMisses(report)
+        # segments the user seeked back before count as reskips, a skip never comes out of nowhere
+        self.assertLessEqual(report.skips, report.segments)
+        self.assertLess(report.latency_max, 0.05)
+
+    def test_buffering_stalls(self):
+        report = simulator.run_scenario(simulator.stalls(count=50))
+
+        self.assertNoMisses(report)
+        self.assertEqual(report.skips, report.segments)
+
+    def test_playlist_advance(self):
+        report = simulator.run_scenario(simulator.playlist(items=10))
+
+        self.assertNoMisses(report)
+        self.assertEqual(report.skips, report.segments)
+
+    def test_mutes(self):
+        report = simulator.run_scenario(simulator.mutes())
+
+        self.assertNoMisses(report)
+        self.assertGreater(report.mutes, 0)
+        # muting never seeks
+        self.assertEqual(report.seeks, report.skips + report.reskips)
+        self.assertLess(report.audible, 0.05 * report.mutes)
+        self.assertLess(report.silenced, 0.05 * report.mutes)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,78 @@
+import hashlib
+import unittest
+
+from resources.lib.sponsorblock import CompactSegmentStore, PackedSegments, SponsorSegment
+
+SEGMENTS = [
+    SponsorSegment(hashlib.sha256(b"a").hexdigest(), "sponsor", 1.5, 10.25),
+    SponsorSegment("9a8b7c6d-1e2f-4a5b-8c9d-0e1f2a3b4c5d", "intro", 0.0, 5.0, "mute"),
+    SponsorSegment("9A8B7C6D-1E2F-4A5B-8C9D-0E1F2A3B4C5D", "outro", 100.0, 120.0),
+    SponsorSegment("not-a-uuid-é", "some_new_category", 30.125, 31.0),
+]
+
+
+class PackedSegmentsTests(unittest.TestCase):
+    def test_round_trip(self):
+        packed = PackedSegments(SEGMENTS)
+
+        self.assertEqual(len(packed), len(SEGMENTS))
+        self.assertEqual(list(packed), SEGMENTS)
+        self.assertEqual(packed, SEGMENTS)
+        self.assertEqual(packed, PackedSegments(SEGMENTS))
+        self.assertEqual(packed.uuid(2), SEGMENTS[2].uuid)
+
+    def test_indexing(self):
+        packed = PackedSegments(SEGMENTS)
+
+        self.assertEqual(packed[-1], SEGMENTS[-1])
+        self.assertEqual(packed[1:3], SEGMENTS[1:3])
+        with self.assertRaises(IndexError):
+            packed[len(SEGMENTS)]
+
+    def test_empty(self):
+        packed = PackedSegments()
+
+        self.assertFalse(packed)
+        self.assertEqual(list(packed), [])
+
+    def test_smaller_than_a_list(self):
+        segments = [
+            SponsorSegment(hashlib.sha256(str(i).encode()).hexdigest(), "sponsor", i * 10.0, i * 10.0 + 5)
+            for i in range(10)
+        ]
+        list_size = segments.__sizeof__() + sum(
+            seg.__sizeof__() + seg.uuid.__sizeof__() + seg.start.__sizeof__() + seg.end.__sizeof__()
+            for seg in segments
+        )
+
+        self.assertLess(PackedSegments(segments).sizeof() * 2, list_size)
+
+
+class CompactSegmentStoreTests(unittest.TestCase):
+    def test_evicts_least_recently_used(self):
+        store = CompactSegmentStore(max_videos=2)
+        store.put("a", SEGMENTS[:1])
+        store.put("b", SEGMENTS[1:2])
+        store.get("a")
+        store.put("c", SEGMENTS[2:])
+
+        self.assertEqual(len(store), 2)
+        self.assertNotIn("b", store)
+        self.assertEqual(store.get("a"), SEGMENTS[:1])
+        self.assertEqual(store.get("c"), SEGMENTS[2:])
+
+    def test_discard_and_clear(self):
+        store = CompactSegmentStore()
+        store.put("a", SEGMENTS)
+        store.put("b", [])
+
+        store.discard("a")
+        self.assertIsNone(store.get("a"))
+        self.assertEqual(store.get("b"), [])
+
+        store.clear()
+        self.assertEqual(len(store), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
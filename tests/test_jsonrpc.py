@@ -0,0 +1,141 @@
+import json
+import sys
+import types
+import unittest
+from unittest import mock
+
+
+if "xbmc" not in sys.modules:
+    xbmc = types.ModuleType("xbmc")
+    xbmc.getInfoLabel = mock.Mock(return_value="")
+    xbmc.executeJSONRPC = mock.Mock(return_value='{"result":{"item":{}}}')
+    sys.modules["xbmc"] = xbmc
+
+
+from resources.lib import playback_context
+from resources.lib.utils import jsonrpc
+from resources.lib.utils import xbmc as xbmc_utils
+
+
+def _respond(responses):
+    def execute(raw):
+        requests = json.loads(raw)
+        return json.dumps(responses(requests))
+
+    return mock.patch.object(jsonrpc.xbmc, "executeJSONRPC", side_effect=execute, create=True)
+
+
+class BatchTests(unittest.TestCase):
+    def test_results_are_in_call_order(self):
+        def responses(requests):
+            # Kodi doesn't have to answer in order
+            return [{"id": req["id"], "result": req["method"]} for req in reversed(requests)]
+
+        with _respond(responses) as execute:
+            results = jsonrpc.execute_batch([("A", [1]), ("B", []), ("C", [{"x": 2}])])
+
+        self.assertEqual(results, ["A", "B", "C"])
+        execute.assert_called_once()
+        sent = json.loads(execute.call_args[0][0])
+        self.assertEqual([req["params"] for req in sent], [[1], [], [{"x": 2}]])
+
+    def test_errors_are_per_entry(self):
+        def responses(requests):
+            return [
+                {"id": 0, "result": "ok"},
+                {"id": 1, "error": {"code": -32602, "message": "Invalid params."}},
+            ]
+
+        with _respond(responses):
+            ok, failed, missing = jsonrpc.execute_batch([("A", []), ("B", []), ("C", [])])
+
+        self.assertEqual(ok, "ok")
+        self.assertIsInstance(failed, jsonrpc.JSONRPCError)
+        self.assertEqual(failed.code, -32602)
+        self.assertIsInstance(missing, jsonrpc.JSONRPCError)
+
+    def test_rejected_batch_raises(self):
+        def responses(_requests):
+            return {"id": None, "error": {"code": -32700, "message": "Parse error."}}
+
+        with _respond(responses), self.assertRaises(jsonrpc.JSONRPCError):
+            jsonrpc.execute_batch([("A", [])])
+
+    def test_empty_batch_is_not_sent(self):
+        with _respond(lambda requests: []) as execute:
+            self.assertEqual(jsonrpc.execute_batch([]), [])
+        execute.assert_not_called()
+
+
+class PlaybackContextPrefetchTests(unittest.TestCase):
+    @mock.patch.object(playback_context, "get_upcoming_playlist_paths")
+    @mock.patch.object(playback_context, "get_player_item")
+    def test_prefetch_uses_a_single_round_trip(self, get_item, get_upcoming):
+        def responses(_requests):
+            return [
+                {"id": 0, "result": {"item": {"file": "plugin://plugin.video.youtube/play/?video_id=a"}}},
+                {"id": 1, "result": {"totaltime": {"hours": 1, "minutes": 2, "seconds": 3, "milliseconds": 500}}},
+                # the playlist ends before the limit
+                {"id": 2, "result": {"items": [{"file": "c"}, {"file": "d"}]}},
+            ]
+
+        player = mock.Mock()
+        context = playback_context.PlaybackContext(player)
+        playlist = mock.Mock(**{"getposition.return_value": 1})
+        with _respond(responses) as execute, mock.patch.object(
+            xbmc_utils.xbmc, "PlayList", return_value=playlist, create=True
+        ), mock.patch.object(xbmc_utils.xbmc, "PLAYLIST_VIDEO", 1, create=True):
+            context.prefetch(playlist_count=3)
+
+        execute.assert_called_once()
+        sent = json.loads(execute.call_args[0][0])
+        self.assertEqual(sent[2]["params"][2], {"start": 2, "end": 5})
+        self.assertEqual(context.item["file"], "plugin://plugin.video.youtube/play/?video_id=a")
+        self.assertEqual(context.total_time, 3723.5)
+        self.assertEqual(context.upcoming_playlist_paths(1), ["c"])
+        self.assertEqual(context.upcoming_playlist_paths(3), ["c", "d"])
+        get_item.assert_not_called()
+        get_upcoming.assert_not_called()
+        player.getTotalTime.assert_not_called()
+
+    @mock.patch.object(playback_context, "get_upcoming_playlist_paths")
+    def test_playlist_is_only_fetched_when_asked_for(self, get_upcoming):
+        def responses(requests):
+            return [{"id": req["id"], "result": {}} for req in requests]
+
+        get_upcoming.return_value = ["y"]
+        context = playback_context.PlaybackContext(mock.Mock())
+        with _respond(responses) as execute:
+            context.prefetch()
+
+        sent = json.loads(execute.call_args[0][0])
+        self.assertEqual([req["method"] for req in sent], ["Player.GetItem", "Player.GetProperties"])
+        self.assertEqual(context.upcoming_playlist_paths(1), ["y"])
+
+    @mock.patch.object(playback_context, "get_upcoming_playlist_paths")
+    @mock.patch.object(playback_context, "get_player_item")
+    def test_failed_entries_are_fetched_on_demand(self, get_item, get_upcoming):
+        def responses(_requests):
+            error = {"code": -32100, "message": "Failed to execute method."}
+            return [
+                {"id": 0, "error": error},
+                {"id": 1, "result": {"totaltime": {"seconds": 10}}},
+                {"id": 2, "error": error},
+            ]
+
+        get_item.return_value = {"file": "x"}
+        get_upcoming.return_value = ["y"]
+        context = playback_context.PlaybackContext(mock.Mock())
+        playlist = mock.Mock(**{"getposition.return_value": 0})
+        with _respond(responses), mock.patch.object(
+            xbmc_utils.xbmc, "PlayList", return_value=playlist, create=True
+        ), mock.patch.object(xbmc_utils.xbmc, "PLAYLIST_VIDEO", 1, create=True):
+            context.prefetch(playlist_count=1)
+
+        self.assertEqual(context.item, {"file": "x"})
+        self.assertEqual(context.total_time, 10.0)
+        self.assertEqual(context.upcoming_playlist_paths(1), ["y"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from resources.lib.sponsorblock import SponsorBlockAPI
+from resources.lib.sponsorblock.endpoints import GET_SKIP_SEGMENTS
+from resources.lib.utils.metrics import Histogram, MetricsRegistry
+
+
+class HistogramTests(unittest.TestCase):
+    def test_values_land_in_upper_bound_bucket(self):
+        histogram = Histogram((0.1, 1.0))
+        for value in (0.05, 0.1, 0.5, 2.0):
+            histogram.observe(value)
+
+        self.assertEqual(histogram.counts, [2, 1, 1])
+        self.assertEqual((histogram.min, histogram.max), (0.05, 2.0))
+
+    def test_quantile_is_capped_by_max(self):
+        histogram = Histogram((0.1, 1.0))
+        histogram.observe(0.3)
+        histogram.observe(0.4)
+
+        self.assertEqual(histogram.quantile(0.5), 0.4)
+        self.assertIsNone(Histogram().quantile(0.5))
+
+
+class MetricsRegistryTests(unittest.TestCase):
+    def test_snapshot_contains_label_ratios(self):
+        metrics = MetricsRegistry()
+        metrics.increment("cache.lookups", "hit", 3)
+        metrics.increment("cache.lookups", "miss")
+
+        lookups = metrics.snapshot()["counters"]["cache.lookups"]
+        self.assertEqual(lookups["counts"], {"hit": 3, "miss": 1})
+        self.assertEqual(lookups["ratios"], {"hit": 0.75, "miss": 0.25})
+
+    def test_timer_observes_failed_body(self):
+        metrics = MetricsRegistry()
+        with self.assertRaises(ValueError):
+            with metrics.timer("work"):
+                raise ValueError
+
+        self.assertEqual(metrics.snapshot()["histograms"]["work"]["count"], 1)
+
+    def test_write_snapshot(self):
+        metrics = MetricsRegistry()
+        metrics.observe("api.latency GET /api/skipSegments", 0.2)
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "profile", "metrics.json")
+            metrics.write_snapshot(path)
+            with open(path) as fp:
+                snapshot = json.load(fp)
+
+        self.assertEqual(snapshot["histograms"]["api.latency GET /api/skipSegments"]["count"], 1)
+
+
+
+class ApiMetricsTests(unittest.TestCase):
+    def test_requests_are_named_by_path(self):
+        metrics = MetricsRegistry()
+        api = SponsorBlockAPI(api_server="a.example", metrics=metrics)
+        self.addCleanup(api.close)
+        api._session = mock.Mock()
+        api._session.request.return_value = mock.Mock(status_code=200)
+
+        api._send("GET", GET_SKIP_SEGMENTS, {})
+        api._send("GET", GET_SKIP_SEGMENTS + "/abcd", {}, endpoint=GET_SKIP_SEGMENTS + "/:sha256HashPrefix")
+
+        snapshot = metrics.snapshot()
+        self.assertEqual(
+            sorted(snapshot["histograms"]),
+            ["api.latency GET /api/skipSegments", "api.latency GET /api/skipSegments/:sha256HashPrefix"],
+        )
+        self.assertEqual(snapshot["counters"]["api.status GET /api/skipSegments"]["counts"], {"200": 1})
+
+
+if __name__ == "__main__":
+    unittest.main()
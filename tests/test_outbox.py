@@ -0,0 +1,122 @@
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+from resources.lib.sponsorblock import outbox
+from resources.lib.sponsorblock.errors import ResponseError
+
+
+class RecordingSender:
+    def __init__(self, fail=None):
+        self.fail = fail
+        self.sent = []
+        self.called = threading.Event()
+
+    def __call__(self, url, params):
+        self.called.set()
+        if self.fail is not None:
+            raise self.fail
+        self.sent.append((url, params))
+
+
+def wait_until(predicate, timeout=5):
+    for _ in range(int(timeout / 0.01)):
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+class OutboxTests(unittest.TestCase):
+    def setUp(self):
+        self._dir = tempfile.TemporaryDirectory()
+        self.spool_path = os.path.join(self._dir.name, "outbox.json")
+
+    def tearDown(self):
+        self._dir.cleanup()
+
+    def test_later_vote_replaces_pending_vote(self):
+        send = RecordingSender()
+        box = outbox.Outbox(send)
+        with box._cond:
+            box.put("vote", {"UUID": "a", "userID": "u", "type": 1})
+            box.put("vote", {"UUID": "a", "userID": "u", "type": 0})
+
+        self.assertTrue(wait_until(lambda: send.sent))
+        box.close()
+        self.assertEqual(send.sent, [("vote", {"UUID": "a", "userID": "u", "type": 0})])
+
+    def test_rejected_request_is_dropped(self):
+        resp = mock.Mock(status_code=400)
+        send = RecordingSender(fail=ResponseError(resp))
+        box = outbox.Outbox(send, spool_path=self.spool_path)
+        box.put("viewed", {"UUID": "a"})
+
+        self.assertTrue(wait_until(lambda: not box._pending))
+        box.close()
+        self.assertFalse(os.path.exists(self.spool_path))
+
+    def test_sender_is_told_the_outcome(self):
+        box = outbox.Outbox(RecordingSender())
+        accepted = mock.Mock()
+        box.put("vote", {"UUID": "a", "userID": "u", "type": 1}, on_done=accepted)
+        self.assertTrue(wait_until(lambda: accepted.called))
+        box.close()
+        accepted.assert_called_once_with(None)
+
+        error = ResponseError(mock.Mock(status_code=403))
+        box = outbox.Outbox(RecordingSender(fail=error))
+        rejected = mock.Mock()
+        box.put("vote", {"UUID": "a", "userID": "u", "type": 1}, on_done=rejected)
+        self.assertTrue(wait_until(lambda: rejected.called))
+        box.close()
+        rejected.assert_called_once_with(error)
+
+    def test_failed_requests_are_spooled_and_sent_on_next_start(self):
+        send = RecordingSender(fail=ConnectionError())
+        box = outbox.Outbox(send, spool_path=self.spool_path)
+        box.put("viewed", {"UUID": "a"})
+        self.assertTrue(send.called.wait(5))
+        box.close()
+        self.assertTrue(os.path.exists(self.spool_path))
+
+        send = RecordingSender()
+        box = outbox.Outbox(send, spool_path=self.spool_path)
+        self.assertTrue(wait_until(lambda: send.sent))
+        box.close()
+
+        self.assertEqual(send.sent, [("viewed", {"UUID": "a"})])
+        self.assertFalse(os.path.exists(self.spool_path))
+
+
+    def test_spool_shrinks_with_every_sent_request(self):
+        with open(self.spool_path, "w") as fp:
+            json.dump([["viewed", {"UUID": "a"}], ["viewed", {"UUID": "b"}]], fp)
+
+        release = threading.Event()
+        send = RecordingSender()
+
+        def send_first_only(url, params):
+            if params["UUID"] == "b":
+                release.wait(5)
+            send(url, params)
+
+        box = outbox.Outbox(send_first_only, spool_path=self.spool_path)
+        self.assertTrue(wait_until(lambda: send.sent))
+
+        def spooled():
+            with open(self.spool_path) as fp:
+                return json.load(fp)
+
+        self.assertTrue(wait_until(lambda: spooled() == [["viewed", {"UUID": "b"}]]))
+        release.set()
+        self.assertTrue(wait_until(lambda: not os.path.exists(self.spool_path)))
+        box.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -11,8 +11,9 @@ if "xbmc" not in sys.modules:
     sys.modules["xbmc"] = xbmc
 
 
-from resources.lib.apis import youtube_api
+from resources.lib.apis import api_factory, resolver, youtube_api
 from resources.lib.apis.invidious_api import InvidiousApi
+from resources.lib import playback_context, prefetcher
 from resources.lib.utils import xbmc as xbmc_utils
 
 
@@ -50,28 +51,102 @@ class YouTubeUrlTests(unittest.TestCase):
             youtube_api.video_id_from_url("plugin://plugin.video.youtube/play/")
         )
 
-    @mock.patch.object(youtube_api, "get_playing_file_path")
-    @mock.patch.object(youtube_api, "get_player_item")
+    @mock.patch.object(playback_context, "get_playing_file_path")
+    @mock.patch.object(playback_context, "get_player_item")
     def test_uses_original_item_file_after_stream_resolution(self, item, playing_file):
         playing_file.return_value = "https://rr1.googlevideo.com/videoplayback"
         item.return_value = {
             "file": "plugin://plugin.video.youtube/play/?video_id=dQw4w9WgXcQ"
         }
-        self.assertEqual(YouTubeApi().get_video_id(), "dQw4w9WgXcQ")
+        context = playback_context.PlaybackContext(mock.Mock())
+        self.assertEqual(YouTubeApi().get_video_id(context), "dQw4w9WgXcQ")
 
 
 class PlaybackSourceTests(unittest.TestCase):
-    @mock.patch.object(xbmc_utils, "get_playing_file_path")
-    def test_googlevideo_stream_maps_back_to_youtube(self, playing_file):
-        playing_file.return_value = "https://rr1.googlevideo.com/videoplayback"
-        self.assertEqual(xbmc_utils.get_playing_addon(), "plugin.video.youtube")
+    def test_googlevideo_stream_maps_back_to_youtube(self):
+        self.assertEqual(
+            xbmc_utils.addon_from_path("https://rr1.googlevideo.com/videoplayback"), "plugin.video.youtube"
+        )
 
-    @mock.patch(
-        "resources.lib.apis.invidious_api.get_playing_file_path",
+    @mock.patch.object(
+        playback_context,
+        "get_playing_file_path",
         return_value="plugin://plugin.video.invidious/?action=video",
     )
     def test_invidious_missing_video_id_is_not_an_error(self, _playing_file):
-        self.assertIsNone(InvidiousApi().get_video_id())
+        context = playback_context.PlaybackContext(mock.Mock())
+        self.assertIsNone(InvidiousApi().get_video_id(context))
+
+
+class PlaybackContextTests(unittest.TestCase):
+    @mock.patch.object(
+        playback_context,
+        "get_playing_file_path",
+        return_value="plugin://plugin.video.piped/watch/dQw4w9WgXcQ",
+    )
+    def test_facts_are_fetched_once(self, playing_file):
+        player = mock.Mock()
+        player.getTotalTime.side_effect = [0.0, 212.0, 300.0]
+        context = playback_context.PlaybackContext(player)
+
+        self.assertEqual(context.addon_id, "plugin.video.piped")
+        self.assertEqual(context.resolved.video_id, "dQw4w9WgXcQ")
+        playing_file.assert_called_once_with()
+
+        # unknown durations aren't cached
+        self.assertEqual(context.total_time, 0.0)
+        self.assertEqual(context.total_time, 212.0)
+        self.assertEqual(context.total_time, 212.0)
+
+
+class PlaylistPathTests(unittest.TestCase):
+    def test_resolves_supported_addons(self):
+        self.assertEqual(
+            prefetcher.video_id_from_playlist_path(
+                "plugin://plugin.video.youtube/play/?video_id=dQw4w9WgXcQ"
+            ),
+            "dQw4w9WgXcQ",
+        )
+        self.assertEqual(
+            prefetcher.video_id_from_playlist_path(
+                "plugin://plugin.video.invidious/?action=video&videoId=dQw4w9WgXcQ"
+            ),
+            "dQw4w9WgXcQ",
+        )
+
+    def test_ignores_unknown_addons(self):
+        self.assertIsNone(
+            prefetcher.video_id_from_playlist_path("plugin://plugin.video.other/?id=1")
+        )
+
+
+class ResolverTests(unittest.TestCase):
+    def test_googlevideo_stream_has_no_video_id(self):
+        self.assertEqual(
+            resolver.resolve_path("https://rr1---sn-4g5e6nzz.googlevideo.com/videoplayback?id=o-AB"),
+            resolver.PathInfo("plugin.video.youtube", None, True),
+        )
+
+    def test_piped_watch_path(self):
+        self.assertEqual(
+            resolver.resolve_path("plugin://plugin.video.piped/watch/dQw4w9WgXcQ"),
+            resolver.PathInfo("plugin.video.piped", "dQw4w9WgXcQ", False),
+        )
+
+    def test_matchers_are_per_addon(self):
+        self.assertIsNone(
+            resolver.resolve_path("plugin://plugin.video.other/watch/dQw4w9WgXcQ").video_id
+        )
+
+    def test_every_supported_addon_has_a_matcher(self):
+        self.assertEqual(set(resolver._PLUGIN_MATCHERS), set(api_factory.API_MAP))
+
+    def test_result_is_memoized(self):
+        path = "plugin://plugin.video.youtube/play/?video_id=memoized"
+        resolver.resolve_path(path)
+        hits = resolver.resolve_path.cache_info().hits
+        resolver.resolve_path(path)
+        self.assertEqual(resolver.resolve_path.cache_info().hits, hits + 1)
 
 
 YouTubeApi = youtube_api.YouTubeApi
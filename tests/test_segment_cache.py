@@ -0,0 +1,255 @@
+import itertools
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+from resources.lib.sponsorblock import PackedSegments, SegmentCache, SponsorBlockAPI, SponsorSegment, compact
+from resources.lib.sponsorblock.cache import Validators
+from resources.lib.sponsorblock.errors import NotFound, NotModified
+from resources.lib.sponsorblock.utils import hash_prefix
+
+
+SEGMENTS = [
+    SponsorSegment("uuid-1", "sponsor", 10.0, 20.0),
+    SponsorSegment("uuid-2", "intro", 30.0, 35.5, "mute"),
+]
+
+
+class SegmentCacheTests(unittest.TestCase):
+    def setUp(self):
+        self._dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self._dir.name, "profile", "segments.db")
+
+    def tearDown(self):
+        self._dir.cleanup()
+
+    def test_round_trip_survives_reopen(self):
+        cache = SegmentCache(self.path)
+        cache.put("video", "[]", SEGMENTS)
+        cache.close()
+
+        cache = SegmentCache(self.path)
+        entry = cache.get("video", "[]")
+        cache.close()
+
+        self.assertEqual(entry.segments, SEGMENTS)
+        self.assertFalse(entry.stale)
+
+    def test_other_categories_are_a_miss(self):
+        cache = SegmentCache(self.path)
+        cache.put("video", '["sponsor"]', SEGMENTS)
+        self.assertIsNone(cache.get("video", '["intro"]'))
+
+    def test_expired_entry_is_stale_then_gone(self):
+        cache = SegmentCache(self.path, stale_ttl=60)
+        cache.put("video", "[]", SEGMENTS, ttl=0)
+        self.assertTrue(cache.get("video", "[]").stale)
+
+        cache.put("video", "[]", SEGMENTS, ttl=-61)
+        self.assertIsNone(cache.get("video", "[]"))
+
+    def test_validators_are_kept_until_touched(self):
+        cache = SegmentCache(self.path)
+        validators = Validators('"abc"', None)
+        cache.put("video", "[]", SEGMENTS, ttl=0, validators=validators)
+
+        entry = cache.get("video", "[]")
+        self.assertTrue(entry.stale)
+        self.assertEqual(entry.validators, validators)
+
+        cache.touch("video")
+        entry = cache.get("video", "[]")
+        self.assertFalse(entry.stale)
+        self.assertEqual(entry.validators, validators)
+
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = SegmentCache(self.path, max_entries=2)
+        cache.put("a", "[]", SEGMENTS)
+        cache.put("b", "[]", SEGMENTS)
+        cache.get("a", "[]")
+        cache.put("c", "[]", SEGMENTS)
+
+        self.assertIsNotNone(cache.get("a", "[]"))
+        self.assertIsNone(cache.get("b", "[]"))
+        self.assertIsNotNone(cache.get("c", "[]"))
+
+    def test_missing_video_is_not_served_stale(self):
+        cache = SegmentCache(self.path, negative_ttl=60)
+        cache.put_missing("video", "[]")
+        self.assertEqual(cache.get("video", "[]").segments, [])
+
+        cache.put("video", "[]", (), ttl=0)
+        self.assertIsNone(cache.get("video", "[]"))
+
+    def test_zero_negative_ttl_forgets_missing_videos(self):
+        cache = SegmentCache(self.path, negative_ttl=0)
+        cache.put("video", "[]", SEGMENTS)
+        cache.put_missing("video", "[]")
+        self.assertIsNone(cache.get("video", "[]"))
+
+    def test_segments_are_kept_in_memory(self):
+        cache = SegmentCache(self.path)
+        cache.put("video", "[]", SEGMENTS)
+        cache.put("other", "[]", SEGMENTS[:1])
+
+        entry = cache.get("video", "[]")
+        self.assertIsInstance(entry.segments, PackedSegments)
+        self.assertEqual(entry.segments, SEGMENTS)
+
+        cache.put("video", "[]", SEGMENTS[1:])
+        self.assertEqual(cache.get("video", "[]").segments, SEGMENTS[1:])
+        cache.put_missing("video", "[]")
+        self.assertEqual(cache.get("video", "[]").segments, [])
+
+    def test_segments_that_cant_be_packed_are_still_cached(self):
+        cache = SegmentCache(self.path)
+        with mock.patch.object(compact, "_name_code", side_effect=ValueError("too many")):
+            cache.put("video", "[]", SEGMENTS)
+            self.assertEqual(cache.get("video", "[]").segments, SEGMENTS)
+
+    def test_deleted_entries_leave_memory(self):
+        cache = SegmentCache(self.path, stale_ttl=60, max_entries=2)
+        prefix = hash_prefix("bucket")
+        cache.put_bucket(prefix, "[]", {"bucket": SEGMENTS})
+        cache.put_bucket(prefix, "[]", {})
+        self.assertNotIn("bucket", cache._memory)
+
+        cache.put("expired", "[]", SEGMENTS, ttl=-61)
+        cache.prune()
+        self.assertNotIn("expired", cache._memory)
+
+        cache.put("a", "[]", SEGMENTS)
+        cache.put("b", "[]", SEGMENTS)
+        cache.put("c", "[]", SEGMENTS)
+        self.assertNotIn("a", cache._memory)
+
+        cache.put("stale", "[]", SEGMENTS, ttl=-61)
+        self.assertIsNone(cache.get("stale", "[]"))
+        self.assertNotIn("stale", cache._memory)
+
+
+class CachedApiTests(unittest.TestCase):
+    def setUp(self):
+        self.cache = SegmentCache(":memory:")
+        self.api = SponsorBlockAPI(cache=self.cache)
+
+    def test_mute_segments_are_fetched(self):
+        resp = mock.MagicMock(status_code=200, headers={})
+        resp.__enter__.return_value = resp
+        resp.json.return_value = [
+            {"UUID": "uuid-2", "category": "intro", "segment": [30.0, 35.5], "actionType": "mute"},
+            {"UUID": "uuid-1", "category": "sponsor", "segment": [10.0, 20.0]},
+        ]
+        self.api._session = mock.Mock()
+        self.api._session.request.return_value = resp
+
+        self.assertEqual(self.api.get_skip_segments("video"), SEGMENTS)
+        params = self.api._session.request.call_args[0][2]
+        self.assertEqual(json.loads(params["actionTypes"]), ["skip", "mute"])
+        self.assertEqual(self.cache.get("video", self.api._categories_param).segments, SEGMENTS)
+
+    def test_fresh_entry_skips_request(self):
+        with mock.patch.object(self.api, "_fetch_skip_segments", return_value=(SEGMENTS, None)) as fetch:
+            self.assertEqual(self.api.get_skip_segments("video"), SEGMENTS)
+            self.assertEqual(self.api.get_skip_segments("video"), SEGMENTS)
+
+        fetch.assert_called_once_with("video", None)
+
+    def test_missing_video_is_remembered(self):
+        with mock.patch.object(self.api, "_fetch_skip_segments", side_effect=NotFound(None)) as fetch:
+            for _ in range(3):
+                with self.assertRaises(NotFound):
+                    self.api.get_skip_segments("video")
+
+        fetch.assert_called_once_with("video", None)
+
+    def test_missing_video_is_looked_up_again_after_negative_ttl(self):
+        self.cache.set_negative_ttl(-1)
+        with mock.patch.object(self.api, "_fetch_skip_segments", side_effect=NotFound(None)) as fetch:
+            for _ in range(2):
+                with self.assertRaises(NotFound):
+                    self.api.get_skip_segments("video")
+
+        self.assertEqual(fetch.call_count, 2)
+
+    def test_not_modified_revalidation_keeps_entry(self):
+        validators = Validators('"abc"', "Sat, 17 Oct 2026 00:00:00 GMT")
+        self.cache.put("video", self.api._categories_param, SEGMENTS, ttl=0, validators=validators)
+
+        with mock.patch.object(
+            self.api, "_fetch_skip_segments", side_effect=NotModified(None)
+        ) as fetch:
+            self.assertIsNone(
+                self.api._refresh_video("video", self.api._categories_param, validators)
+            )
+
+        fetch.assert_called_once_with("video", validators)
+        entry = self.cache.get("video", self.api._categories_param)
+        self.assertFalse(entry.stale)
+        self.assertEqual(entry.segments, SEGMENTS)
+
+    def test_stale_entry_is_served_while_revalidating(self):
+        self.cache.put("video", self.api._categories_param, SEGMENTS[:1], ttl=0)
+        refreshed = threading.Event()
+
+        def fetch(_video_id, _validators):
+            refreshed.set()
+            return SEGMENTS, None
+
+        with mock.patch.object(self.api, "_fetch_skip_segments", side_effect=fetch):
+            self.assertEqual(self.api.get_skip_segments("video"), SEGMENTS[:1])
+            self.assertTrue(refreshed.wait(5))
+
+        for _ in range(100):
+            if not self.api._revalidating:
+                break
+            time.sleep(0.01)
+
+        self.assertEqual(self.cache.get("video", self.api._categories_param).segments, SEGMENTS)
+
+    def test_hashed_bucket_answers_neighbours_locally(self):
+        prefix = hash_prefix("video")
+        neighbour = next(
+            "n{}".format(i) for i in itertools.count() if hash_prefix("n{}".format(i)) == prefix
+        )
+        bucket = {"video": SEGMENTS, "other": SEGMENTS[:1]}
+
+        with mock.patch.object(self.api, "_fetch_skip_segments_hashed", return_value=(bucket, None)) as fetch:
+            self.assertEqual(self.api.get_skip_segments_hashed("video"), SEGMENTS)
+            self.assertEqual(self.api.get_skip_segments_hashed("other"), SEGMENTS[:1])
+            self.assertEqual(self.api.get_skip_segments_hashed(neighbour), [])
+
+        fetch.assert_called_once_with(prefix, None)
+
+    def test_bucket_neighbours_follow_the_negative_ttl(self):
+        prefix = hash_prefix("video")
+        neighbour = next(
+            "n{}".format(i) for i in itertools.count() if hash_prefix("n{}".format(i)) == prefix
+        )
+        self.cache.set_negative_ttl(0)
+
+        bucket = {"video": SEGMENTS}
+        with mock.patch.object(self.api, "_fetch_skip_segments_hashed", return_value=(bucket, None)) as fetch:
+            for _ in range(3):
+                self.assertEqual(self.api.get_skip_segments_hashed(neighbour), [])
+            self.assertEqual(self.api.get_skip_segments_hashed("video"), SEGMENTS)
+
+        self.assertEqual(fetch.call_count, 3)
+        self.assertFalse(self.cache.get_prefix(prefix, self.api._categories_param).knows_missing)
+
+    def test_evicted_video_invalidates_its_prefix(self):
+        cache = SegmentCache(":memory:", max_entries=1)
+        prefix = hash_prefix("video")
+        cache.put_bucket(prefix, "[]", {"video": SEGMENTS})
+        cache.put("unrelated", "[]", SEGMENTS)
+
+        self.assertIsNone(cache.get("video", "[]"))
+        self.assertIsNone(cache.get_prefix(prefix, "[]"))
+
+
+if __name__ == "__main__":
+    unittest.main()
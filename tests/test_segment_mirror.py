@@ -0,0 +1,189 @@
+import csv
+import os
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from resources.lib.sponsorblock import SegmentMirror, SponsorBlockAPI, SponsorSegment
+from resources.lib.sponsorblock import mirror as mirror_module
+from resources.lib.sponsorblock.errors import NotFound
+from resources.lib.sponsorblock.mirror import DumpFormatError
+
+HEADER = [
+    "videoID", "startTime", "endTime", "votes", "locked", "incorrectVotes", "UUID", "userID",
+    "timeSubmitted", "views", "category", "actionType", "service", "videoDuration", "hidden",
+    "reputation", "shadowHidden", "hashedVideoID", "userAgent", "description",
+]
+
+
+def _row(video_id, uuid, start, end, category="sponsor", votes=0, locked=0,
+         action_type="skip", service="YouTube", hidden=0, shadow_hidden=0):
+    return [
+        video_id, start, end, votes, locked, 0, uuid, "user", 0, 0, category, action_type,
+        service, 0, hidden, 0, shadow_hidden, "", "", "a description, with a comma",
+    ]
+
+
+class SegmentMirrorTests(unittest.TestCase):
+    def setUp(self):
+        self._dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self._dir.name, "profile", "mirror.db")
+        self.dump_path = os.path.join(self._dir.name, "sponsorTimes.csv")
+
+    def tearDown(self):
+        self._dir.cleanup()
+
+    def write_dump(self, rows, header=HEADER):
+        with open(self.dump_path, "w", newline="") as fp:
+            writer = csv.writer(fp)
+            writer.writerow(header)
+            writer.writerows(rows)
+
+    def import_rows(self, rows):
+        self.write_dump(rows)
+        mirror = SegmentMirror(self.path)
+        self.addCleanup(mirror.close)
+        mirror.import_dump(self.dump_path)
+        return mirror
+
+    def test_filters_rows_the_server_hides(self):
+        mirror = self.import_rows([
+            _row("video", "visible", 1, 2),
+            _row("video", "hidden", 3, 4, hidden=1),
+            _row("video", "shadow", 5, 6, shadow_hidden=1),
+            _row("video", "downvoted", 7, 8, votes=-2),
+            _row("video", "other-service", 9, 10, service="PeerTube"),
+        ])
+
+        self.assertEqual(mirror.get("video", ["sponsor"]), [SponsorSegment("visible", "sponsor", 1.0, 2.0)])
+
+    def test_filters_categories_and_action_types(self):
+        mirror = self.import_rows([
+            _row("video", "intro", 20, 25, category="intro"),
+            _row("video", "sponsor", 1, 2),
+            _row("video", "mute", 5, 6, action_type="mute"),
+            _row("other", "other", 1, 2),
+        ])
+
+        self.assertEqual([seg.uuid for seg in mirror.get("video", ["sponsor", "intro"])], ["sponsor", "mute", "intro"])
+        self.assertEqual([seg.uuid for seg in mirror.get("video", ["sponsor"], ["skip"])], ["sponsor"])
+        self.assertEqual(mirror.get("video", ["sponsor"], ["mute"]), [SponsorSegment("mute", "sponsor", 5.0, 6.0, "mute")])
+        self.assertEqual([seg.uuid for seg in mirror.get("video", ["intro"])], ["intro"])
+        self.assertEqual(mirror.get("video", []), [])
+        self.assertEqual(mirror.get("missing", ["sponsor"]), [])
+
+    def test_picks_best_of_overlapping_segments(self):
+        mirror = self.import_rows([
+            _row("video", "a", 10, 20, votes=1),
+            _row("video", "b", 11, 21, votes=5),
+            _row("video", "c", 12, 19, votes=2, locked=1),
+            _row("video", "d", 30, 40),
+        ])
+
+        self.assertEqual([seg.uuid for seg in mirror.get("video", ["sponsor"])], ["c", "d"])
+
+    def test_overlapping_segments_of_different_action_types_are_kept(self):
+        mirror = self.import_rows([
+            _row("video", "skip", 10, 20, votes=5),
+            _row("video", "mute", 12, 18, action_type="mute"),
+        ])
+
+        self.assertEqual([seg.uuid for seg in mirror.get("video", ["sponsor"])], ["skip", "mute"])
+
+    def test_overlapping_segments_of_different_categories_are_kept(self):
+        mirror = self.import_rows([
+            _row("video", "sponsor", 10, 60, votes=5),
+            _row("video", "selfpromo", 50, 70, category="selfpromo", votes=9),
+        ])
+
+        self.assertEqual(
+            [seg.uuid for seg in mirror.get("video", ["sponsor", "selfpromo"])], ["sponsor", "selfpromo"]
+        )
+
+    def test_older_dumps_without_optional_columns(self):
+        header = ["videoID", "startTime", "endTime", "votes", "UUID", "category"]
+        self.write_dump([["video", 1, 2, 0, "uuid", "sponsor"]], header=header)
+        mirror = SegmentMirror(self.path)
+        self.addCleanup(mirror.close)
+
+        self.assertEqual(mirror.import_dump(self.dump_path), 1)
+        self.assertEqual(len(mirror.get("video", ["sponsor"])), 1)
+
+    def test_missing_required_column_keeps_previous_mirror(self):
+        mirror = self.import_rows([_row("video", "uuid", 1, 2)])
+        self.write_dump([["video"]], header=["videoID"])
+
+        with self.assertRaises(DumpFormatError):
+            mirror.import_dump(self.dump_path)
+
+        self.assertTrue(mirror.ready)
+        self.assertEqual(len(mirror.get("video", ["sponsor"])), 1)
+        self.assertFalse(os.path.exists(self.path + ".tmp"))
+
+    def test_survives_reopen_and_remembers_source(self):
+        self.import_rows([_row("video", "uuid", 1, 2)]).close()
+
+        mirror = SegmentMirror(self.path)
+        self.addCleanup(mirror.close)
+        self.assertTrue(mirror.ready)
+        self.assertEqual(mirror.source, (self.dump_path, os.path.getmtime(self.dump_path)))
+        self.assertEqual(len(mirror.get("video", ["sponsor"])), 1)
+
+    def test_import_is_streamed_in_batches(self):
+        rows = [_row("video{}".format(i), "uuid{}".format(i), 1, 2) for i in range(25)]
+        with mock.patch.object(mirror_module, "IMPORT_BATCH_SIZE", 10):
+            mirror = self.import_rows(rows)
+
+        self.assertEqual(mirror.source[0], self.dump_path)
+        self.assertEqual(len(mirror.get("video24", ["sponsor"])), 1)
+
+    def test_lookup_is_fast(self):
+        mirror = self.import_rows([
+            _row("video{}".format(i), "uuid{}-{}".format(i, j), j * 10, j * 10 + 5)
+            for i in range(2000) for j in range(5)
+        ])
+
+        count = 1000
+        start = time.perf_counter()
+        for i in range(count):
+            mirror.get("video{}".format(i), ["sponsor"])
+        self.assertLess((time.perf_counter() - start) / count, 0.001)
+
+
+class MirroredApiTests(unittest.TestCase):
+    def setUp(self):
+        self.mirror = mock.Mock(ready=True)
+        self.api = SponsorBlockAPI(categories=["sponsor"], mirror=self.mirror)
+        self.addCleanup(self.api.close)
+        self.api._session = mock.Mock()
+
+    def test_lookups_never_touch_the_network(self):
+        segment = SponsorSegment("uuid", "sponsor", 1.0, 2.0)
+        self.mirror.get.return_value = [segment]
+
+        self.assertEqual(self.api.get_skip_segments("video"), [segment])
+        self.assertEqual(self.api.get_skip_segments_hashed("video"), [segment])
+        self.api.warm_up()
+
+        self.mirror.get.assert_called_with("video", ("sponsor",))
+        self.assertEqual(self.api._session.mock_calls, [])
+
+    def test_video_without_segments_is_not_found(self):
+        self.mirror.get.return_value = []
+
+        with self.assertRaises(NotFound):
+            self.api.get_skip_segments("video")
+        self.assertEqual(self.api.get_skip_segments_hashed("video"), [])
+
+    def test_server_is_used_until_imported(self):
+        self.mirror.ready = False
+        with mock.patch.object(self.api, "_fetch_skip_segments", return_value=([], None)) as fetch:
+            self.api.get_skip_segments("video")
+
+        fetch.assert_called_once_with("video")
+        self.mirror.get.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,172 @@
+import threading
+import time
+import unittest
+from unittest import mock
+
+from resources.lib.sponsorblock import SponsorBlockAPI
+from resources.lib.sponsorblock import api as api_module
+from resources.lib.sponsorblock import servers as servers_module
+from resources.lib.sponsorblock.servers import ServerPool, ServerStats, parse_servers
+
+
+class ServerPoolTests(unittest.TestCase):
+    def test_parse_servers(self):
+        self.assertEqual(parse_servers(" a.example, b.example,,a.example "), ["a.example", "b.example"])
+        self.assertEqual(parse_servers(""), [])
+        self.assertEqual(parse_servers(None), [])
+
+    def test_configured_order_until_measured(self):
+        pool = ServerPool(["a", "b", "c"])
+        self.assertEqual(pool.ranked(), ["a", "b", "c"])
+        self.assertEqual(pool.primary, "a")
+
+    def test_ranked_by_latency_and_errors(self):
+        pool = ServerPool(["a", "b", "c"])
+        pool.record("a", 0.8, True)
+        pool.record("b", 0.1, True)
+        pool.record("c", 0.05, False)
+
+        self.assertEqual(pool.ranked(), ["b", "a", "c"])
+        # the primary server doesn't change with the ranking
+        self.assertEqual(pool.primary, "a")
+
+    def test_errors_are_forgiven_over_time(self):
+        stats = ServerStats()
+        stats.record(0.1, False)
+        now = time.monotonic()
+
+        self.assertAlmostEqual(stats.error_rate(now + servers_module.ERROR_HALF_LIFE), stats.error_rate(now) / 2, 3)
+
+    def test_hedge_delay_follows_p95(self):
+        stats = ServerStats()
+        self.assertEqual(stats.hedge_delay(), servers_module.DEFAULT_HEDGE_DELAY)
+
+        for i in range(100):
+            stats.record(0.2 if i % 10 else 3.0, True)
+        # 1 in 10 recent samples is slow
+        self.assertEqual(stats.hedge_delay(), 3.0)
+
+        for _ in range(100):
+            stats.record(0.01, True)
+        self.assertEqual(stats.hedge_delay(), servers_module.MIN_HEDGE_DELAY)
+
+
+class FakeSession:
+    def __init__(self, behaviour):  # type: (dict[str, Callable[[], Any]]) -> None
+        self.behaviour = behaviour
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def request(self, method, url, params, headers=None, timeout=None):
+        server = url.split("/")[2]
+        with self._lock:
+            self.calls.append((method, server))
+        return self.behaviour[server]()
+
+
+def _response(status=200, delay=0.0):
+    def respond():
+        time.sleep(delay)
+        resp = mock.MagicMock(status_code=status)
+        resp.__enter__.return_value = resp
+        resp.json.return_value = []
+        resp.headers = {}
+        return resp
+
+    return respond
+
+
+def _fail():
+    raise ConnectionError("unreachable")
+
+
+class HedgedRequestTests(unittest.TestCase):
+    def make_api(self, behaviour, servers="a.example,b.example"):
+        api = SponsorBlockAPI(api_server=servers)
+        self.addCleanup(api.close)
+        api._session = FakeSession(behaviour)
+        return api
+
+    def test_slow_server_is_hedged(self):
+        api = self.make_api({"a.example": _response(delay=0.5), "b.example": _response()})
+        with mock.patch.object(servers_module, "DEFAULT_HEDGE_DELAY", 0.05):
+            start = time.monotonic()
+            with api._send("GET", "https://{SERVER}/api/skipSegments", {}) as resp:
+                self.assertEqual(resp.status_code, 200)
+
+        self.assertLess(time.monotonic() - start, 0.4)
+        self.assertEqual(api._session.calls, [("GET", "a.example"), ("GET", "b.example")])
+
+    def test_failing_server_fails_over_immediately(self):
+        api = self.make_api({"a.example": _fail, "b.example": _response()})
+        with api._send("GET", "https://{SERVER}/api/skipSegments", {}) as resp:
+            self.assertEqual(resp.status_code, 200)
+
+        # the failure counts against the server
+        self.assertEqual(api._servers.ranked(), ["b.example", "a.example"])
+
+    def test_server_errors_fall_back_to_the_last_answer(self):
+        api = self.make_api({"a.example": _response(503), "b.example": _response(502)})
+        with api._send("GET", "https://{SERVER}/api/skipSegments", {}) as resp:
+            self.assertGreaterEqual(resp.status_code, 500)
+
+    def test_failure_is_replaced_while_others_are_pending(self):
+        api = self.make_api(
+            {"a.example": _response(delay=2.0), "b.example": _fail, "c.example": _response()},
+            servers="a.example,b.example,c.example",
+        )
+        with mock.patch.object(servers_module, "DEFAULT_HEDGE_DELAY", 0.3):
+            start = time.monotonic()
+            with api._send("GET", "https://{SERVER}/api/skipSegments", {}) as resp:
+                self.assertEqual(resp.status_code, 200)
+
+        # c is asked as soon as b failed, not after another hedging delay
+        self.assertLess(time.monotonic() - start, 0.5)
+
+    def test_replaced_server_error_is_closed(self):
+        server_error = _response(503)()
+        api = self.make_api({"a.example": lambda: server_error, "b.example": _fail})
+        with self.assertRaises(ConnectionError):
+            api._send("GET", "https://{SERVER}/api/skipSegments", {})
+
+        server_error.close.assert_called_once_with()
+
+    def test_all_failing_raises(self):
+        api = self.make_api({"a.example": _fail, "b.example": _fail})
+        with self.assertRaises(ConnectionError):
+            api._send("GET", "https://{SERVER}/api/skipSegments", {})
+
+    def test_not_found_is_an_answer(self):
+        api = self.make_api({"a.example": _response(404), "b.example": _response()})
+        with api._send("GET", "https://{SERVER}/api/skipSegments", {}) as resp:
+            self.assertEqual(resp.status_code, 404)
+        self.assertEqual(api._session.calls, [("GET", "a.example")])
+
+    def test_votes_go_to_the_primary_server(self):
+        api = self.make_api({"a.example": _response(), "b.example": _response()})
+        api._servers.record("a.example", 5.0, False)
+
+        api._send("POST", "https://{SERVER}/api/voteOnSponsorTime", {})
+        self.assertEqual(api._session.calls, [("POST", "a.example")])
+
+    def test_changing_servers_keeps_known_stats(self):
+        api = self.make_api({}, servers="a.example")
+        pool = api._servers
+        api.set_api_server(" a.example ")
+        self.assertIs(api._servers, pool)
+
+        api.set_api_server("")
+        self.assertEqual(api._servers.servers, ["sponsor.ajay.app"])
+
+
+class SessionTests(unittest.TestCase):
+    def test_read_timeouts_are_not_retried(self):
+        session = api_module._create_session()
+        self.addCleanup(session.close)
+        retries = session.get_adapter("https://sponsor.ajay.app").max_retries
+        self.assertEqual(retries.read, 0)
+        self.assertTrue(retries.is_retry("GET", 503))
+
+
+if __name__ == "__main__":
+    unittest.main()
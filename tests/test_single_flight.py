@@ -0,0 +1,122 @@
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+from resources.lib.sponsorblock import SegmentCache, SponsorBlockAPI, SponsorSegment
+from resources.lib.sponsorblock.errors import NotFound
+from resources.lib.sponsorblock.single_flight import SingleFlight
+
+SEGMENTS = [SponsorSegment("uuid-1", "sponsor", 10.0, 20.0)]
+
+CALLERS = 8
+
+
+def _call_concurrently(fn, count=CALLERS):  # type: (Callable[[], T], int) -> list[Future]
+    with ThreadPoolExecutor(max_workers=count) as executor:
+        return [executor.submit(fn) for _ in range(count)]
+
+
+class SingleFlightTests(unittest.TestCase):
+    def test_concurrent_calls_share_one_result(self):
+        shared = []
+        flights = SingleFlight(on_shared=shared.append)
+        calls = []
+
+        def fetch():
+            calls.append(None)
+            time.sleep(0.1)
+            return object()
+
+        futures = _call_concurrently(lambda: flights.do("video", fetch))
+
+        results = {id(future.result()) for future in futures}
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(len(results), 1)
+        self.assertEqual(shared, ["video"] * (CALLERS - 1))
+        self.assertEqual(len(flights), 0)
+
+    def test_errors_are_shared(self):
+        flights = SingleFlight()
+        calls = []
+
+        def fetch():
+            calls.append(None)
+            time.sleep(0.1)
+            raise NotFound(None)
+
+        for future in _call_concurrently(lambda: flights.do("video", fetch)):
+            self.assertIsInstance(future.exception(), NotFound)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(len(flights), 0)
+
+    def test_keys_are_independent(self):
+        flights = SingleFlight()
+        release = threading.Event()
+
+        leader = threading.Thread(target=flights.do, args=("a", release.wait))
+        leader.start()
+        self.addCleanup(leader.join)
+        self.addCleanup(release.set)
+
+        self.assertEqual(flights.do("b", lambda: "b"), "b")
+
+    def test_finished_calls_are_not_cached(self):
+        flights = SingleFlight()
+        self.assertEqual(flights.do("video", lambda: 1), 1)
+        self.assertEqual(flights.do("video", lambda: 2), 2)
+
+
+class CoalescedApiTests(unittest.TestCase):
+    def setUp(self):
+        self.calls = []
+
+    def slow_fetch(self, result):
+        def fetch(*args):
+            self.calls.append(args)
+            time.sleep(0.1)
+            return result
+
+        return fetch
+
+    def test_concurrent_misses_send_one_request(self):
+        api = SponsorBlockAPI(categories=["sponsor"], cache=SegmentCache(":memory:"))
+        self.addCleanup(api.close)
+
+        with mock.patch.object(api, "_fetch_skip_segments", side_effect=self.slow_fetch((SEGMENTS, None))):
+            futures = _call_concurrently(lambda: api.get_skip_segments("video"))
+            for future in futures:
+                self.assertEqual(future.result(), SEGMENTS)
+
+        self.assertEqual(len(self.calls), 1)
+
+    def test_without_cache(self):
+        api = SponsorBlockAPI(categories=["sponsor"])
+        self.addCleanup(api.close)
+
+        with mock.patch.object(api, "_fetch_skip_segments", side_effect=self.slow_fetch((SEGMENTS, None))):
+            for future in _call_concurrently(lambda: api.get_skip_segments("video")):
+                self.assertEqual(future.result(), SEGMENTS)
+
+        self.assertEqual(len(self.calls), 1)
+
+    def test_videos_sharing_a_hash_prefix_share_the_bucket(self):
+        api = SponsorBlockAPI(categories=["sponsor"], cache=SegmentCache(":memory:"))
+        self.addCleanup(api.close)
+        bucket = {"video": SEGMENTS}
+
+        with mock.patch("resources.lib.sponsorblock.api.hash_prefix", return_value="abcd"), \
+                mock.patch.object(api, "_fetch_skip_segments_hashed", side_effect=self.slow_fetch((bucket, None))):
+            video_ids = iter(["video", "other"] * (CALLERS // 2))
+            futures = _call_concurrently(lambda: api.get_skip_segments_hashed(next(video_ids)))
+
+            self.assertCountEqual(
+                [future.result() for future in futures], [SEGMENTS, []] * (CALLERS // 2)
+            )
+
+        self.assertEqual(len(self.calls), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,67 @@
+import os
+import tempfile
+import unittest
+
+from resources.lib.utils import skip_accuracy
+from resources.lib.utils.skip_accuracy import SkipAccuracy
+
+
+class SkipAccuracyTests(unittest.TestCase):
+    def test_defaults_until_enough_samples(self):
+        accuracy = SkipAccuracy()
+        for _ in range(skip_accuracy.MIN_SAMPLES - 1):
+            accuracy.record_drift(0.01)
+            accuracy.record_fired(0.01)
+
+        self.assertEqual(accuracy.undershoot, skip_accuracy.DEFAULT_UNDERSHOOT)
+        self.assertEqual(accuracy.overshoot, skip_accuracy.DEFAULT_OVERSHOOT)
+
+    def test_precise_device_tightens_undershoot(self):
+        accuracy = SkipAccuracy()
+        for i in range(skip_accuracy.MIN_SAMPLES):
+            accuracy.record_drift(0.04 if i % 2 else -0.04)
+
+        self.assertAlmostEqual(accuracy.undershoot, 0.08)
+
+    def test_late_device_widens_overshoot(self):
+        accuracy = SkipAccuracy()
+        for _ in range(skip_accuracy.MIN_SAMPLES):
+            accuracy.record_fired(1.2)
+
+        self.assertAlmostEqual(accuracy.overshoot, 1.2 + skip_accuracy.OVERSHOOT_MARGIN)
+
+    def test_dropped_checkpoints_dont_widen_overshoot(self):
+        accuracy = SkipAccuracy()
+        for _ in range(skip_accuracy.MIN_SAMPLES):
+            accuracy.record_fired(0.1)
+        for _ in range(skip_accuracy.MIN_SAMPLES):
+            accuracy.record_dropped(600.0)
+
+        self.assertEqual(accuracy.dropped, skip_accuracy.MIN_SAMPLES)
+        self.assertEqual(accuracy.overshoot, skip_accuracy.MIN_OVERSHOOT)
+
+    def test_tolerances_are_bounded(self):
+        accuracy = SkipAccuracy()
+        for _ in range(skip_accuracy.MIN_SAMPLES):
+            accuracy.record_drift(5.0)
+            accuracy.record_fired(30.0)
+
+        self.assertEqual(accuracy.undershoot, skip_accuracy.MAX_UNDERSHOOT)
+        self.assertEqual(accuracy.overshoot, skip_accuracy.MAX_OVERSHOOT)
+
+    def test_statistics_survive_restart(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "profile", "skip_accuracy.json")
+            accuracy = SkipAccuracy(path)
+            for _ in range(skip_accuracy.MIN_SAMPLES):
+                accuracy.record_fired(0.2)
+            accuracy.save()
+
+            restored = SkipAccuracy(path)
+
+        self.assertEqual(restored.fired, skip_accuracy.MIN_SAMPLES)
+        self.assertAlmostEqual(restored.overshoot, accuracy.overshoot)
+
+
+if __name__ == "__main__":
+    unittest.main()
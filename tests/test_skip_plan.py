@@ -0,0 +1,122 @@
+import types
+import unittest
+
+from resources.lib.skip_plan import ACTION_UNMUTE, SkipPlan
+from resources.lib.sponsorblock import ACTION_MUTE, ACTION_SKIP, SponsorSegment
+
+
+def make_settings(
+    segment_chain_margin=0.5, minimum_duration=0.0, reduce_skips=0.0, categories=("sponsor",), mute_segments=True
+):
+    return types.SimpleNamespace(
+        categories=categories,
+        segment_chain_margin=segment_chain_margin,
+        minimum_duration=minimum_duration,
+        reduce_skips=reduce_skips,
+        mute_segments=mute_segments,
+    )
+
+
+def make_segments(*spans, action_type=ACTION_SKIP):
+    return [
+        SponsorSegment("{}-{}".format(action_type, i), "sponsor", start, end, action_type)
+        for i, (start, end) in enumerate(spans)
+    ]
+
+
+class SkipPlanTests(unittest.TestCase):
+    def test_chains_overlapping_and_close_segments(self):
+        segments = make_segments((10, 20), (15, 25), (25.4, 30), (40, 50))
+        plan = SkipPlan.build(segments, make_settings())
+
+        self.assertEqual(len(plan), 2)
+        entry = plan.next_entry(0)
+        self.assertEqual((entry.start, entry.end, entry.segment), (10, 30, segments[0]))
+
+    def test_drops_short_segments(self):
+        segments = make_segments((10, 11), (20, 30))
+        plan = SkipPlan.build(segments, make_settings(minimum_duration=2))
+        self.assertEqual(plan.next_entry(0).start, 20)
+
+        plan = SkipPlan.build(segments, make_settings(reduce_skips=10))
+        self.assertIsNone(plan.next_entry(0))
+
+    def test_disabled_categories_are_not_skipped(self):
+        segments = [
+            SponsorSegment("sponsor", "sponsor", 10, 20),
+            SponsorSegment("intro", "intro", 20, 30),
+            SponsorSegment("outro", "outro", 90, 100),
+        ]
+
+        plan = SkipPlan.build(segments, make_settings())
+        self.assertEqual([(entry.start, entry.end) for entry in plan._entries], [(10, 20)])
+
+        # the same segments, no refetch
+        plan = SkipPlan.build(segments, make_settings(categories=("sponsor", "intro", "outro")))
+        self.assertEqual([(entry.start, entry.end) for entry in plan._entries], [(10, 30), (90, 100)])
+
+    def test_next_entry(self):
+        plan = SkipPlan.build(make_segments((10, 20), (40, 50)), make_settings())
+
+        self.assertEqual(plan.next_entry(10).start, 10)
+        self.assertEqual(plan.next_entry(15).start, 40)
+        self.assertEqual(plan.next_entry(15, include_current=True).start, 10)
+        self.assertIsNone(plan.next_entry(45))
+        self.assertEqual(plan.next_entry(45, include_current=True).start, 40)
+        self.assertIsNone(plan.next_entry(51, include_current=True))
+
+    def test_many_segments(self):
+        spans = [(i * 10.0, i * 10.0 + 5) for i in range(1000)]
+        plan = SkipPlan.build(make_segments(*spans), make_settings())
+
+        self.assertEqual(len(plan), 1000)
+        self.assertEqual(plan.next_entry(5001).start, 5010)
+
+
+class MuteTests(unittest.TestCase):
+    def setUp(self):
+        segments = make_segments((10, 20), (60, 70)) + make_segments((30, 40), (45, 55), action_type=ACTION_MUTE)
+        segments.sort(key=lambda seg: seg.start)
+        self.plan = SkipPlan.build(segments, make_settings(segment_chain_margin=0))
+
+    def next_checkpoint(self, time, muted=None):
+        checkpoint = self.plan.next_checkpoint(time, muted=muted)
+        return checkpoint.time, checkpoint.action, checkpoint.entry.start
+
+    def test_mutes_are_not_skipped(self):
+        self.assertEqual([entry.start for entry in self.plan._entries], [10, 60])
+        self.assertEqual(self.next_checkpoint(21), (30, ACTION_MUTE, 30))
+
+    def test_unmutes_at_the_end(self):
+        muted = self.plan.next_mute(30)
+        self.assertEqual(self.next_checkpoint(30, muted), (40, ACTION_UNMUTE, 30))
+        # an unmute that fired a bit early doesn't mute again
+        self.assertEqual(self.next_checkpoint(39.9), (45, ACTION_MUTE, 45))
+
+    def test_entry_playback_is_in_is_muted(self):
+        self.assertEqual(self.next_checkpoint(35), (35, ACTION_MUTE, 30))
+
+    def test_leaving_the_entry_unmutes_right_away(self):
+        muted = self.plan.next_mute(30)
+        self.assertEqual(self.next_checkpoint(65, muted), (65, ACTION_UNMUTE, 30))
+        self.assertEqual(self.next_checkpoint(5, muted), (5, ACTION_UNMUTE, 30))
+        # a checkpoint that fired a bit early is still in it
+        self.assertEqual(self.next_checkpoint(29.9, muted), (40, ACTION_UNMUTE, 30))
+
+    def test_skip_comes_first(self):
+        segments = make_segments((10, 20)) + make_segments((10, 30), action_type=ACTION_MUTE)
+        plan = SkipPlan.build(segments, make_settings())
+
+        self.assertEqual(plan.next_checkpoint(5).action, ACTION_SKIP)
+        self.assertEqual(plan.next_checkpoint(20).action, ACTION_MUTE)
+
+    def test_disabled(self):
+        segments = make_segments((10, 20), action_type=ACTION_MUTE)
+        plan = SkipPlan.build(segments, make_settings(mute_segments=False))
+
+        self.assertEqual(len(plan), 0)
+        self.assertIsNone(plan.next_checkpoint(0))
+
+
+if __name__ == "__main__":
+    unittest.main()
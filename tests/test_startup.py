@@ -0,0 +1,12 @@
+import unittest
+
+from tests import bench_startup
+
+
+class StartupTests(unittest.TestCase):
+    def test_heavy_modules_are_loaded_on_first_use(self):
+        self.assertEqual(bench_startup.run_once()["loaded"], [])
+
+
+if __name__ == "__main__":
+    unittest.main()